@@ -48,6 +48,8 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
      'corsheaders.middleware.CorsMiddleware'
     'django.middleware.security.SecurityMiddleware',
+    'espacoBK.metrics.MetricsMiddleware',
+    'espacoBK.profiler.MongoProfilerMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -76,11 +78,16 @@ TEMPLATES = [
 # REST Framework
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'espacoBK.authentication.SignedTokenAuthentication',
+        'espacoBK.authentication.SessaoAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'espacoBK.renderers.MongoJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
 }
 
 # Modelo de usuário customizado
@@ -129,6 +136,21 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# Hash de senhas: Argon2 quando argon2-cffi estiver instalado, PBKDF2 como alternativa.
+# O custo é configurável por variáveis de ambiente (ver espacoBK/passwords.py).
+PASSWORD_HASHERS = [
+    'espacoBK.passwords.PBKDF2Hasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+]
+try:
+    import argon2  # noqa: F401
+    PASSWORD_HASHERS.insert(0, 'espacoBK.passwords.Argon2Hasher')
+except ImportError:
+    pass
+
+# Sessões lidas do cache e gravadas também no banco
+SESSION_ENGINE = os.getenv('SESSION_ENGINE', 'django.contrib.sessions.backends.cached_db')
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/5.2/topics/i18n/
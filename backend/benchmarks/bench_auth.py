@@ -0,0 +1,130 @@
+"""
+Benchmark: custo de autenticação por requisição, token assinado x sessão.
+
+Token: SignedTokenAuthentication valida a assinatura e a validade do
+bearer token, só em CPU. Sessão: SessaoAuthentication sobre o SessionStore
+do Django (backend db, em SQLite na memória), carregando a sessão a cada
+requisição como o SessionMiddleware. Sessão (mongo): o caminho antigo, uma
+leitura em django_session e outra em Usuario, reproduzido com duas
+find_one em um mongod local e pulado se o banco não responder.
+
+Uso (a partir de backend/):
+    BENCH_MONGO_URI=mongodb://localhost:27017 python benchmarks/bench_auth.py
+"""
+import os
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import django
+from django.conf import settings
+
+settings.configure(
+    SECRET_KEY='bench-auth', ALLOWED_HOSTS=['*'],
+    INSTALLED_APPS=['django.contrib.contenttypes', 'django.contrib.sessions', 'rest_framework'],
+    DATABASES={'default': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': ':memory:'}},
+    SESSION_ENGINE='django.contrib.sessions.backends.db',
+)
+django.setup()
+
+from bson import ObjectId
+from django.contrib.sessions.backends.db import SessionStore
+from django.core.management import call_command
+from django.test import RequestFactory
+from pymongo import MongoClient
+from pymongo.errors import PyMongoError
+from rest_framework.request import Request
+
+from espacoBK.authentication import SessaoAuthentication, SignedTokenAuthentication, issue_tokens
+
+MONGO_URI = os.getenv('BENCH_MONGO_URI', 'mongodb://localhost:27017')
+REQUISICOES = int(os.getenv('BENCH_REQUISICOES', 20_000))
+
+
+def resumo(nome, tempos):
+    tempos = sorted(tempos)
+    p99 = tempos[int(len(tempos) * 0.99) - 1]
+    print(f"   {nome:<15} mediana {statistics.median(tempos):8.1f} µs   p99 {p99:8.1f} µs")
+
+
+def medir_token():
+    usuario_id = ObjectId()
+    token = issue_tokens(usuario_id, 'Usuário Benchmark')['access']
+    django_request = RequestFactory().get('/api/tarefas/', HTTP_AUTHORIZATION=f'Bearer {token}')
+    autenticacao = SignedTokenAuthentication()
+
+    tempos = []
+    for _ in range(REQUISICOES):
+        inicio = time.perf_counter()
+        usuario, _ = autenticacao.authenticate(Request(django_request))
+        tempos.append((time.perf_counter() - inicio) * 1e6)
+    assert usuario.usuario_id == str(usuario_id)
+    return tempos
+
+
+def medir_sessao():
+    call_command('migrate', 'sessions', verbosity=0)
+    usuario_id = str(ObjectId())
+    sessao = SessionStore()
+    sessao.update({'usuario_id': usuario_id, 'usuario_nome': 'Usuário Benchmark'})
+    sessao.create()
+
+    django_request = RequestFactory().get('/api/tarefas/')
+    django_request._dont_enforce_csrf_checks = True
+    autenticacao = SessaoAuthentication()
+
+    tempos = []
+    for _ in range(REQUISICOES):
+        inicio = time.perf_counter()
+        # Sessão nova a cada requisição, como faz o SessionMiddleware
+        django_request.session = SessionStore(sessao.session_key)
+        usuario, _ = autenticacao.authenticate(Request(django_request))
+        tempos.append((time.perf_counter() - inicio) * 1e6)
+    assert usuario.usuario_id == usuario_id
+    return tempos
+
+
+def medir_sessao_mongo():
+    cliente = MongoClient(MONGO_URI, serverSelectionTimeoutMS=2000)
+    try:
+        cliente.admin.command('ping')
+    except PyMongoError:
+        print(f"⚠️  Mongo indisponível em {MONGO_URI}: caminho de sessão (mongo) não medido")
+        return None
+
+    db = cliente['bench_auth']
+    usuario_id = db.Usuario.insert_one({'nome': 'Usuário Benchmark', 'email': 'bench@espacobk.com'}).inserted_id
+    db.django_session.insert_one({
+        'session_key': 'bench-sessao',
+        'session_data': f'usuario_id={usuario_id}',
+        'expire_date': datetime.now() + timedelta(days=1),
+    })
+    db.django_session.create_index('session_key', unique=True)
+
+    tempos = []
+    try:
+        for _ in range(REQUISICOES):
+            inicio = time.perf_counter()
+            db.django_session.find_one({'session_key': 'bench-sessao', 'expire_date': {'$gt': datetime.now()}})
+            db.Usuario.find_one({'_id': usuario_id})
+            tempos.append((time.perf_counter() - inicio) * 1e6)
+    finally:
+        cliente.drop_database('bench_auth')
+        cliente.close()
+    return tempos
+
+
+def main():
+    print(f"🔐 Autenticando {REQUISICOES} requisições...")
+    resumo('token', medir_token())
+    resumo('sessão', medir_sessao())
+    tempos_mongo = medir_sessao_mongo()
+    if tempos_mongo:
+        resumo('sessão (mongo)', tempos_mongo)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+"""
+Benchmark: busca de clientes por regex x chave de busca indexada.
+
+Gera uma collection sintética (500k clientes por padrão) em um mongod
+local e compara o filtro $regex antigo com o pipeline de espacoBK.search.
+
+Uso (a partir de backend/):
+    BENCH_MONGO_URI=mongodb://localhost:27017 python benchmarks/bench_busca_clientes.py
+"""
+import os
+import random
+import re
+import sys
+import time
+
+from pymongo import ASCENDING, MongoClient
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from espacoBK.search import campos_busca, pipeline_busca
+
+MONGO_URI = os.getenv('BENCH_MONGO_URI', 'mongodb://localhost:27017')
+TOTAL = int(os.getenv('BENCH_TOTAL', 500_000))
+REPETICOES = int(os.getenv('BENCH_REPETICOES', 5))
+
+NOMES = ['João', 'José', 'Maria', 'Ana', 'Antônio', 'Luís', 'Conceição', 'Sebastião',
+         'Márcia', 'Fábio', 'Letícia', 'Vinícius', 'Cláudia', 'Sérgio', 'Lúcia']
+SOBRENOMES = ['Silva', 'Santos', 'Oliveira', 'Souza', 'Conceição', 'Araújo', 'Gonçalves',
+              'Ribeiro', 'Simões', 'Magalhães', 'Brandão', 'Assunção', 'Peçanha']
+CIDADES = ['São Paulo', 'Ribeirão Preto', 'Maringá', 'Londrina', 'Florianópolis',
+           'Goiânia', 'Belém', 'São José dos Campos', 'Cuiabá', 'Vitória']
+CONSULTAS = ['sil', 'joao', 'maria sou', 'sao paulo', 'conceicao', 'mag']
+
+
+def gerar_cliente(i):
+    nome = f'{random.choice(NOMES)} {random.choice(SOBRENOMES)} {random.choice(SOBRENOMES)}'
+    cliente = {
+        'nome': nome,
+        'razao_social': f'{random.choice(SOBRENOMES)} Comércio Ltda {i}',
+        'cidade': random.choice(CIDADES),
+        'telefone': f'(11) 9{i:08d}',
+    }
+    cliente.update(campos_busca(cliente))
+    return cliente
+
+
+def popular(collection):
+    if collection.estimated_document_count() >= TOTAL:
+        print(f"♻️  Reutilizando {TOTAL} clientes já gerados")
+        return
+    collection.drop()
+    print(f"📝 Gerando {TOTAL} clientes...")
+    lote = []
+    for i in range(TOTAL):
+        lote.append(gerar_cliente(i))
+        if len(lote) == 10_000:
+            collection.insert_many(lote, ordered=False)
+            lote = []
+    if lote:
+        collection.insert_many(lote, ordered=False)
+    collection.create_index([('busca_tokens', ASCENDING)], name='busca_tokens')
+    collection.create_index([('busca_nome', ASCENDING)], name='busca_nome')
+
+
+def busca_regex(collection, query):
+    """Caminho antigo de ClienteService.search"""
+    regex_query = {'$regex': re.escape(query), '$options': 'i'}
+    filtro = {'$or': [{'nome': regex_query}, {'cidade': regex_query}, {'razao_social': regex_query}]}
+    return list(collection.find(filtro).limit(50))
+
+
+def busca_indexada(collection, query):
+    return list(collection.aggregate(pipeline_busca(query, limit=50)))
+
+
+def medir(funcao, collection, query):
+    inicio = time.perf_counter()
+    for _ in range(REPETICOES):
+        resultado = funcao(collection, query)
+    return (time.perf_counter() - inicio) / REPETICOES * 1000, len(resultado)
+
+
+def main():
+    client = MongoClient(MONGO_URI, serverSelectionTimeoutMS=5000)
+    collection = client['espaco_bk_bench']['Cliente']
+    popular(collection)
+
+    print(f"\n📊 Média de {REPETICOES} execuções (limit=50)")
+    print(f"{'consulta':<14}{'regex (ms)':>12}{'indexada (ms)':>15}{'ganho':>8}")
+    for query in CONSULTAS:
+        regex_ms, _ = medir(busca_regex, collection, query)
+        indexada_ms, encontrados = medir(busca_indexada, collection, query)
+        print(f"{query:<14}{regex_ms:>12.1f}{indexada_ms:>15.1f}{regex_ms / indexada_ms:>7.1f}x"
+              f"  ({encontrados} resultados)")
+
+    client.close()
+
+
+if __name__ == '__main__':
+    main()
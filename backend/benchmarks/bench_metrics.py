@@ -0,0 +1,75 @@
+"""
+Benchmark: custo da instrumentação de métricas (espacoBK.metrics).
+
+Mede, em ns por chamada:
+- um método de serviço sem instrumentação e com @instrument
+- Histogram.observe() em 1 thread e em várias threads ao mesmo tempo
+  (cada thread tem o próprio shard, sem disputa de lock)
+
+Não precisa de banco. Uso (a partir de backend/):
+    python benchmarks/bench_metrics.py
+"""
+import os
+import sys
+import threading
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from espacoBK.metrics import Histogram, instrument
+
+CHAMADAS = int(os.getenv('BENCH_CHAMADAS', 1_000_000))
+THREADS = int(os.getenv('BENCH_THREADS', 8))
+
+
+class ServicoPuro:
+    def find_by_id(self, valor):
+        return valor
+
+
+@instrument
+class ServicoMedido:
+    def find_by_id(self, valor):
+        return valor
+
+
+def ns_por_chamada(funcao, chamadas=CHAMADAS):
+    inicio = time.perf_counter()
+    for _ in range(chamadas):
+        funcao(1)
+    return (time.perf_counter() - inicio) / chamadas * 1e9
+
+
+def observe_concorrente(threads):
+    histograma = Histogram()
+    por_thread = CHAMADAS // threads
+
+    def trabalhar():
+        for _ in range(por_thread):
+            histograma.observe(0.003)
+
+    workers = [threading.Thread(target=trabalhar) for _ in range(threads)]
+    inicio = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    duracao = time.perf_counter() - inicio
+
+    contagens, _ = histograma.snapshot()
+    assert contagens[-1] == por_thread * threads, 'observações perdidas'
+    return duracao / (por_thread * threads) * 1e9
+
+
+def main():
+    print(f"📏 {CHAMADAS} chamadas por medição")
+    puro = ns_por_chamada(ServicoPuro().find_by_id)
+    medido = ns_por_chamada(ServicoMedido().find_by_id)
+    print(f"   método puro          {puro:8.1f} ns")
+    print(f"   método instrumentado {medido:8.1f} ns   (+{medido - puro:.1f} ns por chamada)")
+    print(f"   observe() 1 thread   {observe_concorrente(1):8.1f} ns")
+    print(f"   observe() {THREADS} threads  {observe_concorrente(THREADS):8.1f} ns (sem perda de contagens)")
+
+
+if __name__ == '__main__':
+    main()
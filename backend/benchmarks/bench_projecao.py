@@ -0,0 +1,96 @@
+"""
+Benchmark: leitura de 10k tarefas e 10k clientes, serializer x projeção pré-calculada.
+
+Serializer: o caminho antigo, instancia_de_documento + ModelSerializer(many=True).
+Projeção: espacoBK.projections monta os dicts direto dos documentos do
+PyMongo. Os dois caminhos são conferidos byte a byte (renderers.dumps)
+antes da medição.
+
+Não precisa de banco (nomes de usuário vão no context). Uso (a partir de backend/):
+    python benchmarks/bench_projecao.py
+"""
+import os
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+
+import django
+
+django.setup()
+
+from bson import ObjectId
+
+from espacoBK.models import Cliente, Tarefa
+from espacoBK.projections import cliente_projecao, tarefa_projecao
+from espacoBK.renderers import dumps
+from espacoBK.serializers import ClienteSerializer, TarefaSerializer, instancia_de_documento
+
+TOTAL = int(os.getenv('BENCH_TOTAL', 10_000))
+REPETICOES = int(os.getenv('BENCH_REPETICOES', 5))
+
+
+# Datas como o PyMongo devolve: o BSON não tem tipo data, DateField vem como datetime
+def gerar_tarefa(i, usuario):
+    inicio = datetime(2024, 1, 1) + timedelta(days=i % 365)
+    return {
+        '_id': ObjectId(), 'idUsuario': usuario, 'titulo': f'Tarefa {i}',
+        'descricao': 'Ligar para o cliente e confirmar o orçamento ' * 3,
+        'status': '1' if i % 3 else '2', 'prioridade': str(i % 3 + 1),
+        'data_inicio': inicio, 'data_termino': inicio + timedelta(days=7), 'idCampanha': ObjectId(),
+    }
+
+
+def gerar_cliente(i):
+    return {
+        '_id': ObjectId(), 'razao_social': f'Araújo Comércio Ltda {i}', 'nome': f'João Silva {i}',
+        'telefone': '(11) 3333-4444', 'celular': '(11) 99999-8888', 'email': f'cliente{i}@espacobk.com',
+        'cidade': 'São Paulo', 'empresa': 'Espaço BK', 'cpf_cnpj': '12.345.678/0001-90', 'RG': '12.345.678-9',
+        'data_nascimento': datetime(1980, 5, 17), 'endereco': 'Rua das Flores, 123 - Centro',
+        'observacoes': 'Prefere contato pela manhã.', 'vendedor': 'Ana',
+    }
+
+
+def medir(nome, funcao):
+    tempos = []
+    for _ in range(REPETICOES):
+        inicio = time.perf_counter()
+        funcao()
+        tempos.append(time.perf_counter() - inicio)
+    mediana = statistics.median(tempos)
+    print(f"   {nome:<12} mediana {mediana * 1000:8.1f} ms   {TOTAL / mediana:10.0f} docs/s")
+    return mediana
+
+
+def main():
+    usuario = ObjectId()
+    context = {'usuario_nomes': {str(usuario): 'Maria Conceição'}}
+    tarefas = [gerar_tarefa(i, usuario) for i in range(TOTAL)]
+    clientes = [gerar_cliente(i) for i in range(TOTAL)]
+
+    casos = {
+        'tarefas': (
+            lambda: TarefaSerializer([instancia_de_documento(Tarefa, d) for d in tarefas],
+                                     many=True, context=context).data,
+            lambda: tarefa_projecao.render(tarefas, context=context),
+        ),
+        'clientes': (
+            lambda: ClienteSerializer([instancia_de_documento(Cliente, d) for d in clientes], many=True).data,
+            lambda: cliente_projecao.render(clientes),
+        ),
+    }
+
+    for nome, (serializer, projecao) in casos.items():
+        if dumps(serializer()) != dumps(projecao()):
+            raise SystemExit(f"❌ Saída da projeção difere do serializer para {nome}")
+        print(f"📦 {TOTAL} {nome} (saída idêntica)")
+        antes = medir('serializer', serializer)
+        depois = medir('projeção', projecao)
+        print(f"   🚀 {antes / depois:.1f}x mais rápido")
+
+
+if __name__ == '__main__':
+    main()
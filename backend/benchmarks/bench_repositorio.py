@@ -0,0 +1,104 @@
+"""
+Benchmark: latência das leituras de tarefas, djongo (ORM) x repositório PyMongo.
+
+ORM: o caminho antigo das views, Tarefa.objects (SQL gerado e traduzido
+de volta para Mongo pelo djongo) + TarefaSerializer.
+Repositório: espacoBK.repositories + projeção pré-calculada, como as views
+fazem hoje.
+
+Mede a página da listagem (keyset, limit=100) e o detalhe de uma tarefa
+em um mongod local, em uma base descartável (apagada no final).
+
+Ainda sem números registrados: a troca para o repositório foi feita sem um
+mongod e sem o djongo disponíveis, então a melhora não foi medida. Rode
+com os dois instalados e anote aqui as medianas e p99 de cada caminho.
+
+Uso (a partir de backend/):
+    BENCH_MONGO_URI=mongodb://localhost:27017 python benchmarks/bench_repositorio.py
+"""
+import os
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ['DB_HOST'] = os.getenv('BENCH_MONGO_URI', 'mongodb://localhost:27017')
+os.environ['MONGO_DATABASE'] = 'bench_repositorio'
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+
+import django
+
+django.setup()
+
+from bson import ObjectId
+
+from espacoBK.database import mongodb
+from espacoBK.models import Tarefa
+from espacoBK.projections import tarefa_projecao
+from espacoBK.repositories import tarefa_repository
+from espacoBK.serializers import TarefaSerializer
+
+TOTAL = int(os.getenv('BENCH_TOTAL', 10_000))
+REQUISICOES = int(os.getenv('BENCH_REQUISICOES', 500))
+LIMIT = 100
+
+
+def popular(usuario):
+    inicio = datetime(2024, 1, 1)
+    mongodb.get_collection('Tarefa').insert_many([
+        {
+            'idUsuario': usuario, 'titulo': f'Tarefa {i}', 'descricao': 'Confirmar o orçamento',
+            'status': '1' if i % 3 else '2', 'prioridade': str(i % 3 + 1),
+            'data_inicio': inicio + timedelta(days=i % 365), 'data_termino': inicio + timedelta(days=i % 365 + 7),
+            'idCampanha': None, 'created_at': inicio, 'updated_at': inicio,
+        }
+        for i in range(TOTAL)
+    ])
+
+
+def resumo(nome, funcao):
+    tempos = []
+    for _ in range(REQUISICOES):
+        inicio = time.perf_counter()
+        funcao()
+        tempos.append((time.perf_counter() - inicio) * 1000)
+    tempos.sort()
+    p95 = tempos[int(len(tempos) * 0.95) - 1]
+    print(f"   {nome:<14} mediana {statistics.median(tempos):7.2f} ms   p95 {p95:7.2f} ms")
+
+
+def main():
+    usuario = ObjectId()
+    context = {'usuario_nomes': {str(usuario): 'Usuário Benchmark'}}
+    popular(usuario)
+    tarefa_id = str(mongodb.get_collection('Tarefa').find_one({}, {'_id': 1})['_id'])
+
+    def pagina_orm():
+        pagina = list(Tarefa.objects.filter(idUsuario=usuario).order_by('_id')[:LIMIT + 1])
+        return TarefaSerializer(pagina[:LIMIT], many=True, context=context).data
+
+    def pagina_repositorio():
+        documentos, _ = tarefa_repository.page(str(usuario), LIMIT)
+        return tarefa_projecao.render(documentos, context=context)
+
+    def detalhe_orm():
+        tarefa = Tarefa.objects.get(_id=ObjectId(tarefa_id), idUsuario=usuario)
+        return TarefaSerializer(tarefa, context=context).data
+
+    def detalhe_repositorio():
+        return tarefa_projecao.render_one(tarefa_repository.get(tarefa_id, str(usuario)), context=context)
+
+    try:
+        print(f"📋 Página de {LIMIT} tarefas ({TOTAL} no banco, {REQUISICOES} requisições)")
+        resumo('djongo', pagina_orm)
+        resumo('repositório', pagina_repositorio)
+        print("🔎 Detalhe de uma tarefa")
+        resumo('djongo', detalhe_orm)
+        resumo('repositório', detalhe_repositorio)
+    finally:
+        mongodb.db.client.drop_database('bench_repositorio')
+
+
+if __name__ == '__main__':
+    main()
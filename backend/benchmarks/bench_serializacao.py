@@ -0,0 +1,100 @@
+"""
+Benchmark: renderização JSON de 10k tarefas e 10k clientes.
+
+Compara o JSONRenderer padrão do DRF (ids já convertidos com str(), como
+faziam os SerializerMethodField) com renderers.dumps, usando orjson e o
+fallback da stdlib. Mede tempo e memória alocada (pico do tracemalloc).
+
+Não precisa de banco. Uso (a partir de backend/):
+    python benchmarks/bench_serializacao.py
+"""
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import django
+from django.conf import settings
+
+settings.configure(SECRET_KEY='bench-serializacao', INSTALLED_APPS=['rest_framework'])
+django.setup()
+
+from bson import ObjectId
+from rest_framework.renderers import JSONRenderer
+
+from espacoBK import renderers
+
+TOTAL = int(os.getenv('BENCH_TOTAL', 10_000))
+REPETICOES = int(os.getenv('BENCH_REPETICOES', 5))
+
+
+def gerar_tarefa(i, usuario):
+    inicio = datetime(2024, 1, 1) + timedelta(hours=i)
+    return {
+        'id': ObjectId(), 'idUsuario': str(usuario), 'titulo': f'Tarefa {i}',
+        'descricao': 'Ligar para o cliente e confirmar o orçamento ' * 3,
+        'status': '1' if i % 3 else '2', 'prioridade': 'media', 'prioridade_texto': 'Média',
+        'data_inicio': inicio, 'data_termino': inicio + timedelta(days=7),
+        'is_completed': i % 3 == 0, 'usuario_nome': 'Maria Conceição', 'idCampanha': str(ObjectId()),
+    }
+
+
+def gerar_cliente(i):
+    return {
+        'id': ObjectId(), 'razao_social': f'Araújo Comércio Ltda {i}', 'nome': f'João Silva {i}',
+        'telefone': '(11) 3333-4444', 'celular': '(11) 99999-8888', 'email': f'cliente{i}@espacobk.com',
+        'cidade': 'São Paulo', 'empresa': 'Espaço BK', 'cpf_cnpj': '12.345.678/0001-90', 'RG': '12.345.678-9',
+        'data_nascimento': datetime(1980, 5, 17), 'endereco': 'Rua das Flores, 123 - Centro',
+        'observacoes': 'Prefere contato pela manhã.', 'vendedor': 'Ana',
+    }
+
+
+def com_ids_em_texto(dados):
+    """Como o caminho antigo entregava os dados ao renderer: ids já em str"""
+    return [{**item, 'id': str(item['id'])} for item in dados]
+
+
+def medir(nome, funcao):
+    tempos = []
+    for _ in range(REPETICOES):
+        inicio = time.perf_counter()
+        saida = funcao()
+        tempos.append((time.perf_counter() - inicio) * 1000)
+
+    tracemalloc.start()
+    funcao()
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"   {nome:<28} mediana {statistics.median(tempos):8.1f} ms   "
+          f"pico {pico / 1024 / 1024:6.1f} MiB   {len(saida) / 1024:8.0f} KiB")
+
+
+def main():
+    usuario = ObjectId()
+    conjuntos = {
+        'tarefas': [gerar_tarefa(i, usuario) for i in range(TOTAL)],
+        'clientes': [gerar_cliente(i) for i in range(TOTAL)],
+    }
+    drf = JSONRenderer()
+    otimizado = renderers.MongoJSONRenderer()
+    backend_orjson = renderers.orjson
+
+    for nome, dados in conjuntos.items():
+        print(f"📦 {TOTAL} {nome}")
+        resposta = {'success': True, nome: dados}
+        medir('DRF JSONRenderer (str ids)', lambda: drf.render({'success': True, nome: com_ids_em_texto(dados)}))
+        if backend_orjson is not None:
+            medir('MongoJSONRenderer (orjson)', lambda: otimizado.render(resposta))
+        renderers.orjson = None
+        try:
+            medir('MongoJSONRenderer (stdlib)', lambda: otimizado.render(resposta))
+        finally:
+            renderers.orjson = backend_orjson
+
+
+if __name__ == '__main__':
+    main()
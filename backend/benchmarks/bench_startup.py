@@ -0,0 +1,46 @@
+"""
+Benchmark: tempo de import de espacoBK.database sem banco acessível.
+
+Cada medição roda em um processo novo, com DB_HOST apontando para um
+endereço que não responde. O import não deve abrir conexão nenhuma.
+
+Uso (a partir de backend/):
+    python benchmarks/bench_startup.py
+"""
+import os
+import statistics
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RODADAS = int(os.getenv('BENCH_RODADAS', 10))
+
+SCRIPT = (
+    "import time; inicio = time.perf_counter(); "
+    "import espacoBK.database; "
+    "print(time.perf_counter() - inicio)"
+)
+
+
+def medir():
+    env = dict(os.environ)
+    # 10.255.255.1 não responde: qualquer tentativa de conexão estouraria o timeout
+    env['DB_HOST'] = 'mongodb://10.255.255.1:27017/?serverSelectionTimeoutMS=10000'
+    resultado = subprocess.run(
+        [sys.executable, '-c', SCRIPT],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True, timeout=120
+    )
+    if resultado.returncode != 0:
+        raise SystemExit(f"❌ Import falhou:\n{resultado.stderr}")
+    return float(resultado.stdout.strip().splitlines()[-1]) * 1000
+
+
+def main():
+    print(f"⏱️  Importando espacoBK.database {RODADAS}x sem banco acessível...")
+    tempos = [medir() for _ in range(RODADAS)]
+    print(f"   mediana {statistics.median(tempos):.1f} ms   "
+          f"mín {min(tempos):.1f} ms   máx {max(tempos):.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
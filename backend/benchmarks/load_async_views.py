@@ -0,0 +1,88 @@
+"""
+Teste de carga: listagens síncronas (PyMongo) x assíncronas (Motor).
+
+Suba o mesmo projeto duas vezes, com o MESMO número de workers, apontando
+para um mongod local (DB_HOST=mongodb://localhost:27017):
+
+    gunicorn backend.wsgi -w 2 -b 127.0.0.1:8001
+    uvicorn backend.asgi:application --workers 2 --port 8002
+
+E rode (a partir de backend/):
+    BENCH_EMAIL=... BENCH_SENHA=... python benchmarks/load_async_views.py
+
+O script faz login em cada servidor e dispara requisições concorrentes
+contra /api/tarefas/ (WSGI) e /api/async/tarefas/ (ASGI).
+"""
+import asyncio
+import os
+import statistics
+import time
+
+import httpx
+
+SYNC_URL = os.getenv('BENCH_SYNC_URL', 'http://127.0.0.1:8001')
+ASYNC_URL = os.getenv('BENCH_ASYNC_URL', 'http://127.0.0.1:8002')
+EMAIL = os.getenv('BENCH_EMAIL')
+SENHA = os.getenv('BENCH_SENHA')
+CONCORRENCIA = int(os.getenv('BENCH_CONCORRENCIA', 64))
+REQUISICOES = int(os.getenv('BENCH_REQUISICOES', 2000))
+
+
+async def login(client):
+    resposta = await client.post('/api/auth/login/', json={'email': EMAIL, 'senha': SENHA})
+    resposta.raise_for_status()
+
+
+async def carga(base_url, caminho):
+    latencias = []
+    erros = 0
+    fila = asyncio.Queue()
+    for _ in range(REQUISICOES):
+        fila.put_nowait(None)
+
+    limites = httpx.Limits(max_connections=CONCORRENCIA)
+    async with httpx.AsyncClient(base_url=base_url, limits=limites, timeout=60) as client:
+        await login(client)
+
+        async def worker():
+            nonlocal erros
+            while not fila.empty():
+                fila.get_nowait()
+                inicio = time.perf_counter()
+                resposta = await client.get(caminho)
+                latencias.append(time.perf_counter() - inicio)
+                if resposta.status_code != 200:
+                    erros += 1
+
+        inicio = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(CONCORRENCIA)))
+        duracao = time.perf_counter() - inicio
+
+    latencias.sort()
+    return {
+        'rps': REQUISICOES / duracao,
+        'p50': statistics.median(latencias) * 1000,
+        'p95': latencias[int(len(latencias) * 0.95) - 1] * 1000,
+        'erros': erros,
+    }
+
+
+def imprimir(nome, resultado):
+    print(f"   {nome:<8} {resultado['rps']:>8.1f} req/s   p50 {resultado['p50']:>7.1f} ms   "
+          f"p95 {resultado['p95']:>7.1f} ms   erros {resultado['erros']}")
+
+
+async def main():
+    if not EMAIL or not SENHA:
+        raise SystemExit("❌ Defina BENCH_EMAIL e BENCH_SENHA")
+
+    print(f"🚀 {REQUISICOES} requisições, concorrência {CONCORRENCIA}")
+    sincrono = await carga(SYNC_URL, '/api/tarefas/')
+    imprimir('WSGI', sincrono)
+    assincrono = await carga(ASYNC_URL, '/api/async/tarefas/')
+    imprimir('ASGI', assincrono)
+    print(f"\n📈 Ganho de throughput: {assincrono['rps'] / sincrono['rps']:.2f}x")
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
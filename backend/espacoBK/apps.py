@@ -4,3 +4,11 @@ from django.apps import AppConfig
 class EspacobkConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'espacoBK'
+
+    def ready(self):
+        # Perfil por requisição dos comandos Mongo (antes de qualquer cliente ser criado)
+        from .profiler import register_command_listener
+        register_command_listener()
+
+        # Receiver do sinal escrita: as escritas dos serviços viram eventos em tempo real
+        from . import realtime  # noqa: F401
@@ -0,0 +1,500 @@
+import asyncio
+import os
+import logging
+import weakref
+from datetime import datetime
+
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument
+
+from .database import (
+    CLIENTES_SCOPE, TAREFA_STATS_PROJECTION, CampanhaStatsService, ExclusaoService, TarefaService,
+    VersaoService, cliente_service, notify_write, stats_delta, task_owner, tarefas_scope, usuario_service
+)
+from .passwords import ahash_password, averify_password
+from .metrics import pool_listener
+from .search import CAMPOS_BUSCA, campos_busca, filtro_busca, pipeline_busca
+
+logger = logging.getLogger(__name__)
+
+class AsyncMongoDB:
+    """Clientes Motor compartilhados: um por event loop, criado no primeiro uso"""
+    _instance = None
+    # Um cliente Motor não pode ser compartilhado entre event loops: cada loop
+    # mantém o seu (loop -> (cliente, database)), descartado junto com o loop
+    _clients = weakref.WeakKeyDictionary()
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(AsyncMongoDB, cls).__new__(cls)
+        return cls._instance
+
+    def connect(self, loop):
+        """Cria o cliente Motor do event loop informado"""
+        connection_string = os.getenv('DB_HOST')
+        database_name = os.getenv('MONGO_DATABASE', 'Espaco_BK')
+
+        if not connection_string:
+            raise ValueError("DB_HOST não encontrado no arquivo .env")
+
+        client = AsyncIOMotorClient(
+            connection_string,
+            io_loop=loop,
+            serverSelectionTimeoutMS=10000,
+            connectTimeoutMS=20000,
+            maxPoolSize=50,
+            retryWrites=True,
+            event_listeners=[pool_listener]
+        )
+        db = client[database_name]
+        self._clients[loop] = (client, db)
+        logger.info(f"✅ Cliente Motor criado: {database_name}")
+        return db
+
+    @property
+    def db(self):
+        """Retorna o database ligado ao event loop em execução"""
+        loop = asyncio.get_running_loop()
+        conexao = self._clients.get(loop)
+        return conexao[1] if conexao is not None else self.connect(loop)
+
+    def get_collection(self, name):
+        """Retorna uma collection específica"""
+        return self.db[name]
+
+    def close(self):
+        """Fecha as conexões de todos os event loops"""
+        for client, _ in list(self._clients.values()):
+            client.close()
+        self._clients.clear()
+
+# Instância global
+async_mongodb = AsyncMongoDB()
+
+class AsyncUsuarioService:
+    collection_name = 'Usuario'
+
+    @property
+    def collection(self):
+        return async_mongodb.get_collection(self.collection_name)
+
+    async def find_all(self, limit=None):
+        """Busca todos os usuários"""
+        try:
+            cursor = self.collection.find({})
+            if limit:
+                cursor = cursor.limit(limit)
+            return await cursor.to_list(length=None)
+        except Exception as e:
+            logger.error(f"Erro ao buscar usuários: {e}")
+            return []
+
+    async def find_by_id(self, user_id):
+        """Busca usuário por ID (sem a senha; mesmo cache do UsuarioService)"""
+        try:
+            cache = usuario_service.cache
+            user = cache.get(str(user_id))
+            if user is None:
+                user = await self.collection.find_one({'_id': ObjectId(user_id)}, {'senha': 0})
+                if user is not None:
+                    cache.set(str(user_id), user)
+            return user
+        except Exception as e:
+            logger.error(f"Erro ao buscar usuário por ID: {e}")
+            return None
+
+    async def find_by_email(self, email):
+        """Busca usuário por email"""
+        try:
+            return await self.collection.find_one({'email': email})
+        except Exception as e:
+            logger.error(f"Erro ao buscar usuário por email: {e}")
+            return None
+
+    async def find_names(self, user_ids):
+        """Resolve os nomes de vários usuários com uma única consulta ($in)"""
+        ids = [ObjectId(str(_id)) for _id in user_ids if _id and ObjectId.is_valid(str(_id))]
+        if not ids:
+            return {}
+        try:
+            cursor = self.collection.find({'_id': {'$in': ids}}, {'nome': 1})
+            return {str(usuario['_id']): usuario.get('nome') async for usuario in cursor}
+        except Exception as e:
+            logger.error(f"Erro ao buscar nomes de usuários: {e}")
+            return {}
+
+    async def create(self, user_data):
+        """Cria um novo usuário"""
+        try:
+            # Senha vinda da API é sempre texto: um valor com cara de hash também é hasheado
+            if user_data.get('senha'):
+                user_data['senha'] = await ahash_password(user_data['senha'])
+            user_data['created_at'] = datetime.now()
+            user_data['updated_at'] = datetime.now()
+
+            result = await self.collection.insert_one(user_data)
+            usuario_service.cache.delete(str(result.inserted_id))
+            logger.info(f"✅ Usuário criado: {result.inserted_id}")
+            return str(result.inserted_id)
+        except Exception as e:
+            logger.error(f"Erro ao criar usuário: {e}")
+            return None
+
+    async def update(self, user_id, update_data):
+        """Atualiza um usuário"""
+        try:
+            # Senha vinda da API é sempre texto: um valor com cara de hash também é hasheado
+            if update_data.get('senha'):
+                update_data['senha'] = await ahash_password(update_data['senha'])
+            update_data['updated_at'] = datetime.now()
+            result = await self.collection.update_one(
+                {'_id': ObjectId(user_id)},
+                {'$set': update_data}
+            )
+            usuario_service.cache.delete(str(user_id))
+            return result.modified_count > 0
+        except Exception as e:
+            logger.error(f"Erro ao atualizar usuário: {e}")
+            return False
+
+    async def delete(self, user_id):
+        """Remove um usuário"""
+        try:
+            result = await self.collection.delete_one({'_id': ObjectId(user_id)})
+            usuario_service.cache.delete(str(user_id))
+            return result.deleted_count > 0
+        except Exception as e:
+            logger.error(f"Erro ao deletar usuário: {e}")
+            return False
+
+    async def count(self):
+        """Conta total de usuários"""
+        try:
+            return await self.collection.count_documents({})
+        except Exception as e:
+            logger.error(f"Erro ao contar usuários: {e}")
+            return 0
+
+    async def authenticate(self, email, senha):
+        """Autentica um usuário (hash verificado no pool de threads)"""
+        try:
+            user = await self.find_by_email(email)
+            valida, atualizar = await averify_password(senha, user.get('senha')) if user else (False, False)
+            if valida:
+                if atualizar:
+                    user['senha'] = await ahash_password(senha)
+                    await self.collection.update_one({'_id': user['_id']}, {'$set': {'senha': user['senha']}})
+                    usuario_service.cache.delete(str(user['_id']))
+                    logger.info(f"🔐 Senha atualizada para hash: {user['_id']}")
+                logger.info(f"✅ Usuário autenticado: {email}")
+                return user
+            logger.warning(f"❌ Falha na autenticação: {email}")
+            return None
+        except Exception as e:
+            logger.error(f"Erro na autenticação: {e}")
+            return None
+
+class AsyncTarefaService:
+    collection_name = 'Tarefa'
+
+    @property
+    def collection(self):
+        return async_mongodb.get_collection(self.collection_name)
+
+    async def find_all(self, limit=None):
+        """Busca todas as tarefas"""
+        try:
+            cursor = self.collection.find({})
+            if limit:
+                cursor = cursor.limit(limit)
+            return await cursor.to_list(length=None)
+        except Exception as e:
+            logger.error(f"Erro ao buscar tarefas: {e}")
+            return []
+
+    async def find_by_user(self, user_id, after=None, limit=None, projection=None):
+        """Busca tarefas por usuário (opcionalmente paginadas por _id)"""
+        try:
+            query = TarefaService.user_filter(user_id)
+            if after:
+                query = {'$and': [query, {'_id': {'$gt': after}}]}
+            cursor = self.collection.find(query, projection).sort('_id', 1)
+            if limit:
+                cursor = cursor.limit(limit)
+            return await cursor.to_list(length=None)
+        except Exception as e:
+            logger.error(f"Erro ao buscar tarefas por usuário: {e}")
+            return []
+
+    async def find_by_id(self, task_id, user_id=None):
+        """Busca tarefa por ID (do usuário, se informado)"""
+        try:
+            return await self.collection.find_one(TarefaService.owned_filter(task_id, user_id))
+        except Exception as e:
+            logger.error(f"Erro ao buscar tarefa por ID: {e}")
+            return None
+
+    async def create(self, task_data):
+        """Cria uma nova tarefa"""
+        try:
+            task_data['created_at'] = datetime.now()
+            task_data['updated_at'] = datetime.now()
+            TarefaService.convert_dates(task_data)
+
+            result = await self.collection.insert_one(task_data)
+            await async_versao_service.bump(tarefas_scope(task_data.get('idUsuario')))
+            await async_campanha_stats_service.apply(stats_delta(depois=task_data))
+            notify_write(self.collection_name, 'insert', result.inserted_id, task_data.get('idUsuario'), task_data)
+            logger.info(f"✅ Tarefa criada: {result.inserted_id}")
+            return str(result.inserted_id)
+        except Exception as e:
+            logger.error(f"Erro ao criar tarefa: {e}")
+            return None
+
+    async def update(self, task_id, update_data, user_id=None):
+        """Atualiza uma tarefa (do usuário, se informado). Retorna a tarefa atualizada"""
+        try:
+            update_data['updated_at'] = datetime.now()
+            TarefaService.convert_dates(update_data)
+            antes = await self.collection.find_one_and_update(
+                TarefaService.owned_filter(task_id, user_id),
+                {'$set': update_data}
+            )
+            if antes is None:
+                return None
+            tarefa = {**antes, **update_data}
+            await async_versao_service.bump(tarefas_scope(task_owner(antes)))
+            await async_campanha_stats_service.apply(stats_delta(antes, tarefa))
+            notify_write(self.collection_name, 'update', antes['_id'], task_owner(antes), tarefa)
+            return tarefa
+        except Exception as e:
+            logger.error(f"Erro ao atualizar tarefa: {e}")
+            return None
+
+    async def delete(self, task_id, user_id=None):
+        """Remove uma tarefa (do usuário, se informado)"""
+        try:
+            tarefa = await self.collection.find_one_and_delete(
+                TarefaService.owned_filter(task_id, user_id),
+                projection=TAREFA_STATS_PROJECTION
+            )
+            if tarefa is None:
+                return False
+            await async_exclusao_service.record(self.collection_name, [tarefa['_id']], task_owner(tarefa))
+            await async_versao_service.bump(tarefas_scope(task_owner(tarefa)))
+            await async_campanha_stats_service.apply(stats_delta(antes=tarefa))
+            notify_write(self.collection_name, 'delete', tarefa['_id'], task_owner(tarefa))
+            return True
+        except Exception as e:
+            logger.error(f"Erro ao deletar tarefa: {e}")
+            return False
+
+    async def count(self, user_id=None):
+        """Conta total de tarefas (ou as de um usuário)"""
+        try:
+            query = TarefaService.user_filter(user_id) if user_id else {}
+            return await self.collection.count_documents(query)
+        except Exception as e:
+            logger.error(f"Erro ao contar tarefas: {e}")
+            return 0
+
+class AsyncClienteService:
+    collection_name = 'Cliente'
+
+    @property
+    def collection(self):
+        return async_mongodb.get_collection(self.collection_name)
+
+    async def find_all(self, limit=None, after=None, projection=None):
+        """Busca todos os clientes (opcionalmente paginados por _id)"""
+        try:
+            query = {'_id': {'$gt': after}} if after else {}
+            cursor = self.collection.find(query, projection).sort('_id', 1)
+            if limit:
+                cursor = cursor.limit(limit)
+            return await cursor.to_list(length=None)
+        except Exception as e:
+            logger.error(f"Erro ao buscar clientes: {e}")
+            return []
+
+    async def find_by_id(self, client_id):
+        """Busca cliente por ID"""
+        try:
+            return await self.collection.find_one({'_id': ObjectId(client_id)})
+        except Exception as e:
+            logger.error(f"Erro ao buscar cliente por ID: {e}")
+            return None
+
+    def search_filter(self, query):
+        """Monta o filtro usado pela busca de clientes"""
+        return filtro_busca(query)
+
+    async def search(self, query, limit=50, offset=0):
+        """Busca clientes por nome, cidade, etc. (ordenados por relevância)"""
+        try:
+            cursor = self.collection.aggregate(pipeline_busca(query, limit, offset))
+            return await cursor.to_list(length=None)
+        except Exception as e:
+            logger.error(f"Erro ao buscar clientes: {e}")
+            return []
+
+    async def create(self, client_data):
+        """Cria um novo cliente"""
+        try:
+            client_data['created_at'] = datetime.now()
+            client_data['updated_at'] = datetime.now()
+            client_data.update(campos_busca(client_data))
+
+            result = await self.collection.insert_one(client_data)
+            cliente_service.cache.delete(str(result.inserted_id))
+            await async_versao_service.bump(CLIENTES_SCOPE)
+            notify_write(self.collection_name, 'insert', result.inserted_id, documento=client_data)
+            logger.info(f"✅ Cliente criado: {result.inserted_id}")
+            return str(result.inserted_id)
+        except Exception as e:
+            logger.error(f"Erro ao criar cliente: {e}")
+            return None
+
+    async def update(self, client_id, update_data):
+        """Atualiza um cliente"""
+        try:
+            update_data['updated_at'] = datetime.now()
+
+            # Manter a chave de busca em dia quando nome/cidade mudarem
+            if any(campo in update_data for campo in CAMPOS_BUSCA):
+                atual = await self.collection.find_one(
+                    {'_id': ObjectId(client_id)},
+                    {campo: 1 for campo in CAMPOS_BUSCA}
+                ) or {}
+                update_data.update(campos_busca({**atual, **update_data}))
+
+            # Documento atualizado: vai no evento de escrita
+            cliente = await self.collection.find_one_and_update(
+                {'_id': ObjectId(client_id)},
+                {'$set': update_data},
+                return_document=ReturnDocument.AFTER
+            )
+            cliente_service.cache.delete(str(client_id))
+            if cliente is None:
+                return False
+            await async_versao_service.bump(CLIENTES_SCOPE)
+            notify_write(self.collection_name, 'update', cliente['_id'], documento=cliente)
+            return True
+        except Exception as e:
+            logger.error(f"Erro ao atualizar cliente: {e}")
+            return False
+
+    async def delete(self, client_id):
+        """Remove um cliente"""
+        try:
+            result = await self.collection.delete_one({'_id': ObjectId(client_id)})
+            cliente_service.cache.delete(str(client_id))
+            if result.deleted_count:
+                await async_exclusao_service.record(self.collection_name, [ObjectId(client_id)])
+                notify_write(self.collection_name, 'delete', ObjectId(client_id))
+            await async_versao_service.bump(CLIENTES_SCOPE)
+            return result.deleted_count > 0
+        except Exception as e:
+            logger.error(f"Erro ao deletar cliente: {e}")
+            return False
+
+    async def count(self):
+        """Conta total de clientes"""
+        try:
+            return await self.collection.count_documents({})
+        except Exception as e:
+            logger.error(f"Erro ao contar clientes: {e}")
+            return 0
+
+class AsyncCampanhaService:
+    collection_name = 'Campanha'
+
+    @property
+    def collection(self):
+        return async_mongodb.get_collection(self.collection_name)
+
+    async def find_all(self, limit=None):
+        """Busca todas as campanhas"""
+        try:
+            cursor = self.collection.find({})
+            if limit:
+                cursor = cursor.limit(limit)
+            return await cursor.to_list(length=None)
+        except Exception as e:
+            logger.error(f"Erro ao buscar campanhas: {e}")
+            return []
+
+    async def find_by_id(self, campaign_id):
+        """Busca campanha por ID"""
+        try:
+            return await self.collection.find_one({'_id': ObjectId(campaign_id)})
+        except Exception as e:
+            logger.error(f"Erro ao buscar campanha por ID: {e}")
+            return None
+
+    async def count(self):
+        """Conta total de campanhas"""
+        try:
+            return await self.collection.count_documents({})
+        except Exception as e:
+            logger.error(f"Erro ao contar campanhas: {e}")
+            return 0
+
+class AsyncVersaoService:
+    """Marcadores de versão (ver VersaoService), gravados pelo Motor"""
+    collection_name = VersaoService.collection_name
+
+    @property
+    def collection(self):
+        return async_mongodb.get_collection(self.collection_name)
+
+    async def bump(self, *scopes):
+        """Incrementa a versão dos escopos alterados"""
+        try:
+            await self.collection.bulk_write(VersaoService.requests(scopes), ordered=False)
+        except Exception as e:
+            logger.error(f"Erro ao atualizar versão de {scopes}: {e}")
+
+class AsyncExclusaoService:
+    """Registro de exclusões (ver ExclusaoService), gravado pelo Motor"""
+    collection_name = ExclusaoService.collection_name
+
+    @property
+    def collection(self):
+        return async_mongodb.get_collection(self.collection_name)
+
+    async def record(self, collection_name, doc_ids, owner=None):
+        """Registra a exclusão de documentos de uma collection"""
+        try:
+            await self.collection.insert_many(
+                ExclusaoService.documents(collection_name, doc_ids, owner), ordered=False
+            )
+        except Exception as e:
+            logger.error(f"Erro ao registrar exclusões em {collection_name}: {e}")
+
+class AsyncCampanhaStatsService:
+    """Estatísticas por campanha (ver CampanhaStatsService), mantidas pelo Motor"""
+    collection_name = CampanhaStatsService.collection_name
+
+    @property
+    def collection(self):
+        return async_mongodb.get_collection(self.collection_name)
+
+    async def apply(self, deltas):
+        """Aplica as variações de stats_delta com um único bulk_write"""
+        if not deltas:
+            return
+        try:
+            await self.collection.bulk_write(CampanhaStatsService.requests(deltas), ordered=False)
+        except Exception as e:
+            logger.error(f"Erro ao atualizar estatísticas de campanhas: {e}")
+
+# Instâncias dos serviços assíncronos
+async_usuario_service = AsyncUsuarioService()
+async_tarefa_service = AsyncTarefaService()
+async_cliente_service = AsyncClienteService()
+async_campanha_service = AsyncCampanhaService()
+async_versao_service = AsyncVersaoService()
+async_exclusao_service = AsyncExclusaoService()
+async_campanha_stats_service = AsyncCampanhaStatsService()
@@ -0,0 +1,122 @@
+import os
+
+from asgiref.sync import sync_to_async
+from django.core import signing
+from rest_framework.authentication import BaseAuthentication, SessionAuthentication, get_authorization_header
+from rest_framework.exceptions import AuthenticationFailed
+
+# Validade dos tokens (segundos)
+ACCESS_TTL = int(os.getenv('AUTH_ACCESS_TTL', 15 * 60))
+REFRESH_TTL = int(os.getenv('AUTH_REFRESH_TTL', 14 * 24 * 60 * 60))
+
+# Salts distintos: um refresh token não é aceito como access token (e vice-versa)
+_SALT_ACCESS = 'espacoBK.auth.access'
+_SALT_REFRESH = 'espacoBK.auth.refresh'
+
+
+def issue_tokens(usuario_id, nome=None, versao=0):
+    """Par de tokens assinados (HMAC com a SECRET_KEY) para o usuário.
+
+    O refresh leva a versão de tokens do usuário (token_versao): o logout
+    incrementa a versão e os refresh tokens emitidos antes deixam de valer.
+    """
+    dados = {'uid': str(usuario_id), 'nome': nome}
+    return {
+        'access': signing.dumps(dados, salt=_SALT_ACCESS),
+        'refresh': signing.dumps({**dados, 'tv': versao}, salt=_SALT_REFRESH),
+        'expires_in': ACCESS_TTL,
+    }
+
+
+def verify_access(token):
+    """Dados do access token; levanta signing.SignatureExpired/BadSignature"""
+    return signing.loads(token, salt=_SALT_ACCESS, max_age=ACCESS_TTL)
+
+
+def verify_refresh(token):
+    """Dados do refresh token; levanta signing.SignatureExpired/BadSignature"""
+    return signing.loads(token, salt=_SALT_REFRESH, max_age=REFRESH_TTL)
+
+
+class UsuarioAutenticado:
+    """Usuário da requisição montado sem consultar o banco"""
+    is_authenticated = True
+    is_anonymous = False
+
+    def __init__(self, usuario_id, nome=None):
+        self.usuario_id = usuario_id
+        self.nome = nome
+
+    def __str__(self):
+        return self.usuario_id
+
+
+def bearer_token(request):
+    """Token do cabeçalho Authorization: Bearer <token> (ou None)"""
+    partes = get_authorization_header(request).split()
+    if not partes or partes[0].lower() != b'bearer':
+        return None
+    if len(partes) != 2:
+        raise AuthenticationFailed('Cabeçalho Authorization inválido.')
+    try:
+        return partes[1].decode()
+    except UnicodeError:
+        raise AuthenticationFailed('Cabeçalho Authorization inválido.')
+
+
+def usuario_do_token(request):
+    """Valida o bearer token (só CPU); None quando a requisição não traz token"""
+    token = bearer_token(request)
+    if token is None:
+        return None
+    try:
+        dados = verify_access(token)
+    except signing.SignatureExpired:
+        raise AuthenticationFailed('Token expirado.')
+    except signing.BadSignature:
+        raise AuthenticationFailed('Token inválido.')
+    return UsuarioAutenticado(dados['uid'], dados.get('nome'))
+
+
+async def usuario_async(request):
+    """Usuário das views assíncronas (fora do DRF): bearer token ou sessão.
+
+    Token inválido ou expirado conta como não autenticado (None), como a
+    sessão ausente; a leitura da sessão vai para thread porque pode ir ao banco.
+    """
+    try:
+        usuario = usuario_do_token(request)
+    except AuthenticationFailed:
+        return None
+    if usuario is not None:
+        return usuario
+    sessao = getattr(request, 'session', None)
+    if sessao is None:
+        return None
+    usuario_id = await sync_to_async(sessao.get)('usuario_id')
+    if not usuario_id:
+        return None
+    return UsuarioAutenticado(usuario_id, await sync_to_async(sessao.get)('usuario_nome'))
+
+
+class SignedTokenAuthentication(BaseAuthentication):
+    """Access token assinado e com validade, verificado sem ir ao banco"""
+
+    def authenticate(self, request):
+        usuario = usuario_do_token(request)
+        return (usuario, None) if usuario else None
+
+    def authenticate_header(self, request):
+        return 'Bearer'
+
+
+class SessaoAuthentication(SessionAuthentication):
+    """Compatibilidade: usuário gravado na sessão pelo login (com checagem de CSRF, como no DRF)"""
+
+    def authenticate(self, request):
+        sessao = getattr(request._request, 'session', None)
+        usuario_id = sessao.get('usuario_id') if sessao is not None else None
+        if not usuario_id:
+            return None
+        self.enforce_csrf(request)
+        return (UsuarioAutenticado(usuario_id, sessao.get('usuario_nome')), None)
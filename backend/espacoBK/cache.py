@@ -0,0 +1,171 @@
+import copy
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# Caches criados pelos serviços, por nome (para expor os contadores)
+_registry = {}
+
+
+class NullCache:
+    """Cache desligado: toda leitura é um miss"""
+    backend = 'none'
+
+    def __init__(self):
+        self.misses = 0
+
+    def get(self, key):
+        self.misses += 1
+        return None
+
+    def set(self, key, value):
+        pass
+
+    def delete(self, key):
+        pass
+
+    def clear(self):
+        pass
+
+    def stats(self):
+        return {'backend': self.backend, 'hits': 0, 'misses': self.misses, 'hit_ratio': 0.0}
+
+
+class LRUCache:
+    """Cache LRU em memória (por processo) com expiração por TTL"""
+    backend = 'lru'
+
+    def __init__(self, maxsize=1024, ttl=60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            value, expires_at = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+        # Cópia profunda: quem chama pode alterar o documento (inclusive listas e
+        # subdocumentos) sem sujar o cache
+        return copy.deepcopy(value)
+
+    def set(self, key, value):
+        value = copy.deepcopy(value)
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'backend': self.backend,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+            'size': len(self._data),
+            'maxsize': self.maxsize,
+            'ttl': self.ttl,
+            'hit_ratio': self.hits / total if total else 0.0,
+        }
+
+
+class DjangoCache:
+    """Cache compartilhado entre processos usando o framework de cache do Django"""
+    backend = 'django'
+
+    def __init__(self, name, alias='default', ttl=60):
+        self.prefix = f'mongo:{name}:'
+        self.alias = alias
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def _cache(self):
+        from django.core.cache import caches
+        return caches[self.alias]
+
+    def get(self, key):
+        value = self._cache.get(self.prefix + key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def set(self, key, value):
+        self._cache.set(self.prefix + key, value, self.ttl)
+
+    def delete(self, key):
+        self._cache.delete(self.prefix + key)
+
+    def clear(self):
+        # Não limpar o cache inteiro do Django: as chaves expiram pelo TTL
+        pass
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'backend': self.backend,
+            'alias': self.alias,
+            'hits': self.hits,
+            'misses': self.misses,
+            'ttl': self.ttl,
+            'hit_ratio': self.hits / total if total else 0.0,
+        }
+
+
+def build_cache(name, backend=None, ttl=None):
+    """Cria o cache de um serviço conforme as variáveis de ambiente.
+
+    MONGO_CACHE_BACKEND: lru (padrão), django ou none
+    MONGO_CACHE_TTL: segundos (padrão 60)
+    MONGO_CACHE_MAXSIZE: documentos por serviço no LRU (padrão 1024)
+    MONGO_CACHE_ALIAS: alias em CACHES para o backend django (padrão default)
+
+    backend e ttl, quando informados, têm precedência sobre o ambiente.
+    """
+    backend = (backend or os.getenv('MONGO_CACHE_BACKEND', 'lru')).lower()
+    ttl = int(ttl if ttl is not None else os.getenv('MONGO_CACHE_TTL', 60))
+
+    if backend == 'none':
+        cache = NullCache()
+    elif backend == 'django':
+        cache = DjangoCache(name, alias=os.getenv('MONGO_CACHE_ALIAS', 'default'), ttl=ttl)
+    else:
+        cache = LRUCache(maxsize=int(os.getenv('MONGO_CACHE_MAXSIZE', 1024)), ttl=ttl)
+
+    _registry[name] = cache
+    return cache
+
+
+def cache_stats():
+    """Contadores de todos os caches dos serviços"""
+    return {name: cache.stats() for name, cache in _registry.items()}
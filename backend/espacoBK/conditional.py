@@ -0,0 +1,41 @@
+import hashlib
+
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+
+from .database import versao_service
+
+
+def check_version(request, scope):
+    """Compara If-None-Match/If-Modified-Since com a versão do escopo.
+
+    Custa uma leitura por _id na collection Versao. Retorna
+    (resposta 304 ou None, validadores para a resposta completa).
+    """
+    versao, alterado_em = versao_service.get(scope)
+    if versao is None:
+        return None, None
+
+    # A representação depende da URL (página, fields=...), não só da versão
+    assinatura = f'{scope}:{versao}:{request.get_full_path()}'
+    validadores = {
+        'etag': '"%s"' % hashlib.md5(assinatura.encode()).hexdigest(),
+        'last_modified': int(alterado_em.timestamp()) if alterado_em else None,
+    }
+
+    resposta = get_conditional_response(request, **validadores)
+    if resposta is not None:
+        set_validators(resposta, validadores)
+    return resposta, validadores
+
+
+def set_validators(response, validadores):
+    """Adiciona ETag/Last-Modified à resposta"""
+    if not validadores:
+        return response
+    response['ETag'] = validadores['etag']
+    if validadores['last_modified']:
+        response['Last-Modified'] = http_date(validadores['last_modified'])
+    # O cliente pode guardar a resposta, mas deve revalidar a cada uso
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
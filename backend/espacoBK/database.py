@@ -1,10 +1,18 @@
 import os
-from pymongo import MongoClient
+from pymongo import ASCENDING, DESCENDING, MongoClient, DeleteOne, ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError
 from bson import ObjectId
-from datetime import datetime
+from datetime import date, datetime
 import logging
-from urllib.parse import quote_plus
+import threading
 from dotenv import load_dotenv
+from django.dispatch import Signal
+
+from .cache import build_cache
+from .metrics import instrument, pool_listener
+from .passwords import hash_password, verify_password
+from .sync import changed_filter
+from .search import CAMPOS_BUSCA, campos_busca, filtro_busca, pipeline_busca
 
 # Carregar variáveis de ambiente
 load_dotenv()
@@ -17,18 +25,16 @@ class MongoDB:
     _instance = None
     _client = None
     _db = None
+    _pid = None
+    _lock = threading.Lock()
     
     def __new__(cls):
         if cls._instance is None:
             cls._instance = super(MongoDB, cls).__new__(cls)
         return cls._instance
     
-    def __init__(self):
-        if self._client is None:
-            self.connect()
-    
     def connect(self):
-        """Conecta ao MongoDB Atlas"""
+        """Conecta ao MongoDB Atlas (uma vez por processo, no primeiro uso)"""
         try:
             # Usar a string de conexão completa do .env
             connection_string = os.getenv('DB_HOST')
@@ -37,47 +43,63 @@ class MongoDB:
             if not connection_string:
                 raise ValueError("DB_HOST não encontrado no arquivo .env")
             
-            logger.info(f"🔗 Conectando ao MongoDB Atlas...")
+            logger.info("🔗 Conectando ao MongoDB Atlas...")
             logger.info(f"🎯 Database: {database_name}")
             
             # Conectar com configurações otimizadas para Atlas
-            self._client = MongoClient(
+            client = MongoClient(
                 connection_string,
                 serverSelectionTimeoutMS=10000,
                 connectTimeoutMS=20000,
                 maxPoolSize=50,
-                retryWrites=True
+                retryWrites=True,
+                event_listeners=[pool_listener]
             )
             
             # Testar conexão
-            self._client.admin.command('ping')
+            client.admin.command('ping')
             
             # Definir database
-            self._db = self._client[database_name]
+            self._client = client
+            self._db = client[database_name]
+            self._pid = os.getpid()
             
             logger.info(f"✅ Conectado ao MongoDB Atlas: {database_name}")
             
-            # Listar collections para confirmar
-            collections = self._db.list_collection_names()
-            logger.info(f"📋 Collections encontradas: {collections}")
-            
-            # Mostrar contadores
-            for collection_name in collections:
-                try:
-                    count = self._db[collection_name].count_documents({})
-                    logger.info(f"   📊 {collection_name}: {count} documentos")
-                except:
-                    pass
+            # Contagem por collection é cara em bases grandes: só sob demanda
+            if os.getenv('MONGO_LOG_COLLECTION_COUNTS', '').lower() in ('1', 'true', 'yes'):
+                self.log_collection_counts()
             
         except Exception as e:
             logger.error(f"❌ Erro ao conectar MongoDB Atlas: {e}")
             raise
     
+    def log_collection_counts(self):
+        """Lista as collections e seus contadores (diagnóstico)"""
+        collections = self.db.list_collection_names()
+        logger.info(f"📋 Collections encontradas: {collections}")
+        
+        for collection_name in collections:
+            try:
+                count = self.db[collection_name].count_documents({})
+                logger.info(f"   📊 {collection_name}: {count} documentos")
+            except Exception:
+                pass
+    
+    def reset_after_fork(self):
+        """Descarta o cliente herdado do processo pai (PyMongo não é fork-safe)"""
+        self._client = None
+        self._db = None
+        self._pid = None
+        self._lock = threading.Lock()
+    
     @property
     def db(self):
         """Retorna a instância do banco de dados"""
-        if self._db is None:
-            self.connect()
+        if self._db is None or self._pid != os.getpid():
+            with self._lock:
+                if self._db is None or self._pid != os.getpid():
+                    self.connect()
         return self._db
     
     def get_collection(self, name):
@@ -92,34 +114,114 @@ class MongoDB:
         """Fecha a conexão"""
         if self._client:
             self._client.close()
+            self.reset_after_fork()
 
-# Instância global
+# Instância global (a conexão só é aberta no primeiro uso)
 mongodb = MongoDB()
 
+# Workers do gunicorn criam o próprio cliente após o fork
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=mongodb.reset_after_fork)
+
+# Escritas dos serviços (síncronos e assíncronos). sender é o nome da collection;
+# argumentos: operacao (insert/update/delete), documento_id, owner e documento
+escrita = Signal()
+
+def notify_write(colecao, operacao, documento_id, owner=None, documento=None):
+    """Avisa os receivers de escrita (erros são registrados, nunca quebram a escrita)"""
+    respostas = escrita.send_robust(
+        sender=colecao, operacao=operacao, documento_id=documento_id, owner=owner, documento=documento
+    )
+    for _, resposta in respostas:
+        if isinstance(resposta, Exception):
+            logger.error(f"Erro ao notificar escrita em {colecao}: {resposta}")
+
+# Ordem das páginas por keyset em _id
+PAGE_SORT = [('_id', ASCENDING)]
+
+# Ordem dos feeds de alterações (find_changed/iter_changed)
+CHANGED_SORT = [('updated_at', ASCENDING), ('_id', ASCENDING)]
+
+# Documentos por lote trazidos do servidor pelos iter_*
+BATCH_SIZE = int(os.getenv('MONGO_BATCH_SIZE', 1000))
+
+# Tempo máximo (ms) de uma consulta no servidor; 0 = sem limite
+MAX_TIME_MS = int(os.getenv('MONGO_MAX_TIME_MS', 0))
+
+def iter_find(collection, query=None, projection=None, sort=None, limit=None,
+              batch_size=BATCH_SIZE, max_time_ms=MAX_TIME_MS):
+    """Percorre um find em lotes (memória constante).
+    
+    O cursor é fechado no servidor mesmo se o consumidor parar no meio.
+    Erros (inclusive ExecutionTimeout do max_time_ms) sobem para quem itera.
+    """
+    cursor = collection.find(query or {}, projection).batch_size(batch_size)
+    if sort:
+        cursor = cursor.sort(sort)
+    if limit:
+        cursor = cursor.limit(limit)
+    if max_time_ms:
+        cursor = cursor.max_time_ms(max_time_ms)
+    with cursor:
+        yield from cursor
+
+def iter_aggregate(collection, pipeline, batch_size=BATCH_SIZE, max_time_ms=MAX_TIME_MS):
+    """Como iter_find, para um pipeline de agregação"""
+    opcoes = {'batchSize': batch_size}
+    if max_time_ms:
+        opcoes['maxTimeMS'] = max_time_ms
+    with collection.aggregate(pipeline, **opcoes) as cursor:
+        yield from cursor
+
+@instrument
 class UsuarioService:
-    def __init__(self):
-        # Collection correta: Usuario (como mostrado no Compass)
-        self.collection = mongodb.get_collection('Usuario')
+    # Collection correta: Usuario (como mostrado no Compass)
+    collection_name = 'Usuario'
+    cache = build_cache('Usuario')
+    
+    @property
+    def collection(self):
+        return mongodb.get_collection(self.collection_name)
+    
+    def iter_all(self, query=None, projection=None, sort=None, limit=None,
+                 batch_size=BATCH_SIZE, max_time_ms=MAX_TIME_MS):
+        """Percorre os usuários em lotes"""
+        yield from iter_find(self.collection, query, projection, sort, limit, batch_size, max_time_ms)
     
     def find_all(self, limit=None):
         """Busca todos os usuários"""
         try:
-            cursor = self.collection.find({})
-            if limit:
-                cursor = cursor.limit(limit)
-            return list(cursor)
+            return list(self.iter_all(limit=limit))
         except Exception as e:
             logger.error(f"Erro ao buscar usuários: {e}")
             return []
     
     def find_by_id(self, user_id):
-        """Busca usuário por ID"""
+        """Busca usuário por ID (sem a senha, que nunca vai para o cache)"""
         try:
-            return self.collection.find_one({'_id': ObjectId(user_id)})
+            user = self.cache.get(str(user_id))
+            if user is None:
+                user = self.collection.find_one({'_id': ObjectId(user_id)}, {'senha': 0})
+                if user is not None:
+                    self.cache.set(str(user_id), user)
+            return user
         except Exception as e:
             logger.error(f"Erro ao buscar usuário por ID: {e}")
             return None
     
+    def find_names(self, user_ids):
+        """Resolve os nomes de vários usuários com uma única consulta ($in)"""
+        ids = [ObjectId(str(_id)) for _id in user_ids if _id and ObjectId.is_valid(str(_id))]
+        if not ids:
+            return {}
+        try:
+            return {str(usuario['_id']): usuario.get('nome') for usuario in self.collection.find(
+                {'_id': {'$in': ids}}, {'nome': 1}
+            )}
+        except Exception as e:
+            logger.error(f"Erro ao buscar nomes de usuários: {e}")
+            return {}
+    
     def find_by_email(self, email):
         """Busca usuário por email"""
         try:
@@ -131,10 +233,14 @@ class UsuarioService:
     def create(self, user_data):
         """Cria um novo usuário"""
         try:
+            # Senha vinda da API é sempre texto: um valor com cara de hash também é hasheado
+            if user_data.get('senha'):
+                user_data['senha'] = hash_password(user_data['senha'])
             user_data['created_at'] = datetime.now()
             user_data['updated_at'] = datetime.now()
             
             result = self.collection.insert_one(user_data)
+            self.cache.delete(str(result.inserted_id))
             logger.info(f"✅ Usuário criado: {result.inserted_id}")
             return str(result.inserted_id)
         except Exception as e:
@@ -144,11 +250,15 @@ class UsuarioService:
     def update(self, user_id, update_data):
         """Atualiza um usuário"""
         try:
+            # Senha vinda da API é sempre texto: um valor com cara de hash também é hasheado
+            if update_data.get('senha'):
+                update_data['senha'] = hash_password(update_data['senha'])
             update_data['updated_at'] = datetime.now()
             result = self.collection.update_one(
                 {'_id': ObjectId(user_id)}, 
                 {'$set': update_data}
             )
+            self.cache.delete(str(user_id))
             return result.modified_count > 0
         except Exception as e:
             logger.error(f"Erro ao atualizar usuário: {e}")
@@ -158,11 +268,35 @@ class UsuarioService:
         """Remove um usuário"""
         try:
             result = self.collection.delete_one({'_id': ObjectId(user_id)})
+            self.cache.delete(str(user_id))
             return result.deleted_count > 0
         except Exception as e:
             logger.error(f"Erro ao deletar usuário: {e}")
             return False
     
+    def token_version(self, user_id):
+        """Versão dos refresh tokens do usuário (None se não existir).
+
+        Lida direto do banco, sem o cache, para que um logout feito em
+        outro processo valha imediatamente.
+        """
+        try:
+            user = self.collection.find_one({'_id': ObjectId(user_id)}, {'token_versao': 1})
+            return user.get('token_versao', 0) if user is not None else None
+        except Exception as e:
+            logger.error(f"Erro ao buscar versão de tokens: {e}")
+            return None
+    
+    def revoke_tokens(self, user_id):
+        """Invalida os refresh tokens já emitidos para o usuário"""
+        try:
+            result = self.collection.update_one({'_id': ObjectId(user_id)}, {'$inc': {'token_versao': 1}})
+            self.cache.delete(str(user_id))
+            return result.modified_count > 0
+        except Exception as e:
+            logger.error(f"Erro ao revogar tokens: {e}")
+            return False
+    
     def count(self):
         """Conta total de usuários"""
         try:
@@ -172,10 +306,13 @@ class UsuarioService:
             return 0
     
     def authenticate(self, email, senha):
-        """Autentica um usuário"""
+        """Autentica um usuário (senhas legadas em texto puro viram hash no login)"""
         try:
             user = self.find_by_email(email)
-            if user and user.get('senha') == senha:
+            valida, atualizar = verify_password(senha, user.get('senha')) if user else (False, False)
+            if valida:
+                if atualizar:
+                    self._upgrade_password(user, senha)
                 logger.info(f"✅ Usuário autenticado: {email}")
                 return user
             logger.warning(f"❌ Falha na autenticação: {email}")
@@ -183,118 +320,462 @@ class UsuarioService:
         except Exception as e:
             logger.error(f"Erro na autenticação: {e}")
             return None
+    
+    def _upgrade_password(self, user, senha):
+        """Regrava a senha com o hasher e o custo atuais"""
+        user['senha'] = hash_password(senha)
+        try:
+            self.collection.update_one({'_id': user['_id']}, {'$set': {'senha': user['senha']}})
+            self.cache.delete(str(user['_id']))
+            logger.info(f"🔐 Senha atualizada para hash: {user['_id']}")
+        except Exception as e:
+            logger.error(f"Erro ao atualizar hash da senha: {e}")
+
+def task_owner(tarefa):
+    """ID do dono de uma tarefa (idUsuario ou o campo legado usuario_id)"""
+    return tarefa.get('idUsuario') or tarefa.get('usuario_id')
 
+def tarefas_scope(user_id):
+    """Escopo de versão das tarefas de um usuário"""
+    return f'Tarefa:{user_id}'
+
+CLIENTES_SCOPE = 'Cliente'
+
+# Status de tarefa gravados no banco
+STATUS_PENDENTE = '1'
+STATUS_CONCLUIDA = '2'
+
+# Campos lidos nas escritas de tarefa: dono (versão/tombstone) e campanha/status (CampanhaStats)
+TAREFA_STATS_PROJECTION = {'idUsuario': 1, 'usuario_id': 1, 'idCampanha': 1, 'status': 1}
+
+def stats_delta(antes=None, depois=None, deltas=None):
+    """Soma em deltas a variação de CampanhaStats entre dois estados de uma tarefa.
+    
+    antes/depois são documentos (ou None) com idCampanha e status. Campanhas
+    tocadas sem variação entram com zero: a alteração conta como atividade.
+    """
+    deltas = {} if deltas is None else deltas
+    for tarefa, sinal in ((antes, -1), (depois, 1)):
+        campanha = tarefa.get('idCampanha') if tarefa else None
+        if not campanha:
+            continue
+        delta = deltas.setdefault(str(campanha), {'total': 0, 'concluidas': 0})
+        delta['total'] += sinal
+        if tarefa.get('status') == STATUS_CONCLUIDA:
+            delta['concluidas'] += sinal
+    return deltas
+
+@instrument
 class TarefaService:
-    def __init__(self):
-        # Collection correta: Tarefa
-        self.collection = mongodb.get_collection('Tarefa')
+    # Collection correta: Tarefa
+    collection_name = 'Tarefa'
+    
+    @property
+    def collection(self):
+        return mongodb.get_collection(self.collection_name)
+    
+    def iter_all(self, query=None, projection=None, sort=None, limit=None,
+                 batch_size=BATCH_SIZE, max_time_ms=MAX_TIME_MS):
+        """Percorre as tarefas em lotes"""
+        yield from iter_find(self.collection, query, projection, sort, limit, batch_size, max_time_ms)
     
     def find_all(self, limit=None):
         """Busca todas as tarefas"""
         try:
-            cursor = self.collection.find({})
-            if limit:
-                cursor = cursor.limit(limit)
-            return list(cursor)
+            return list(self.iter_all(limit=limit))
         except Exception as e:
             logger.error(f"Erro ao buscar tarefas: {e}")
             return []
     
-    def find_by_user(self, user_id):
-        """Busca tarefas por usuário"""
-        try:
-            # Tentar diferentes formatos de ID
-            queries = [
-                {'idUsuario': ObjectId(user_id)},
-                {'idUsuario': user_id},
-                {'usuario_id': ObjectId(user_id)},
-                {'usuario_id': user_id}
+    @staticmethod
+    def user_filter(user_id):
+        """Filtro das tarefas de um usuário, aceitando os formatos legados de ID"""
+        user_id = str(user_id)
+        valores = [ObjectId(user_id), user_id] if ObjectId.is_valid(user_id) else [user_id]
+        return {
+            '$or': [
+                {'idUsuario': {'$in': valores}},
+                {'usuario_id': {'$in': valores}}
             ]
-            
-            for query in queries:
-                try:
-                    result = list(self.collection.find(query))
-                    if result:
-                        return result
-                except:
-                    continue
-            
-            return []
+        }
+    
+    @classmethod
+    def page_filter(cls, user_id, after=None):
+        """Filtro da página por keyset: tarefas do usuário com _id depois de after"""
+        query = cls.user_filter(user_id)
+        return {'$and': [query, {'_id': {'$gt': after}}]} if after else query
+    
+    def iter_by_user(self, user_id, after=None, limit=None, projection=None, sort=None,
+                     batch_size=BATCH_SIZE, max_time_ms=MAX_TIME_MS):
+        """Percorre as tarefas do usuário em lotes (por padrão em ordem de _id, após after)"""
+        yield from iter_find(
+            self.collection, self.page_filter(user_id, after), projection, sort or PAGE_SORT, limit,
+            batch_size, max_time_ms
+        )
+    
+    def find_by_user(self, user_id, after=None, limit=None, projection=None):
+        """Busca tarefas por usuário (opcionalmente paginadas por _id)"""
+        try:
+            return list(self.iter_by_user(user_id, after=after, limit=limit, projection=projection))
         except Exception as e:
             logger.error(f"Erro ao buscar tarefas por usuário: {e}")
             return []
     
-    def find_by_id(self, task_id):
-        """Busca tarefa por ID"""
+    def normalize_user_ids(self, batch_size=1000, dry_run=False):
+        """Reescreve documentos legados para idUsuario: ObjectId (em lotes)"""
+        legados = {
+            '$or': [
+                {'idUsuario': {'$type': 'string'}},
+                {'usuario_id': {'$exists': True}}
+            ]
+        }
+        resultado = {'normalizadas': 0, 'invalidas': 0}
+        operacoes = []
+        
+        def aplicar():
+            if operacoes and not dry_run:
+                self.collection.bulk_write(operacoes, ordered=False)
+            resultado['normalizadas'] += len(operacoes)
+            operacoes.clear()
+        
+        cursor = self.collection.find(legados, {'idUsuario': 1, 'usuario_id': 1}).batch_size(batch_size)
+        for tarefa in cursor:
+            origem = str(tarefa.get('idUsuario') or tarefa.get('usuario_id') or '')
+            if not ObjectId.is_valid(origem):
+                resultado['invalidas'] += 1
+                logger.warning(f"⚠️ Tarefa {tarefa['_id']} com ID de usuário inválido: {origem!r}")
+                continue
+            operacoes.append(UpdateOne(
+                {'_id': tarefa['_id']},
+                {'$set': {'idUsuario': ObjectId(origem)}, '$unset': {'usuario_id': ''}}
+            ))
+            if len(operacoes) >= batch_size:
+                aplicar()
+        aplicar()
+        
+        logger.info(f"✅ Tarefas normalizadas: {resultado['normalizadas']}")
+        return resultado
+    
+    @classmethod
+    def owned_filter(cls, task_id, user_id=None):
+        """Filtro por _id, restrito às tarefas do usuário quando user_id é informado"""
+        query = {'_id': ObjectId(task_id)}
+        return {'$and': [query, cls.user_filter(user_id)]} if user_id else query
+    
+    def find_by_id(self, task_id, user_id=None):
+        """Busca tarefa por ID (do usuário, se informado)"""
         try:
-            return self.collection.find_one({'_id': ObjectId(task_id)})
+            return self.collection.find_one(self.owned_filter(task_id, user_id))
         except Exception as e:
             logger.error(f"Erro ao buscar tarefa por ID: {e}")
             return None
     
+    @staticmethod
+    def convert_dates(task_data):
+        """Converte datas (string ISO ou date) para datetime, aceito pelo BSON"""
+        for field in ['data_inicio', 'data_termino']:
+            valor = task_data.get(field)
+            if isinstance(valor, str):
+                try:
+                    task_data[field] = datetime.fromisoformat(valor.replace('Z', '+00:00'))
+                except ValueError:
+                    pass
+            elif isinstance(valor, date) and not isinstance(valor, datetime):
+                task_data[field] = datetime.combine(valor, datetime.min.time())
+        return task_data
+    
     def create(self, task_data):
         """Cria uma nova tarefa"""
         try:
             task_data['created_at'] = datetime.now()
             task_data['updated_at'] = datetime.now()
-            
-            # Converter datas se necessário
-            for field in ['data_inicio', 'data_termino']:
-                if field in task_data and isinstance(task_data[field], str):
-                    try:
-                        task_data[field] = datetime.fromisoformat(task_data[field].replace('Z', '+00:00'))
-                    except:
-                        pass
+            self.convert_dates(task_data)
             
             result = self.collection.insert_one(task_data)
+            versao_service.bump(tarefas_scope(task_data.get('idUsuario')))
+            campanha_stats_service.apply(stats_delta(depois=task_data))
+            notify_write(self.collection_name, 'insert', result.inserted_id, task_data.get('idUsuario'), task_data)
             logger.info(f"✅ Tarefa criada: {result.inserted_id}")
             return str(result.inserted_id)
         except Exception as e:
             logger.error(f"Erro ao criar tarefa: {e}")
             return None
     
-    def update(self, task_id, update_data):
-        """Atualiza uma tarefa"""
+    def update(self, task_id, update_data, user_id=None):
+        """Atualiza uma tarefa (do usuário, se informado). Retorna a tarefa atualizada"""
         try:
             update_data['updated_at'] = datetime.now()
-            result = self.collection.update_one(
-                {'_id': ObjectId(task_id)}, 
+            self.convert_dates(update_data)
+            # Estado anterior (padrão do find_one_and_update) alimenta CampanhaStats
+            antes = self.collection.find_one_and_update(
+                self.owned_filter(task_id, user_id),
                 {'$set': update_data}
             )
-            return result.modified_count > 0
+            if antes is None:
+                return None
+            tarefa = {**antes, **update_data}
+            versao_service.bump(tarefas_scope(task_owner(antes)))
+            campanha_stats_service.apply(stats_delta(antes, tarefa))
+            notify_write(self.collection_name, 'update', antes['_id'], task_owner(antes), tarefa)
+            return tarefa
         except Exception as e:
             logger.error(f"Erro ao atualizar tarefa: {e}")
-            return False
+            return None
+    
+    def bulk_apply(self, user_id, operations):
+        """Aplica criações/atualizações/remoções de um usuário.
+        
+        operations: [{'op': 'create'|'update'|'delete', 'id': ObjectId, 'data': dict}]
+        já validadas. Retorna um resultado por operação, na mesma ordem; a
+        partir da segunda operação sobre a mesma tarefa, o resultado é um erro.
+        
+        As criações vão em um único insert_many. Atualizações e remoções são
+        find_one_and_update/find_one_and_delete (como update() e delete()):
+        CampanhaStats, tombstones e eventos saem do documento que a escrita
+        de fato alterou, e operações que não casam nada não contam.
+        """
+        agora = datetime.now()
+        owner_filter = self.user_filter(user_id)
+        results = []
+        # (posição do resultado, antes, depois) de cada operação gravada
+        estados = []
+        criacoes = []
+        posicoes_criacoes = []
+        # Uma tarefa por lote: repetida, contaria duas vezes em CampanhaStats (e nos tombstones)
+        tocadas = set()
+        
+        for index, operation in enumerate(operations):
+            op = operation['op']
+            data = dict(operation.get('data') or {})
+            
+            if op == 'create':
+                task_id = ObjectId()
+                data.update({'_id': task_id, 'idUsuario': ObjectId(user_id),
+                             'created_at': agora, 'updated_at': agora})
+                criacoes.append(self.convert_dates(data))
+                results.append({'index': index, 'op': op, 'id': str(task_id), 'success': True})
+                posicoes_criacoes.append(len(results) - 1)
+                continue
+            
+            task_id = operation['id']
+            result = {'index': index, 'op': op, 'id': str(task_id), 'success': False}
+            results.append(result)
+            if task_id in tocadas:
+                result['error'] = 'Tarefa repetida no lote'
+                continue
+            tocadas.add(task_id)
+            
+            task_filter = {'$and': [{'_id': task_id}, owner_filter]}
+            try:
+                if op == 'update':
+                    data['updated_at'] = agora
+                    self.convert_dates(data)
+                    # Estado anterior (padrão do find_one_and_update) alimenta CampanhaStats
+                    antes = self.collection.find_one_and_update(task_filter, {'$set': data})
+                    depois = {**antes, **data} if antes else None
+                else:
+                    antes = self.collection.find_one_and_delete(task_filter, projection=TAREFA_STATS_PROJECTION)
+                    depois = None
+            except Exception as e:
+                logger.error(f"Erro ao aplicar operação do lote de tarefas: {e}")
+                result['error'] = 'Erro ao gravar no banco'
+                continue
+            if antes is None:
+                result['error'] = 'Tarefa não encontrada'
+                continue
+            result['success'] = True
+            estados.append((len(results) - 1, antes, depois))
+        
+        if criacoes:
+            falhas = {}
+            try:
+                self.collection.insert_many(criacoes, ordered=False)
+            except BulkWriteError as e:
+                falhas = {error['index']: error.get('errmsg') for error in e.details.get('writeErrors', [])}
+            except Exception as e:
+                logger.error(f"Erro ao criar tarefas do lote: {e}")
+                falhas = dict.fromkeys(range(len(criacoes)), 'Erro ao gravar no banco')
+            for indice, (position, tarefa) in enumerate(zip(posicoes_criacoes, criacoes)):
+                if indice in falhas:
+                    results[position].update({'success': False, 'error': falhas[indice]})
+                else:
+                    estados.append((position, None, tarefa))
+        
+        if not estados:
+            return results
+        estados.sort(key=lambda estado: estado[0])
+        
+        removidas = [antes['_id'] for _, antes, depois in estados if depois is None]
+        if removidas:
+            exclusao_service.record(self.collection_name, removidas, user_id)
+        versao_service.bump(tarefas_scope(user_id))
+        
+        deltas = {}
+        for _, antes, depois in estados:
+            stats_delta(antes, depois, deltas)
+        campanha_stats_service.apply(deltas)
+        
+        eventos = {'create': 'insert', 'update': 'update', 'delete': 'delete'}
+        for position, _, depois in estados:
+            result = results[position]
+            notify_write(self.collection_name, eventos[result['op']], ObjectId(result['id']), user_id, depois)
+        return results
     
-    def delete(self, task_id):
-        """Remove uma tarefa"""
+    def toggle_status(self, task_id, user_id, target_status=None):
+        """Alterna o status (1=pendente, 2=concluída) ou define target_status.
+        
+        Um único find_one_and_update com pipeline, devolvendo a tarefa já
+        atualizada: sem leitura prévia e sem corrida entre cliques simultâneos.
+        A alternância decide pelo status concluído e o status explícito só
+        casa tarefas que mudam de fato, então o documento final basta para
+        saber o estado anterior (variação de CampanhaStats).
+        """
         try:
-            result = self.collection.delete_one({'_id': ObjectId(task_id)})
-            return result.deleted_count > 0
+            agora = datetime.now()
+            filtro = self.owned_filter(task_id, user_id)
+            if target_status is None:
+                novo_status = {'$cond': [{'$eq': ['$status', STATUS_CONCLUIDA]}, STATUS_PENDENTE, STATUS_CONCLUIDA]}
+            else:
+                concluida = {'$eq': STATUS_CONCLUIDA} if target_status == STATUS_PENDENTE else {'$ne': STATUS_CONCLUIDA}
+                filtro = {'$and': [filtro, {'status': concluida}]}
+                novo_status = {'$literal': target_status}
+            tarefa = self.collection.find_one_and_update(
+                filtro,
+                [{'$set': {'status': novo_status, 'updated_at': agora}}],
+                return_document=ReturnDocument.AFTER
+            )
+            if tarefa is None:
+                # Já estava no status pedido (retry) ou não existe: nada a gravar
+                return self.find_by_id(task_id, user_id) if target_status is not None else None
+            concluida = tarefa.get('status') == STATUS_CONCLUIDA
+            antes = {**tarefa, 'status': STATUS_PENDENTE if concluida else STATUS_CONCLUIDA}
+            versao_service.bump(tarefas_scope(user_id))
+            campanha_stats_service.apply(stats_delta(antes, tarefa))
+            notify_write(self.collection_name, 'update', tarefa['_id'], task_owner(tarefa), tarefa)
+            return tarefa
+        except Exception as e:
+            logger.error(f"Erro ao alterar status da tarefa: {e}")
+            return None
+    
+    def delete(self, task_id, user_id=None):
+        """Remove uma tarefa (do usuário, se informado)"""
+        try:
+            tarefa = self.collection.find_one_and_delete(
+                self.owned_filter(task_id, user_id),
+                projection=TAREFA_STATS_PROJECTION
+            )
+            if tarefa is None:
+                return False
+            exclusao_service.record(self.collection_name, [tarefa['_id']], task_owner(tarefa))
+            versao_service.bump(tarefas_scope(task_owner(tarefa)))
+            campanha_stats_service.apply(stats_delta(antes=tarefa))
+            notify_write(self.collection_name, 'delete', tarefa['_id'], task_owner(tarefa))
+            return True
         except Exception as e:
             logger.error(f"Erro ao deletar tarefa: {e}")
             return False
     
-    def count(self):
-        """Conta total de tarefas"""
+    def iter_changed(self, user_id, since, after_id=None, limit=None,
+                     batch_size=BATCH_SIZE, max_time_ms=MAX_TIME_MS):
+        """Percorre as tarefas do usuário alteradas depois de since (ordem: updated_at, _id)"""
+        query = {'$and': [self.user_filter(user_id), changed_filter(since, after_id)]}
+        yield from iter_find(self.collection, query, None, CHANGED_SORT, limit, batch_size, max_time_ms)
+    
+    def find_changed(self, user_id, since, after_id=None, limit=None):
+        """Tarefas do usuário criadas/alteradas depois de since (ordem: updated_at, _id)"""
         try:
-            return self.collection.count_documents({})
+            return list(self.iter_changed(user_id, since, after_id, limit))
+        except Exception as e:
+            logger.error(f"Erro ao buscar tarefas alteradas: {e}")
+            return []
+    
+    def dashboard(self, user_id, campanha_id=None):
+        """Resumo das tarefas do usuário em uma única agregação ($facet).
+        
+        Contagens por status e prioridade, atrasadas (data_termino vencida e
+        não concluídas) e taxa de conclusão geral e por campanha.
+        """
+        filtro = self.user_filter(user_id)
+        if campanha_id is not None:
+            campanha_id = str(campanha_id)
+            valores = [ObjectId(campanha_id), campanha_id] if ObjectId.is_valid(campanha_id) else [campanha_id]
+            filtro = {'$and': [filtro, {'idCampanha': {'$in': valores}}]}
+        concluida = {'$cond': [{'$eq': ['$status', STATUS_CONCLUIDA]}, 1, 0]}
+        pipeline = [
+            {'$match': filtro},
+            {'$facet': {
+                'status': [{'$group': {'_id': '$status', 'total': {'$sum': 1}}}],
+                'prioridade': [{'$group': {'_id': '$prioridade', 'total': {'$sum': 1}}}],
+                'atrasadas': [
+                    {'$match': {'data_termino': {'$lt': datetime.now()}, 'status': {'$ne': STATUS_CONCLUIDA}}},
+                    {'$count': 'total'}
+                ],
+                'campanhas': [
+                    {'$group': {'_id': '$idCampanha', 'total': {'$sum': 1}, 'concluidas': {'$sum': concluida}}},
+                    {'$sort': {'total': -1}}
+                ],
+            }}
+        ]
+        try:
+            faceta = next(self.collection.aggregate(pipeline), {})
+        except Exception as e:
+            logger.error(f"Erro ao agregar tarefas: {e}")
+            return None
+        
+        def taxa(concluidas, total):
+            return round(concluidas / total, 4) if total else 0.0
+        
+        por_status = {str(grupo['_id']): grupo['total'] for grupo in faceta.get('status', [])}
+        total = sum(por_status.values())
+        concluidas = por_status.get(STATUS_CONCLUIDA, 0)
+        atrasadas = faceta.get('atrasadas') or [{'total': 0}]
+        return {
+            'total': total,
+            'concluidas': concluidas,
+            'taxa_conclusao': taxa(concluidas, total),
+            'atrasadas': atrasadas[0]['total'],
+            'por_status': por_status,
+            'por_prioridade': {str(grupo['_id']): grupo['total'] for grupo in faceta.get('prioridade', [])},
+            'por_campanha': [
+                {
+                    'idCampanha': str(grupo['_id']) if grupo['_id'] is not None else None,
+                    'total': grupo['total'],
+                    'concluidas': grupo['concluidas'],
+                    'taxa_conclusao': taxa(grupo['concluidas'], grupo['total']),
+                }
+                for grupo in faceta.get('campanhas', [])
+            ],
+        }
+    
+    def count(self, user_id=None):
+        """Conta total de tarefas (ou as de um usuário)"""
+        try:
+            query = self.user_filter(user_id) if user_id else {}
+            return self.collection.count_documents(query)
         except Exception as e:
             logger.error(f"Erro ao contar tarefas: {e}")
             return 0
 
+@instrument
 class ClienteService:
-    def __init__(self):
-        # Collection correta: Cliente
-        self.collection = mongodb.get_collection('Cliente')
+    # Collection correta: Cliente
+    collection_name = 'Cliente'
+    cache = build_cache('Cliente')
     
-    def find_all(self, limit=None):
-        """Busca todos os clientes"""
+    @property
+    def collection(self):
+        return mongodb.get_collection(self.collection_name)
+    
+    def iter_all(self, query=None, projection=None, sort=None, limit=None,
+                 batch_size=BATCH_SIZE, max_time_ms=MAX_TIME_MS):
+        """Percorre os clientes em lotes"""
+        yield from iter_find(self.collection, query, projection, sort, limit, batch_size, max_time_ms)
+    
+    def find_all(self, limit=None, after=None, projection=None):
+        """Busca todos os clientes (opcionalmente paginados por _id)"""
         try:
-            cursor = self.collection.find({})
-            if limit:
-                cursor = cursor.limit(limit)
-            return list(cursor)
+            query = {'_id': {'$gt': after}} if after else None
+            return list(self.iter_all(query, projection, PAGE_SORT, limit))
         except Exception as e:
             logger.error(f"Erro ao buscar clientes: {e}")
             return []
@@ -302,23 +783,28 @@ class ClienteService:
     def find_by_id(self, client_id):
         """Busca cliente por ID"""
         try:
-            return self.collection.find_one({'_id': ObjectId(client_id)})
+            client = self.cache.get(str(client_id))
+            if client is None:
+                client = self.collection.find_one({'_id': ObjectId(client_id)})
+                if client is not None:
+                    self.cache.set(str(client_id), client)
+            return client
         except Exception as e:
             logger.error(f"Erro ao buscar cliente por ID: {e}")
             return None
     
-    def search(self, query):
-        """Busca clientes por nome, cidade, etc."""
+    def search_filter(self, query):
+        """Monta o filtro usado pela busca de clientes"""
+        return filtro_busca(query)
+    
+    def iter_search(self, query, limit=50, offset=0, batch_size=BATCH_SIZE, max_time_ms=MAX_TIME_MS):
+        """Percorre o resultado da busca (ordenado por relevância) em lotes"""
+        yield from iter_aggregate(self.collection, pipeline_busca(query, limit, offset), batch_size, max_time_ms)
+    
+    def search(self, query, limit=50, offset=0):
+        """Busca clientes por nome, cidade, etc. (ordenados por relevância)"""
         try:
-            regex_query = {'$regex': query, '$options': 'i'}
-            search_filter = {
-                '$or': [
-                    {'nome': regex_query},
-                    {'cidade': regex_query},
-                    {'razao_social': regex_query}
-                ]
-            }
-            return list(self.collection.find(search_filter))
+            return list(self.iter_search(query, limit, offset))
         except Exception as e:
             logger.error(f"Erro ao buscar clientes: {e}")
             return []
@@ -328,8 +814,12 @@ class ClienteService:
         try:
             client_data['created_at'] = datetime.now()
             client_data['updated_at'] = datetime.now()
+            client_data.update(campos_busca(client_data))
             
             result = self.collection.insert_one(client_data)
+            self.cache.delete(str(result.inserted_id))
+            versao_service.bump(CLIENTES_SCOPE)
+            notify_write(self.collection_name, 'insert', result.inserted_id, documento=client_data)
             logger.info(f"✅ Cliente criado: {result.inserted_id}")
             return str(result.inserted_id)
         except Exception as e:
@@ -340,11 +830,27 @@ class ClienteService:
         """Atualiza um cliente"""
         try:
             update_data['updated_at'] = datetime.now()
-            result = self.collection.update_one(
+            
+            # Manter a chave de busca em dia quando nome/cidade mudarem
+            if any(campo in update_data for campo in CAMPOS_BUSCA):
+                atual = self.collection.find_one(
+                    {'_id': ObjectId(client_id)},
+                    {campo: 1 for campo in CAMPOS_BUSCA}
+                ) or {}
+                update_data.update(campos_busca({**atual, **update_data}))
+            
+            # Documento atualizado: vai no evento de escrita
+            cliente = self.collection.find_one_and_update(
                 {'_id': ObjectId(client_id)}, 
-                {'$set': update_data}
+                {'$set': update_data},
+                return_document=ReturnDocument.AFTER
             )
-            return result.modified_count > 0
+            self.cache.delete(str(client_id))
+            if cliente is None:
+                return False
+            versao_service.bump(CLIENTES_SCOPE)
+            notify_write(self.collection_name, 'update', cliente['_id'], documento=cliente)
+            return True
         except Exception as e:
             logger.error(f"Erro ao atualizar cliente: {e}")
             return False
@@ -353,11 +859,30 @@ class ClienteService:
         """Remove um cliente"""
         try:
             result = self.collection.delete_one({'_id': ObjectId(client_id)})
+            self.cache.delete(str(client_id))
+            if result.deleted_count:
+                exclusao_service.record(self.collection_name, [ObjectId(client_id)])
+                notify_write(self.collection_name, 'delete', ObjectId(client_id))
+            versao_service.bump(CLIENTES_SCOPE)
             return result.deleted_count > 0
         except Exception as e:
             logger.error(f"Erro ao deletar cliente: {e}")
             return False
     
+    def iter_changed(self, since, after_id=None, limit=None, batch_size=BATCH_SIZE, max_time_ms=MAX_TIME_MS):
+        """Percorre os clientes alterados depois de since (ordem: updated_at, _id)"""
+        yield from iter_find(
+            self.collection, changed_filter(since, after_id), None, CHANGED_SORT, limit, batch_size, max_time_ms
+        )
+    
+    def find_changed(self, since, after_id=None, limit=None):
+        """Clientes criados/alterados depois de since (ordem: updated_at, _id)"""
+        try:
+            return list(self.iter_changed(since, after_id, limit))
+        except Exception as e:
+            logger.error(f"Erro ao buscar clientes alterados: {e}")
+            return []
+    
     def count(self):
         """Conta total de clientes"""
         try:
@@ -366,18 +891,25 @@ class ClienteService:
             logger.error(f"Erro ao contar clientes: {e}")
             return 0
 
+@instrument
 class CampanhaService:
-    def __init__(self):
-        # Collection: Campanha
-        self.collection = mongodb.get_collection('Campanha')
+    # Collection: Campanha
+    collection_name = 'Campanha'
+    cache = build_cache('Campanha')
+    
+    @property
+    def collection(self):
+        return mongodb.get_collection(self.collection_name)
+    
+    def iter_all(self, query=None, projection=None, sort=None, limit=None,
+                 batch_size=BATCH_SIZE, max_time_ms=MAX_TIME_MS):
+        """Percorre as campanhas em lotes"""
+        yield from iter_find(self.collection, query, projection, sort, limit, batch_size, max_time_ms)
     
     def find_all(self, limit=None):
         """Busca todas as campanhas"""
         try:
-            cursor = self.collection.find({})
-            if limit:
-                cursor = cursor.limit(limit)
-            return list(cursor)
+            return list(self.iter_all(limit=limit))
         except Exception as e:
             logger.error(f"Erro ao buscar campanhas: {e}")
             return []
@@ -385,7 +917,12 @@ class CampanhaService:
     def find_by_id(self, campaign_id):
         """Busca campanha por ID"""
         try:
-            return self.collection.find_one({'_id': ObjectId(campaign_id)})
+            campaign = self.cache.get(str(campaign_id))
+            if campaign is None:
+                campaign = self.collection.find_one({'_id': ObjectId(campaign_id)})
+                if campaign is not None:
+                    self.cache.set(str(campaign_id), campaign)
+            return campaign
         except Exception as e:
             logger.error(f"Erro ao buscar campanha por ID: {e}")
             return None
@@ -398,8 +935,182 @@ class CampanhaService:
             logger.error(f"Erro ao contar campanhas: {e}")
             return 0
 
+@instrument
+class VersaoService:
+    """Marcadores de versão por escopo, para ETag/Last-Modified sem reler os dados"""
+    collection_name = 'Versao'
+    
+    @property
+    def collection(self):
+        return mongodb.get_collection(self.collection_name)
+    
+    def get(self, scope):
+        """Retorna (versão, data da última alteração) do escopo"""
+        try:
+            versao = self.collection.find_one({'_id': scope})
+            if versao is None:
+                return 0, None
+            return versao.get('v', 0), versao.get('updated_at')
+        except Exception as e:
+            logger.error(f"Erro ao buscar versão de {scope}: {e}")
+            return None, None
+    
+    @staticmethod
+    def requests(scopes):
+        """Operações de bump() (as mesmas no AsyncVersaoService)"""
+        agora = datetime.now()
+        return [
+            UpdateOne({'_id': scope}, {'$inc': {'v': 1}, '$set': {'updated_at': agora}}, upsert=True)
+            for scope in scopes
+        ]
+    
+    def bump(self, *scopes):
+        """Incrementa a versão dos escopos alterados"""
+        try:
+            self.collection.bulk_write(self.requests(scopes), ordered=False)
+        except Exception as e:
+            logger.error(f"Erro ao atualizar versão de {scopes}: {e}")
+
+@instrument
+class ExclusaoService:
+    """Registro de exclusões (tombstones) para a sincronização incremental"""
+    collection_name = 'Exclusao'
+    
+    @property
+    def collection(self):
+        return mongodb.get_collection(self.collection_name)
+    
+    @staticmethod
+    def documents(collection_name, doc_ids, owner=None):
+        """Tombstones gravados por record() (os mesmos no AsyncExclusaoService)"""
+        agora = datetime.now()
+        return [
+            {'colecao': collection_name, 'doc_id': doc_id,
+             'idUsuario': str(owner) if owner else None, 'deleted_at': agora}
+            for doc_id in doc_ids
+        ]
+    
+    def record(self, collection_name, doc_ids, owner=None):
+        """Registra a exclusão de documentos de uma collection"""
+        try:
+            self.collection.insert_many(self.documents(collection_name, doc_ids, owner), ordered=False)
+        except Exception as e:
+            logger.error(f"Erro ao registrar exclusões em {collection_name}: {e}")
+    
+    def find_since(self, collection_name, since, owner=None):
+        """IDs excluídos depois de since"""
+        try:
+            query = {'colecao': collection_name, 'deleted_at': {'$gt': since}}
+            if owner:
+                query['idUsuario'] = str(owner)
+            return [str(exclusao['doc_id']) for exclusao in self.collection.find(query, {'doc_id': 1})]
+        except Exception as e:
+            logger.error(f"Erro ao buscar exclusões de {collection_name}: {e}")
+            return []
+
+@instrument
+class CampanhaStatsService:
+    """Estatísticas materializadas por campanha: total, concluídas e última atividade.
+    
+    Mantidas com $inc pelas escritas de tarefa; rebuild() recalcula do zero.
+    """
+    collection_name = 'CampanhaStats'
+    
+    @property
+    def collection(self):
+        return mongodb.get_collection(self.collection_name)
+    
+    @staticmethod
+    def requests(deltas):
+        """Operações de apply() (as mesmas no AsyncCampanhaStatsService)"""
+        agora = datetime.now()
+        return [
+            UpdateOne({'_id': campanha}, {'$inc': delta, '$max': {'ultima_atividade': agora}}, upsert=True)
+            for campanha, delta in deltas.items()
+        ]
+    
+    def apply(self, deltas):
+        """Aplica as variações de stats_delta com um único bulk_write"""
+        if not deltas:
+            return
+        try:
+            self.collection.bulk_write(self.requests(deltas), ordered=False)
+        except Exception as e:
+            logger.error(f"Erro ao atualizar estatísticas de campanhas: {e}")
+    
+    def find_by_campaign(self, campaign_id):
+        """Estatísticas de uma campanha (zeradas se não houver tarefas)"""
+        try:
+            stats = self.collection.find_one({'_id': str(campaign_id)})
+        except Exception as e:
+            logger.error(f"Erro ao buscar estatísticas da campanha: {e}")
+            return None
+        return stats or {'_id': str(campaign_id), 'total': 0, 'concluidas': 0, 'ultima_atividade': None}
+    
+    def iter_all(self, query=None, projection=None, sort=None, limit=None,
+                 batch_size=BATCH_SIZE, max_time_ms=MAX_TIME_MS):
+        """Percorre as estatísticas em lotes (padrão: mais ativas primeiro)"""
+        yield from iter_find(
+            self.collection, query, projection, sort or [('ultima_atividade', DESCENDING)],
+            limit, batch_size, max_time_ms
+        )
+    
+    def find_all(self, limit=None):
+        """Estatísticas de todas as campanhas, mais ativas primeiro"""
+        try:
+            return list(self.iter_all(limit=limit))
+        except Exception as e:
+            logger.error(f"Erro ao buscar estatísticas de campanhas: {e}")
+            return []
+    
+    def compute(self):
+        """Recalcula as estatísticas a partir da collection Tarefa (varredura completa)"""
+        pipeline = [
+            {'$match': {'idCampanha': {'$nin': [None, '']}}},
+            {'$group': {
+                '_id': {'$toString': '$idCampanha'},
+                'total': {'$sum': 1},
+                'concluidas': {'$sum': {'$cond': [{'$eq': ['$status', STATUS_CONCLUIDA]}, 1, 0]}},
+                'ultima_atividade': {'$max': '$updated_at'},
+            }}
+        ]
+        return {stats['_id']: stats for stats in tarefa_service.collection.aggregate(pipeline)}
+    
+    def rebuild(self, dry_run=False):
+        """Compara o materializado com o recalculado e corrige as diferenças.
+        
+        Retorna [(campanha, esperado, atual)] com as campanhas divergentes.
+        Escritas concorrentes durante a varredura podem gerar falsos positivos:
+        rode de novo para confirmar.
+        """
+        esperado = self.compute()
+        atual = {stats['_id']: stats for stats in self.collection.find({})}
+        
+        divergencias = []
+        operacoes = []
+        for campanha in sorted(set(esperado) | set(atual)):
+            certo = esperado.get(campanha, {'total': 0, 'concluidas': 0, 'ultima_atividade': None})
+            gravado = atual.get(campanha, {'total': 0, 'concluidas': 0})
+            if (certo['total'], certo['concluidas']) == (gravado.get('total'), gravado.get('concluidas')):
+                continue
+            divergencias.append((campanha, certo, gravado))
+            if campanha not in esperado:
+                operacoes.append(DeleteOne({'_id': campanha}))
+            else:
+                atualizacao = {'$set': {'total': certo['total'], 'concluidas': certo['concluidas']}}
+                if certo['ultima_atividade']:
+                    atualizacao['$max'] = {'ultima_atividade': certo['ultima_atividade']}
+                operacoes.append(UpdateOne({'_id': campanha}, atualizacao, upsert=True))
+        
+        if operacoes and not dry_run:
+            self.collection.bulk_write(operacoes, ordered=False)
+        return divergencias
+
 # Instâncias dos serviços
 usuario_service = UsuarioService()
 tarefa_service = TarefaService()
 cliente_service = ClienteService()
-campanha_service = CampanhaService()
\ No newline at end of file
+campanha_service = CampanhaService()
+versao_service = VersaoService()
+exclusao_service = ExclusaoService()
+campanha_stats_service = CampanhaStatsService()
@@ -0,0 +1,101 @@
+from bson import ObjectId
+from pymongo import ASCENDING, IndexModel
+from pymongo.errors import OperationFailure
+
+from .database import PAGE_SORT, TarefaService, cliente_service
+from .pagination import ObjectIdCursorPagination
+from .sync import TOMBSTONE_TTL
+
+# Índices exigidos pelas consultas dos serviços em database.py, por collection
+INDEXES = {
+    'Usuario': [
+        IndexModel([('email', ASCENDING)], name='email_unique', unique=True),
+    ],
+    'Tarefa': [
+        IndexModel(
+            [('idUsuario', ASCENDING), ('status', ASCENDING), ('data_termino', ASCENDING)],
+            name='idUsuario_status_data_termino'
+        ),
+        # Página por keyset (find_by_user): cada ramo do $or de user_filter sai em ordem de _id
+        IndexModel([('idUsuario', ASCENDING), ('_id', ASCENDING)], name='idUsuario_id'),
+        # Documentos antigos ainda usam usuario_id
+        IndexModel([('usuario_id', ASCENDING), ('_id', ASCENDING)], name='usuario_id_legado_id', sparse=True),
+        # Sincronização incremental (changes?since=)
+        IndexModel([('idUsuario', ASCENDING), ('updated_at', ASCENDING), ('_id', ASCENDING)],
+                   name='idUsuario_updated_at'),
+    ],
+    'Cliente': [
+        IndexModel([('nome', ASCENDING)], name='nome'),
+        IndexModel([('cidade', ASCENDING)], name='cidade'),
+        IndexModel([('busca_tokens', ASCENDING)], name='busca_tokens'),
+        IndexModel([('busca_nome', ASCENDING)], name='busca_nome'),
+        IndexModel([('updated_at', ASCENDING), ('_id', ASCENDING)], name='updated_at'),
+    ],
+    'Exclusao': [
+        IndexModel([('colecao', ASCENDING), ('idUsuario', ASCENDING), ('deleted_at', ASCENDING)],
+                   name='colecao_idUsuario_deleted_at'),
+        IndexModel([('deleted_at', ASCENDING)], name='deleted_at_ttl',
+                   expireAfterSeconds=int(TOMBSTONE_TTL.total_seconds())),
+    ],
+}
+
+_USUARIO = ObjectId()
+_PAGINA = ObjectIdCursorPagination.page_size + 1
+
+# Consultas quentes dos serviços, com os filtros montados pelos próprios serviços:
+# (collection, descrição, filtro, sort, limit)
+HOT_QUERIES = [
+    ('Usuario', 'UsuarioService.find_by_email', {'email': 'usuario@espacobk.com'}, None, None),
+    ('Tarefa', 'TarefaService.find_by_user (primeira página)',
+     TarefaService.page_filter(_USUARIO), PAGE_SORT, _PAGINA),
+    ('Tarefa', 'TarefaService.find_by_user (página seguinte)',
+     TarefaService.page_filter(_USUARIO, after=ObjectId()), PAGE_SORT, _PAGINA),
+    ('Tarefa', 'Tarefas pendentes por prazo',
+     {'idUsuario': _USUARIO, 'status': '1'}, [('data_termino', ASCENDING)], None),
+    ('Cliente', 'ClienteService.search', cliente_service.search_filter('sil'), None, None),
+    ('Cliente', 'Clientes por cidade', {'cidade': 'São Paulo'}, [('nome', ASCENDING)], None),
+]
+
+# Estágios que indicam índice faltando: varredura da collection ou ordenação em memória
+ESTAGIOS_SEM_INDICE = ('COLLSCAN', 'SORT')
+
+
+def ensure_indexes(db, collections=None):
+    """Cria os índices declarados (idempotente). Retorna {collection: nomes ou erro}"""
+    resultado = {}
+    for nome, indexes in INDEXES.items():
+        if collections and nome not in collections:
+            continue
+        try:
+            resultado[nome] = db[nome].create_indexes(indexes)
+        except OperationFailure as e:
+            resultado[nome] = e
+    return resultado
+
+
+def plan_stages(plan):
+    """Lista os estágios de um plano do explain(), percorrendo os estágios internos"""
+    if not isinstance(plan, dict):
+        return []
+    estagios = [plan['stage']] if 'stage' in plan else []
+    for chave in ('inputStage', 'queryPlan', 'outerStage', 'innerStage'):
+        estagios.extend(plan_stages(plan.get(chave)))
+    for interno in plan.get('inputStages', []):
+        estagios.extend(plan_stages(interno))
+    return estagios
+
+
+def find_collscans(db):
+    """Executa explain() nas consultas quentes e retorna as que fazem COLLSCAN ou SORT em memória"""
+    problemas = []
+    for nome, descricao, filtro, sort, limit in HOT_QUERIES:
+        cursor = db[nome].find(filtro)
+        if sort:
+            cursor = cursor.sort(sort)
+        if limit:
+            cursor = cursor.limit(limit)
+        plano = cursor.explain().get('queryPlanner', {}).get('winningPlan', {})
+        estagios = plan_stages(plano)
+        if any(estagio in estagios for estagio in ESTAGIOS_SEM_INDICE):
+            problemas.append((nome, descricao, estagios))
+    return problemas
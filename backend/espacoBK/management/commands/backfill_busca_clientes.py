@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+from espacoBK.database import cliente_service, mongodb
+from espacoBK.indexes import ensure_indexes
+from espacoBK.search import backfill
+
+
+class Command(BaseCommand):
+    help = 'Gera a chave de busca normalizada (busca_tokens/busca_nome) dos clientes existentes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Documentos por bulk_write (padrão: 1000)')
+
+    def handle(self, *args, **options):
+        collection = cliente_service.collection
+
+        self.stdout.write('🔎 Garantindo índices de busca...')
+        ensure_indexes(mongodb.db, ['Cliente'])
+
+        self.stdout.write('📝 Recalculando chaves de busca...')
+        total = backfill(
+            collection,
+            batch_size=options['batch_size'],
+            log=lambda n: self.stdout.write(f'   {n} clientes processados'),
+        )
+        self.stdout.write(self.style.SUCCESS(f'✅ {total} clientes atualizados'))
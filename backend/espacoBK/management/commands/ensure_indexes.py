@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+
+from espacoBK.database import mongodb
+from espacoBK.indexes import INDEXES, ensure_indexes, find_collscans
+
+
+class Command(BaseCommand):
+    help = 'Cria os índices usados pelos serviços de database.py e aponta consultas com COLLSCAN ou SORT em memória'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check-only', action='store_true',
+                            help='Apenas verifica os planos, sem criar índices')
+        parser.add_argument('--collection', action='append', choices=sorted(INDEXES),
+                            help='Limita a criação a uma collection (pode repetir)')
+
+    def handle(self, *args, **options):
+        db = mongodb.db
+
+        if not options['check_only']:
+            self.stdout.write('🔧 Criando índices...')
+            for nome, resultado in ensure_indexes(db, options['collection']).items():
+                if isinstance(resultado, Exception):
+                    self.stdout.write(self.style.ERROR(f'   ❌ {nome}: {resultado}'))
+                else:
+                    self.stdout.write(f'   ✅ {nome}: {", ".join(resultado)}')
+
+        self.stdout.write('🔎 Verificando planos das consultas quentes...')
+        problemas = find_collscans(db)
+        for nome, descricao, estagios in problemas:
+            self.stdout.write(self.style.WARNING(
+                f'   ⚠️  {descricao} ({nome}): {" -> ".join(estagios)}'
+            ))
+        if problemas:
+            self.stdout.write(self.style.WARNING(f'{len(problemas)} consulta(s) sem índice (COLLSCAN ou SORT em memória)'))
+        else:
+            self.stdout.write(self.style.SUCCESS('✅ Todas as consultas quentes usam índice'))
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from espacoBK.database import tarefa_service
+
+
+class Command(BaseCommand):
+    help = 'Converte tarefas legadas (idUsuario string / usuario_id) para idUsuario: ObjectId'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Documentos por bulk_write (padrão: 1000)')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Apenas conta os documentos que seriam alterados')
+
+    def handle(self, *args, **options):
+        self.stdout.write('🔄 Normalizando IDs de usuário nas tarefas...')
+        resultado = tarefa_service.normalize_user_ids(
+            batch_size=options['batch_size'],
+            dry_run=options['dry_run'],
+        )
+        prefixo = '(dry-run) ' if options['dry_run'] else ''
+        self.stdout.write(self.style.SUCCESS(f"✅ {prefixo}{resultado['normalizadas']} tarefas normalizadas"))
+        if resultado['invalidas']:
+            self.stdout.write(self.style.WARNING(
+                f"⚠️  {resultado['invalidas']} tarefas com ID de usuário inválido foram ignoradas"
+            ))
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from espacoBK.database import campanha_stats_service
+
+
+class Command(BaseCommand):
+    help = 'Recalcula CampanhaStats a partir das tarefas e relata as divergências'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check-only', action='store_true',
+                            help='Apenas relata as divergências, sem corrigir (sai com erro se houver)')
+
+    def handle(self, *args, **options):
+        self.stdout.write('📊 Recalculando estatísticas das campanhas...')
+        divergencias = campanha_stats_service.rebuild(dry_run=options['check_only'])
+
+        for campanha, esperado, atual in divergencias:
+            self.stdout.write(self.style.WARNING(
+                f"⚠️  {campanha}: total {atual.get('total', 0)} → {esperado['total']}, "
+                f"concluídas {atual.get('concluidas', 0)} → {esperado['concluidas']}"
+            ))
+
+        if not divergencias:
+            self.stdout.write(self.style.SUCCESS('✅ CampanhaStats consistente com as tarefas'))
+        elif options['check_only']:
+            raise CommandError(f'{len(divergencias)} campanhas divergentes')
+        else:
+            self.stdout.write(self.style.SUCCESS(f'✅ {len(divergencias)} campanhas corrigidas'))
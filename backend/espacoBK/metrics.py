@@ -0,0 +1,296 @@
+import functools
+import inspect
+import ipaddress
+import os
+import threading
+import time
+from bisect import bisect_left
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.utils.crypto import constant_time_compare
+from pymongo import monitoring
+
+from .cache import cache_stats
+
+# Limites dos buckets de latência (segundos)
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_HELP = {
+    'espacobk_view_latency_seconds': 'Latência das views por nome de rota',
+    'espacobk_service_latency_seconds': 'Latência dos métodos dos serviços Mongo',
+    'espacobk_pool_checkout_wait_seconds': 'Espera por uma conexão do pool',
+}
+
+_METODOS = {'GET', 'POST', 'PUT', 'PATCH', 'DELETE', 'HEAD', 'OPTIONS'}
+
+# Acesso ao /metrics: com METRICS_TOKEN, só com Authorization: Bearer <token>;
+# sem ele, só das redes em METRICS_ALLOWED_NETWORKS (padrão: loopback).
+# Atrás de um proxy o REMOTE_ADDR é o do proxy: nesse caso use o token.
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+METRICS_ALLOWED_NETWORKS = [
+    ipaddress.ip_network(rede.strip(), strict=False)
+    for rede in os.getenv('METRICS_ALLOWED_NETWORKS', '127.0.0.0/8,::1/128').split(',') if rede.strip()
+]
+
+# (métrica, labels) -> Histogram; leitura sem lock, lock só para criar
+_histogramas = {}
+_registro_lock = threading.Lock()
+
+
+class Shards:
+    """Contadores com um shard por thread: a escrita no próprio shard não usa lock.
+
+    A leitura soma todos os shards (valores podem estar um pouco atrasados,
+    nunca perdidos). Shards de threads encerradas (pools do sync_to_async,
+    workers recriados) são somados em um único shard e descartados, então
+    a memória acompanha as threads vivas.
+    """
+    __slots__ = ('_inicial', '_local', '_vivos', '_encerrados', '_lock')
+
+    def __init__(self, inicial):
+        self._inicial = inicial
+        self._local = threading.local()
+        self._vivos = []
+        self._encerrados = list(inicial)
+        self._lock = threading.Lock()
+
+    def local(self):
+        """Shard da thread atual (criado no primeiro uso)"""
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = list(self._inicial)
+            with self._lock:
+                self._podar()
+                self._vivos.append((threading.current_thread(), shard))
+            self._local.shard = shard
+        return shard
+
+    def _podar(self):
+        # Thread encerrada não escreve mais: o shard pode ser somado com segurança
+        vivos = []
+        for thread, shard in self._vivos:
+            if thread.is_alive():
+                vivos.append((thread, shard))
+            else:
+                for indice, valor in enumerate(shard):
+                    self._encerrados[indice] += valor
+        self._vivos = vivos
+
+    def totais(self):
+        with self._lock:
+            self._podar()
+            totais = list(self._encerrados)
+            shards = [shard for _, shard in self._vivos]
+        for shard in shards:
+            for indice, valor in enumerate(shard):
+                totais[indice] += valor
+        return totais
+
+    def __len__(self):
+        return len(self._vivos)
+
+
+class Histogram:
+    """Histograma sobre Shards: observe() não usa lock"""
+    __slots__ = ('buckets', 'shards')
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        # Contagem por bucket, +Inf e a soma no último item
+        self.shards = Shards([0] * (len(buckets) + 1) + [0.0])
+
+    def observe(self, segundos):
+        shard = self.shards.local()
+        shard[bisect_left(self.buckets, segundos)] += 1
+        shard[-1] += segundos
+
+    def snapshot(self):
+        """(contagens acumuladas por bucket incluindo +Inf, soma)"""
+        totais = self.shards.totais()
+        acumulado, contagens = 0, []
+        for valor in totais[:-1]:
+            acumulado += valor
+            contagens.append(acumulado)
+        return contagens, totais[-1]
+
+
+def histogram(nome, **labels):
+    """Histograma da métrica com os labels (criado no primeiro uso)"""
+    chave = (nome, tuple(sorted(labels.items())))
+    histograma = _histogramas.get(chave)
+    if histograma is None:
+        with _registro_lock:
+            histograma = _histogramas.setdefault(chave, Histogram())
+    return histograma
+
+
+def instrument(cls):
+    """Decorador de classe: mede a latência de cada método público do serviço"""
+    for nome, metodo in list(vars(cls).items()):
+        if nome.startswith('_') or not inspect.isfunction(metodo) or inspect.isgeneratorfunction(metodo):
+            continue
+        histograma = histogram('espacobk_service_latency_seconds', service=cls.__name__, method=nome)
+        setattr(cls, nome, _medir(metodo, histograma))
+    return cls
+
+
+def _medir(metodo, histograma):
+    if inspect.iscoroutinefunction(metodo):
+        @functools.wraps(metodo)
+        async def medido_async(*args, **kwargs):
+            inicio = time.perf_counter()
+            try:
+                return await metodo(*args, **kwargs)
+            finally:
+                histograma.observe(time.perf_counter() - inicio)
+        return medido_async
+
+    @functools.wraps(metodo)
+    def medido(*args, **kwargs):
+        inicio = time.perf_counter()
+        try:
+            return metodo(*args, **kwargs)
+        finally:
+            histograma.observe(time.perf_counter() - inicio)
+    return medido
+
+
+class PoolMetricsListener(monitoring.ConnectionPoolListener):
+    """Conexões em uso e requisições esperando pelo pool (maxPoolSize)"""
+
+    def __init__(self):
+        # [em uso, esperando, falhas de checkout] por thread; a soma é o valor global
+        self.shards = Shards([0, 0, 0])
+        self._local = threading.local()
+        self.espera = histogram('espacobk_pool_checkout_wait_seconds')
+
+    def _shard(self):
+        return self.shards.local()
+
+    def valores(self):
+        totais = self.shards.totais()
+        return {'checked_out': totais[0], 'waiting': totais[1], 'checkout_failed': totais[2]}
+
+    def connection_check_out_started(self, event):
+        self._shard()[1] += 1
+        self._local.inicio = time.perf_counter()
+
+    def connection_checked_out(self, event):
+        shard = self._shard()
+        shard[0] += 1
+        shard[1] -= 1
+        self.espera.observe(time.perf_counter() - getattr(self._local, 'inicio', time.perf_counter()))
+
+    def connection_check_out_failed(self, event):
+        shard = self._shard()
+        shard[1] -= 1
+        shard[2] += 1
+
+    def connection_checked_in(self, event):
+        self._shard()[0] -= 1
+
+    # Eventos sem interesse para as métricas
+    def pool_created(self, event): pass
+    def pool_ready(self, event): pass
+    def pool_cleared(self, event): pass
+    def pool_closed(self, event): pass
+    def connection_created(self, event): pass
+    def connection_ready(self, event): pass
+    def connection_closed(self, event): pass
+
+
+# Registrado nos clientes PyMongo e Motor (event_listeners)
+pool_listener = PoolMetricsListener()
+
+
+class MetricsMiddleware:
+    """Mede a latência de cada requisição pelo nome da rota (url name)"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        inicio = time.perf_counter()
+        response = self.get_response(request)
+        self._observar(request, time.perf_counter() - inicio)
+        return response
+
+    async def __acall__(self, request):
+        inicio = time.perf_counter()
+        response = await self.get_response(request)
+        self._observar(request, time.perf_counter() - inicio)
+        return response
+
+    @staticmethod
+    def _observar(request, segundos):
+        rota = getattr(request, 'resolver_match', None)
+        view = (rota.url_name or rota.view_name) if rota else 'sem_rota'
+        # Métodos fora da lista não criam séries novas (cardinalidade limitada)
+        metodo = request.method if request.method in _METODOS else 'OTHER'
+        histogram('espacobk_view_latency_seconds', view=view, method=metodo).observe(segundos)
+
+
+def acesso_permitido(request):
+    """Token do /metrics (METRICS_TOKEN) ou, sem token configurado, rede interna"""
+    if METRICS_TOKEN:
+        partes = request.META.get('HTTP_AUTHORIZATION', '').split()
+        return len(partes) == 2 and partes[0].lower() == 'bearer' and constant_time_compare(partes[1], METRICS_TOKEN)
+    try:
+        endereco = ipaddress.ip_address(request.META.get('REMOTE_ADDR', ''))
+    except ValueError:
+        return False
+    return any(endereco in rede for rede in METRICS_ALLOWED_NETWORKS)
+
+
+def _labels(pares):
+    return ','.join(f'{chave}="{valor}"' for chave, valor in pares)
+
+
+def render():
+    """Todas as métricas no formato texto do Prometheus"""
+    linhas = []
+    por_metrica = {}
+    for (nome, labels), histograma in list(_histogramas.items()):
+        por_metrica.setdefault(nome, []).append((labels, histograma))
+
+    for nome in sorted(por_metrica):
+        linhas.append(f'# HELP {nome} {_HELP.get(nome, nome)}')
+        linhas.append(f'# TYPE {nome} histogram')
+        for labels, histograma in sorted(por_metrica[nome], key=lambda item: item[0]):
+            contagens, soma = histograma.snapshot()
+            limites = [str(limite) for limite in histograma.buckets] + ['+Inf']
+            for limite, contagem in zip(limites, contagens):
+                linhas.append(f'{nome}_bucket{{{_labels(labels + (("le", limite),))}}} {contagem}')
+            sufixo = f'{{{_labels(labels)}}}' if labels else ''
+            linhas.append(f'{nome}_sum{sufixo} {soma}')
+            linhas.append(f'{nome}_count{sufixo} {contagens[-1]}')
+
+    pool = pool_listener.valores()
+    for nome, ajuda, chave in (
+        ('espacobk_pool_checked_out', 'Conexões do pool em uso', 'checked_out'),
+        ('espacobk_pool_waiting', 'Operações esperando uma conexão do pool', 'waiting'),
+    ):
+        linhas += [f'# HELP {nome} {ajuda}', f'# TYPE {nome} gauge', f'{nome} {pool[chave]}']
+    linhas += [
+        '# HELP espacobk_pool_checkout_failed_total Checkouts do pool que falharam',
+        '# TYPE espacobk_pool_checkout_failed_total counter',
+        f'espacobk_pool_checkout_failed_total {pool["checkout_failed"]}',
+    ]
+
+    caches = cache_stats()
+    for nome, tipo, ajuda, chave in (
+        ('espacobk_cache_hits_total', 'counter', 'Leituras atendidas pelo cache', 'hits'),
+        ('espacobk_cache_misses_total', 'counter', 'Leituras que foram ao banco', 'misses'),
+        ('espacobk_cache_hit_ratio', 'gauge', 'Fração de leituras atendidas pelo cache', 'hit_ratio'),
+    ):
+        linhas += [f'# HELP {nome} {ajuda}', f'# TYPE {nome} {tipo}']
+        for cache, stats in sorted(caches.items()):
+            linhas.append(f'{nome}{{cache="{cache}",backend="{stats["backend"]}"}} {stats.get(chave, 0)}')
+
+    return '\n'.join(linhas) + '\n'
@@ -0,0 +1,118 @@
+import base64
+import binascii
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from django.core.cache import cache
+from rest_framework.exceptions import ValidationError
+
+# Tempo (segundos) que o total de uma listagem fica em cache
+TOTAL_CACHE_TIMEOUT = 60
+
+
+def query_params(request):
+    """Parâmetros da URL tanto em views DRF quanto em views Django puras"""
+    return getattr(request, 'query_params', request.GET)
+
+
+def encode_cursor(object_id):
+    """Gera um cursor opaco a partir do último _id da página"""
+    return base64.urlsafe_b64encode(str(object_id).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Recupera o _id codificado no cursor"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        return ObjectId(base64.urlsafe_b64decode(padded).decode())
+    except (binascii.Error, UnicodeDecodeError, InvalidId, TypeError, ValueError):
+        raise ValidationError({'cursor': 'Cursor inválido.'})
+
+
+class ObjectIdCursorPagination:
+    """Parâmetros da paginação por keyset em _id (sem skip, custo constante por página).
+
+    A página em si vem dos serviços (limit + 1 documentos depois do cursor)
+    e o cursor seguinte de next_page_cursor.
+    """
+    page_size = 100
+    max_page_size = 1000
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'limit'
+
+    def get_page_size(self, request):
+        valor = query_params(request).get(self.page_size_query_param)
+        if valor is None:
+            return self.page_size
+        try:
+            tamanho = int(valor)
+        except ValueError:
+            raise ValidationError({self.page_size_query_param: 'Deve ser um número inteiro.'})
+        if tamanho < 1:
+            raise ValidationError({self.page_size_query_param: 'Deve ser maior que zero.'})
+        return min(tamanho, self.max_page_size)
+
+
+def page_params(request, serializer_class):
+    """Lê limit/cursor/fields da URL. Retorna (campos, projeção do Mongo, limit, after)"""
+    campos, projecao = parse_fields(request, serializer_class)
+    limit = ObjectIdCursorPagination().get_page_size(request)
+    cursor = query_params(request).get(ObjectIdCursorPagination.cursor_query_param)
+    after = decode_cursor(cursor) if cursor else None
+    projection = dict.fromkeys(projecao, 1) if projecao else None
+    return campos, projection, limit, after
+
+
+def next_page_cursor(documentos, limit):
+    """Descarta o documento extra (limit + 1) e devolve o cursor da próxima página"""
+    if len(documentos) > limit:
+        del documentos[limit:]
+        return encode_cursor(documentos[-1]['_id'])
+    return None
+
+
+def parse_fields(request, serializer_class):
+    """Lê o parâmetro fields= e retorna (campos de saída, projeção no Mongo)"""
+    valor = query_params(request).get('fields')
+    if not valor:
+        return None, None
+
+    disponiveis = serializer_class.Meta.fields
+    campos = [campo.strip() for campo in valor.split(',') if campo.strip()]
+    invalidos = [campo for campo in campos if campo not in disponiveis]
+    if invalidos:
+        raise ValidationError({'fields': f'Campos inválidos: {", ".join(invalidos)}'})
+
+    # Campos calculados dependem de outros campos do documento
+    dependencias = getattr(serializer_class, 'campos_dependentes', {})
+    projecao = {'_id'}
+    for campo in campos:
+        projecao.update(dependencias.get(campo, (campo,)))
+    return campos, sorted(projecao)
+
+
+def cached_total(key, contar, incluir=True):
+    """Retorna o total em cache em vez de recontar a cada página"""
+    if not incluir:
+        return None
+    total = cache.get(key)
+    if total is None:
+        total = contar()
+        cache.set(key, total, TOTAL_CACHE_TIMEOUT)
+    return total
+
+
+async def acached_total(key, contar, incluir=True):
+    """Versão assíncrona de cached_total (contar é uma corrotina)"""
+    if not incluir:
+        return None
+    total = await cache.aget(key)
+    if total is None:
+        total = await contar()
+        await cache.aset(key, total, TOTAL_CACHE_TIMEOUT)
+    return total
+
+
+def invalidate_total(key):
+    """Descarta o total em cache após uma escrita"""
+    cache.delete(key)
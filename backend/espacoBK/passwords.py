@@ -0,0 +1,73 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth.hashers import (
+    Argon2PasswordHasher, PBKDF2PasswordHasher, check_password, identify_hasher, make_password
+)
+from django.utils.crypto import constant_time_compare
+
+# Hash lento roda em um pool próprio: fora do event loop nas views assíncronas
+# e, nas síncronas, limitado a PASSWORD_HASH_WORKERS hashes simultâneos por processo
+_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv('PASSWORD_HASH_WORKERS', 4)),
+    thread_name_prefix='senha',
+)
+
+
+class Argon2Hasher(Argon2PasswordHasher):
+    """Argon2 com custo configurável (PASSWORD_ARGON2_TIME_COST / _MEMORY_COST em KiB)"""
+    time_cost = int(os.getenv('PASSWORD_ARGON2_TIME_COST', Argon2PasswordHasher.time_cost))
+    memory_cost = int(os.getenv('PASSWORD_ARGON2_MEMORY_COST', Argon2PasswordHasher.memory_cost))
+    parallelism = int(os.getenv('PASSWORD_ARGON2_PARALLELISM', Argon2PasswordHasher.parallelism))
+
+
+class PBKDF2Hasher(PBKDF2PasswordHasher):
+    """PBKDF2 com número de iterações configurável (PASSWORD_PBKDF2_ITERATIONS)"""
+    iterations = int(os.getenv('PASSWORD_PBKDF2_ITERATIONS', PBKDF2PasswordHasher.iterations))
+
+
+def is_hashed(senha):
+    """Indica se o valor guardado já é um hash reconhecido (e não texto puro legado)"""
+    try:
+        identify_hasher(senha)
+    except (ValueError, TypeError):
+        return False
+    return True
+
+
+def hash_password(senha):
+    """Gera o hash com o hasher preferido (primeiro de PASSWORD_HASHERS), no pool"""
+    return _executor.submit(make_password, senha).result()
+
+
+def verify_password(senha, guardada):
+    """Confere a senha no pool e retorna (válida, precisa_atualizar).
+
+    Senhas em texto puro (legado) são comparadas em tempo constante e sempre
+    pedem atualização; hashes com hasher ou custo antigos também.
+    """
+    return _executor.submit(_verificar, senha, guardada).result()
+
+
+def _verificar(senha, guardada):
+    if not guardada or senha is None:
+        return False, False
+
+    if not is_hashed(guardada):
+        valida = constant_time_compare(senha, guardada)
+        return valida, valida
+
+    atualizar = []
+    valida = check_password(senha, guardada, setter=lambda _senha: atualizar.append(True))
+    return valida, bool(atualizar)
+
+
+async def ahash_password(senha):
+    """hash_password sem bloquear o event loop"""
+    return await asyncio.get_running_loop().run_in_executor(_executor, make_password, senha)
+
+
+async def averify_password(senha, guardada):
+    """verify_password sem bloquear o event loop"""
+    return await asyncio.get_running_loop().run_in_executor(_executor, _verificar, senha, guardada)
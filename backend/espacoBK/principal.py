@@ -0,0 +1,49 @@
+import os
+
+from .cache import build_cache
+from .database import usuario_service
+
+# Campos do usuário guardados por sessão (nunca a senha)
+CAMPOS_PRINCIPAL = ('_id', 'nome', 'email', 'tipo', 'status')
+
+# Cache por processo, de vida curta: mudanças no usuário aparecem em até SESSION_PRINCIPAL_TTL segundos
+principal_cache = build_cache(
+    'Sessao',
+    backend=os.getenv('SESSION_PRINCIPAL_BACKEND', 'lru'),
+    ttl=int(os.getenv('SESSION_PRINCIPAL_TTL', 30)),
+)
+
+
+def _chave(request):
+    # Autenticado por token não tem sessão: a chave é o próprio usuário
+    if request.session.session_key:
+        return request.session.session_key
+    usuario_id = getattr(request.user, 'usuario_id', None)
+    return f'usuario:{usuario_id}' if usuario_id else None
+
+
+def get_principal(request):
+    """Usuário autenticado (token ou sessão), sem ir ao Mongo enquanto estiver em cache"""
+    usuario_id = getattr(request.user, 'usuario_id', None) or request.session.get('usuario_id')
+    if not usuario_id:
+        return None
+
+    chave = _chave(request)
+    principal = principal_cache.get(chave) if chave else None
+    if principal is not None and str(principal['_id']) == usuario_id:
+        return principal
+
+    usuario = usuario_service.find_by_id(usuario_id)
+    if usuario is None:
+        return None
+    principal = {campo: usuario.get(campo) for campo in CAMPOS_PRINCIPAL}
+    if chave:
+        principal_cache.set(chave, principal)
+    return principal
+
+
+def forget_principal(request):
+    """Descarta o usuário em cache da sessão (logout)"""
+    chave = _chave(request)
+    if chave:
+        principal_cache.delete(chave)
@@ -0,0 +1,158 @@
+import contextvars
+import json
+import logging
+import os
+import random
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from pymongo import monitoring
+
+logger = logging.getLogger(__name__)
+
+# Fração das requisições que recebem Server-Timing e linha de log (0.0 a 1.0)
+SAMPLE_RATE = float(os.getenv('MONGO_PROFILER_SAMPLE_RATE', 0.01))
+
+# Requisições acima deste tempo (ms) sempre geram o log detalhado dos comandos
+SLOW_MS = float(os.getenv('MONGO_PROFILER_SLOW_MS', 500))
+
+# Comandos guardados por requisição para o log detalhado
+MAX_COMANDOS = 50
+
+# Perfil da requisição atual (thread ou task); None fora de uma requisição
+_perfil = contextvars.ContextVar('mongo_perfil', default=None)
+
+
+class PerfilRequisicao:
+    """Comandos Mongo emitidos durante uma requisição"""
+    __slots__ = ('comandos', 'falhas', 'total_ms', 'mais_lento', 'detalhes', '_pendentes')
+
+    def __init__(self):
+        self.comandos = 0
+        self.falhas = 0
+        self.total_ms = 0.0
+        self.mais_lento = None
+        self.detalhes = []
+        self._pendentes = {}
+
+    def iniciar(self, request_id, alvo):
+        self._pendentes[request_id] = alvo
+
+    def registrar(self, request_id, nome, duracao_ms, falhou=False):
+        alvo = self._pendentes.pop(request_id, None)
+        self.comandos += 1
+        self.falhas += falhou
+        self.total_ms += duracao_ms
+        comando = {'comando': nome, 'collection': alvo, 'ms': round(duracao_ms, 2)}
+        if self.mais_lento is None or duracao_ms > self.mais_lento['ms']:
+            self.mais_lento = comando
+        if len(self.detalhes) < MAX_COMANDOS:
+            self.detalhes.append(comando)
+
+
+class MongoCommandProfiler(monitoring.CommandListener):
+    """Soma os comandos ao perfil da requisição em andamento (contextvars)"""
+
+    def started(self, event):
+        perfil = _perfil.get()
+        if perfil is not None:
+            alvo = event.command.get(event.command_name)
+            perfil.iniciar(event.request_id, alvo if isinstance(alvo, str) else None)
+
+    def succeeded(self, event):
+        perfil = _perfil.get()
+        if perfil is not None:
+            perfil.registrar(event.request_id, event.command_name, event.duration_micros / 1000)
+
+    def failed(self, event):
+        perfil = _perfil.get()
+        if perfil is not None:
+            perfil.registrar(event.request_id, event.command_name, event.duration_micros / 1000, falhou=True)
+
+
+# Registrado globalmente no AppConfig.ready(): vale para todos os clientes
+# criados depois (PyMongo, Motor e djongo), sem passar em event_listeners
+command_listener = MongoCommandProfiler()
+_registrado = False
+
+
+def register_command_listener():
+    """Registra o command_listener no pymongo.monitoring (uma vez por processo)"""
+    global _registrado
+    if not _registrado:
+        monitoring.register(command_listener)
+        _registrado = True
+
+
+class MongoProfilerMiddleware:
+    """Conta os comandos Mongo de cada requisição e publica o resultado.
+
+    Amostradas: cabeçalho Server-Timing e uma linha de log JSON.
+    Lentas (>= MONGO_PROFILER_SLOW_MS): log WARNING com os comandos executados.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        perfil = PerfilRequisicao()
+        token = _perfil.set(perfil)
+        inicio = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _perfil.reset(token)
+        return self._publicar(request, response, perfil, inicio)
+
+    async def __acall__(self, request):
+        perfil = PerfilRequisicao()
+        token = _perfil.set(perfil)
+        inicio = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _perfil.reset(token)
+        return self._publicar(request, response, perfil, inicio)
+
+    def _publicar(self, request, response, perfil, inicio):
+        duracao_ms = (time.perf_counter() - inicio) * 1000
+        lenta = duracao_ms >= SLOW_MS
+        amostrada = random.random() < SAMPLE_RATE
+        if not (lenta or amostrada):
+            return response
+
+        registro = {
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'duration_ms': round(duracao_ms, 2),
+            'mongo_commands': perfil.comandos,
+            'mongo_failed': perfil.falhas,
+            'mongo_ms': round(perfil.total_ms, 2),
+            'mongo_slowest': perfil.mais_lento,
+        }
+        if amostrada:
+            response['Server-Timing'] = server_timing(perfil, duracao_ms)
+            logger.info(f"mongo_profile {json.dumps(registro)}")
+        if lenta:
+            registro['commands'] = perfil.detalhes
+            logger.warning(f"🐢 mongo_profile_slow {json.dumps(registro)}")
+        return response
+
+
+def server_timing(perfil, duracao_ms):
+    """Valor do cabeçalho Server-Timing (visível no DevTools do navegador)"""
+    metricas = [
+        f'mongo;dur={perfil.total_ms:.2f};desc="{perfil.comandos} comandos"',
+        f'app;dur={duracao_ms:.2f}',
+    ]
+    if perfil.mais_lento:
+        descricao = ' '.join(filter(None, (perfil.mais_lento['comando'], perfil.mais_lento['collection'])))
+        metricas.insert(1, f'mongo-slowest;dur={perfil.mais_lento["ms"]:.2f};desc="{descricao}"')
+    return ', '.join(metricas)
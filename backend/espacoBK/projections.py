@@ -0,0 +1,225 @@
+from datetime import datetime
+
+from django.db import models
+from django.utils.encoding import is_protected_type
+from rest_framework import serializers
+from rest_framework.fields import Field
+
+from .serializers import ClienteSerializer, TarefaSerializer, carregar_nomes_usuarios, eh_campo_data
+
+
+class _DocView:
+    """Documento do PyMongo com a cara de uma instância do modelo.
+
+    Atributos vêm do documento (ou do default do campo no modelo) e métodos
+    do modelo ficam disponíveis, então propriedades como is_completed e
+    os SerializerMethodField funcionam sem criar a instância.
+    """
+    __slots__ = ('_doc', '_projecao')
+
+    def __init__(self, doc, projecao):
+        self._doc = doc
+        self._projecao = projecao
+
+    def __getattr__(self, nome):
+        doc = self._doc
+        if nome in doc:
+            converter = self._projecao.conversoes.get(nome)
+            return doc[nome] if converter is None else converter(doc[nome])
+        projecao = self._projecao
+        if nome in projecao.defaults:
+            return projecao.default(nome)
+        atributo = getattr(projecao.model, nome)
+        return atributo.__get__(self) if hasattr(atributo, '__get__') else atributo
+
+
+# Valores distintos guardados por propriedade memoizada
+MEMO_MAX = 1024
+
+_FALTA = object()
+
+
+def _eh(field, classe):
+    """O campo usa exatamente o to_representation de classe (sem sobrescrita)"""
+    return type(field).to_representation is classe.to_representation
+
+
+class Projecao:
+    """Saída somente leitura de um serializer, pré-calculada para documentos brutos.
+
+    Na primeira chamada o serializer é inspecionado (serializer_class().fields)
+    e, para cada conjunto de campos pedido, é montada uma lista de pares
+    (campo, conversor) que lê o valor direto do documento. A saída é igual à
+    do serializer sobre instancia_de_documento(model, documento).
+    """
+
+    def __init__(self, serializer_class, preparar=None):
+        self.serializer_class = serializer_class
+        self.preparar = preparar
+        self.model = None
+        self.defaults = {}
+        self.conversoes = {}
+        self._campos = None
+        self._planos = {}
+
+    def default(self, nome):
+        valor = self.defaults[nome]
+        return valor() if callable(valor) else valor
+
+    def _inspecionar(self):
+        """Lê o modelo e os campos do serializer uma única vez"""
+        self.model = self.serializer_class.Meta.model
+        defaults = {}
+        conversoes = {}
+        for campo in self.model._meta.concrete_fields:
+            # Mesmo default que o Model.__init__ usaria para a chave ausente
+            defaults[campo.attname] = campo.default if campo.has_default() and callable(campo.default) \
+                else campo.get_default()
+            if eh_campo_data(campo):
+                conversoes[campo.attname] = campo.to_python
+        self.defaults = defaults
+        self.conversoes = conversoes
+        self._campos = list(self.serializer_class().fields.items())
+
+    def _compilar(self, campos):
+        """Pares (campo, conversor) dos campos pedidos e se algum usa a visão do modelo"""
+        if self._campos is None:
+            self._inspecionar()
+
+        selecionados = [(nome, field) for nome, field in self._campos if campos is None or nome in campos]
+        plano = [(nome, self._conversor(nome, field)) for nome, field in selecionados]
+        usa_visao = any(not (self._simples(field) or self._direto(field)) for _, field in selecionados)
+        return plano, usa_visao
+
+    def _conversor(self, nome, field):
+        """Função (doc, visão, serializer) -> valor de saída do campo"""
+        if isinstance(field, serializers.SerializerMethodField):
+            metodo = field.method_name
+            return lambda doc, visao, s: getattr(s, metodo)(visao)
+
+        if type(field) is serializers.ModelField:
+            # Campos do djongo sem equivalente no DRF (ObjectIdField)
+            if not self._direto(field):
+                representar = field.to_representation
+                return lambda doc, visao, s: representar(visao)
+            attname = field.model_field.attname
+            padrao = self.defaults[attname]
+
+            def direto(doc, visao, s):
+                valor = doc.get(attname, padrao)
+                return valor if is_protected_type(valor) else str(valor)
+            return direto
+
+        ler = self._leitura(field)
+        dependentes = self._memoizavel(nome, field)
+        if dependentes:
+            ler = self._memoizar(ler, dependentes)
+        if self._simples(field) and field.source in self.conversoes:
+            ler = self._converter_data(ler, self.conversoes[field.source])
+
+        if isinstance(field, serializers.ReadOnlyField) and _eh(field, serializers.ReadOnlyField):
+            return lambda doc, visao, s: ler(doc, visao)
+        if _eh(field, serializers.CharField):
+            representar = str
+        elif _eh(field, serializers.IntegerField):
+            representar = int
+        else:
+            representar = field.to_representation
+
+        def converter(doc, visao, s):
+            valor = ler(doc, visao)
+            return None if valor is None else representar(valor)
+        return converter
+
+    def _leitura(self, field):
+        """Função (doc, visão) -> valor do campo antes da representação"""
+        if not self._simples(field):
+            # Propriedade do modelo ou source composto: lido pela visão do documento
+            obter = field.get_attribute
+            return lambda doc, visao: obter(visao)
+        fonte = field.source
+        padrao = self.defaults[fonte]
+        if callable(padrao):
+            return lambda doc, visao: doc[fonte] if fonte in doc else padrao()
+        return lambda doc, visao: doc.get(fonte, padrao)
+
+    def _memoizar(self, ler, dependentes):
+        """Valor calculado uma vez por combinação dos campos de origem"""
+        memo = {}
+        origens = [(dep, self.defaults[dep]) for dep in dependentes]
+
+        def memoizado(doc, visao):
+            chave = tuple(doc.get(dep, padrao) for dep, padrao in origens)
+            try:
+                valor = memo.get(chave, _FALTA)
+            except TypeError:
+                # Origem não hashable (lista, dict vindos do banco): calcula sem memo
+                return ler(doc, visao)
+            if valor is _FALTA:
+                valor = ler(doc, visao)
+                if len(memo) < MEMO_MAX:
+                    memo[chave] = valor
+            return valor
+        return memoizado
+
+    @staticmethod
+    def _converter_data(ler, to_python):
+        """DateField volta do BSON como datetime (ver eh_campo_data)"""
+        def data(doc, visao):
+            valor = ler(doc, visao)
+            return to_python(valor) if isinstance(valor, datetime) else valor
+        return data
+
+    def _simples(self, field):
+        """Campo lido direto de uma chave do documento"""
+        return type(field).get_attribute is Field.get_attribute and field.source in self.defaults
+
+    def _memoizavel(self, nome, field):
+        """Campos de origem de uma propriedade do modelo (campos_dependentes do serializer)"""
+        if self._simples(field) or not isinstance(getattr(self.model, field.source, None), property):
+            return None
+        dependentes = getattr(self.serializer_class, 'campos_dependentes', {}).get(nome)
+        if dependentes and all(dep in self.defaults and not callable(self.defaults[dep]) for dep in dependentes):
+            return dependentes
+        return None
+
+    def _direto(self, field):
+        """ModelField cujo valor sai do documento como no value_to_string padrão"""
+        return (type(field) is serializers.ModelField
+                and field.model_field.attname in self.defaults
+                and not callable(self.defaults[field.model_field.attname])
+                and type(field.model_field).value_to_string is models.Field.value_to_string)
+
+    def _plano(self, campos):
+        chave = frozenset(campos) if campos is not None else None
+        plano = self._planos.get(chave)
+        if plano is None:
+            plano = self._planos[chave] = self._compilar(campos)
+        return plano
+
+    def render(self, documentos, campos=None, context=None):
+        """Lista de dicts de saída para os documentos (campos=None: todos)"""
+        plano, usa_visao = self._plano(campos)
+        serializer = self.serializer_class(context=context or {})
+        if self.preparar is not None:
+            self.preparar(serializer, documentos)
+        saida = []
+        for documento in documentos:
+            visao = _DocView(documento, self) if usa_visao else None
+            saida.append({nome: converter(documento, visao, serializer) for nome, converter in plano})
+        return saida
+
+    def render_one(self, documento, campos=None, context=None):
+        return self.render([documento], campos, context)[0]
+
+
+def _resolver_nomes(serializer, documentos):
+    """Como o TarefaListSerializer: nomes de usuário em uma consulta por página"""
+    nomes = serializer.context.get('usuario_nomes')
+    if nomes is None:
+        nomes = carregar_nomes_usuarios({documento.get('idUsuario') for documento in documentos})
+    serializer.usuario_nomes = nomes
+
+
+tarefa_projecao = Projecao(TarefaSerializer, preparar=_resolver_nomes)
+cliente_projecao = Projecao(ClienteSerializer)
@@ -0,0 +1,276 @@
+import asyncio
+import logging
+import os
+import secrets
+from collections import deque
+
+from django.dispatch import receiver
+from pymongo.errors import OperationFailure, PyMongoError
+
+from .async_database import async_mongodb
+from .database import escrita
+from .renderers import dumps
+
+logger = logging.getLogger(__name__)
+
+# Collections observadas pelo change stream
+COLECOES = ('Tarefa', 'Cliente')
+
+# Erro do servidor quando não há replica set (change streams indisponíveis)
+_SEM_REPLICA_SET = (40573, 40324)
+
+# Campo desconhecido no $changeStream: fullDocumentBeforeChange só existe no MongoDB 6.0+
+_CAMPO_DESCONHECIDO = 40415
+
+# Enviado no lugar do reenvio quando o Last-Event-ID não está no buffer deste
+# processo (outro worker, reinício ou buffer esgotado): o cliente deve
+# sincronizar pelo /changes com o seu token
+RESYNC = {'evento_id': None, 'colecao': 'resync', 'operacao': 'resync', 'id': None, 'owner': None, 'dados': None}
+
+
+def projetar_evento(colecao, documento):
+    """Payload do evento: a mesma saída da API (projeções), nunca o documento bruto.
+
+    As projeções (e com elas serializers e modelos) só são importadas na
+    primeira publicação, não no AppConfig.ready().
+    """
+    if documento is None:
+        return None
+    from .projections import cliente_projecao, tarefa_projecao
+    if colecao == 'Tarefa':
+        # Campos da API, sem usuario_nome (o destinatário é o dono)
+        campos = [campo for campo in tarefa_projecao.serializer_class.Meta.fields if campo != 'usuario_nome']
+        return tarefa_projecao.render_one(documento, campos, {'usuario_nomes': {}})
+    return cliente_projecao.render_one(documento)
+
+
+def format_sse(evento):
+    """Formata um evento no protocolo Server-Sent Events"""
+    dados = dumps(evento).decode()
+    linha_id = f"id: {evento['evento_id']}\n" if evento['evento_id'] else ''
+    return f"{linha_id}event: {evento['colecao']}\ndata: {dados}\n\n"
+
+
+class EventBroker:
+    """Fan-out em memória dos eventos para as conexões inscritas no processo.
+
+    Eventos de Tarefa vão só para o dono; eventos de Cliente vão para todos.
+    Um buffer circular permite retomar a partir do Last-Event-ID. Os ids dos
+    eventos do change stream são os resume tokens (iguais em todos os
+    processos); os publicados pelo próprio processo levam a origem do broker.
+    """
+
+    def __init__(self, buffer_size=1000, queue_size=100):
+        self.queue_size = queue_size
+        self.origem = secrets.token_hex(4)
+        self.loop = None
+        self._seq = 0
+        self._buffer = deque(maxlen=buffer_size)
+        self._subscribers = {}
+
+    def subscribe(self, user_id, last_event_id=None):
+        """Inscreve uma conexão e reenvia os eventos perdidos após last_event_id"""
+        self.loop = _loop_atual() or self.loop
+        pendentes = []
+        if last_event_id:
+            eventos = list(self._buffer)
+            posicao = next(
+                (indice for indice, evento in enumerate(eventos) if evento['evento_id'] == last_event_id), None
+            )
+            if posicao is None:
+                pendentes = [RESYNC]
+            else:
+                pendentes = [evento for evento in eventos[posicao + 1:] if self._destinado(evento, str(user_id))]
+
+        # A fila comporta todo o reenvio, senão o cliente reconectaria sem parar
+        fila = asyncio.Queue(maxsize=self.queue_size + len(pendentes))
+        for evento in pendentes:
+            fila.put_nowait(evento)
+        self._subscribers.setdefault(str(user_id), set()).add(fila)
+        return fila
+
+    def unsubscribe(self, user_id, fila):
+        filas = self._subscribers.get(str(user_id))
+        if filas is not None:
+            filas.discard(fila)
+            if not filas:
+                del self._subscribers[str(user_id)]
+
+    def publish(self, colecao, operacao, documento_id, owner=None, dados=None, evento_id=None):
+        """Registra um evento e entrega às conexões interessadas (no event loop do broker)"""
+        self._seq += 1
+        evento = {
+            'evento_id': evento_id or f'{self.origem}-{self._seq}',
+            'colecao': colecao,
+            'operacao': operacao,
+            'id': str(documento_id),
+            'owner': str(owner) if owner else None,
+            'dados': dados,
+        }
+        self._buffer.append(evento)
+
+        if evento['owner']:
+            destinos = [self._subscribers.get(evento['owner'], ())]
+        else:
+            destinos = list(self._subscribers.values())
+        for filas in destinos:
+            for fila in list(filas):
+                self._entregar(fila, evento)
+        return evento
+
+    @staticmethod
+    def _destinado(evento, user_id):
+        return evento['owner'] is None or evento['owner'] == user_id
+
+    @staticmethod
+    def _entregar(fila, evento):
+        try:
+            fila.put_nowait(evento)
+        except asyncio.QueueFull:
+            # Conexão lenta: encerrar para o cliente reconectar com Last-Event-ID
+            while not fila.empty():
+                fila.get_nowait()
+            fila.put_nowait(None)
+
+    @property
+    def connections(self):
+        return sum(len(filas) for filas in self._subscribers.values())
+
+
+def _loop_atual():
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+
+
+class InMemoryPublisher:
+    """Publicador das escritas feitas pelo próprio processo (sem replica set).
+
+    Recebe os eventos do sinal escrita dos serviços; eventos de escritas de
+    outros processos não chegam (para isso, o ChangeStreamPublisher).
+    """
+    backend = 'memory'
+    recebe_escritas = True
+
+    def __init__(self, broker):
+        self.broker = broker
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def publish(self, colecao, operacao, documento_id, owner=None, documento=None, evento_id=None):
+        """Projeta o documento e publica no broker (de qualquer thread)"""
+        argumentos = (colecao, operacao, documento_id, owner, projetar_evento(colecao, documento), evento_id)
+        loop = self.broker.loop
+        # Views síncronas rodam em threads: as filas só podem ser tocadas no loop delas
+        if loop is not None and not loop.is_closed() and _loop_atual() is not loop:
+            loop.call_soon_threadsafe(self.broker.publish, *argumentos)
+            return None
+        return self.broker.publish(*argumentos)
+
+
+class ChangeStreamPublisher(InMemoryPublisher):
+    """Um único change stream por processo sobre Tarefa e Cliente, repassado ao broker.
+
+    Sem replica set, passa a publicar as escritas do próprio processo, como
+    o InMemoryPublisher. Em servidores anteriores ao 6.0 (sem pre-image), o
+    dono vem só do fullDocument e exclusões de tarefa ficam para o /changes.
+    """
+    backend = 'changestream'
+    recebe_escritas = False
+
+    def __init__(self, broker, retry_delay=2):
+        super().__init__(broker)
+        self.retry_delay = retry_delay
+        self.resume_token = None
+        self.disponivel = True
+        self.pre_image = True
+        self._task = None
+
+    def start(self):
+        """Inicia o consumidor no event loop atual (idempotente)"""
+        if self.disponivel and (self._task is None or self._task.done()):
+            self._task = asyncio.get_running_loop().create_task(self._consumir())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _consumir(self):
+        pipeline = [{'$match': {
+            'ns.coll': {'$in': list(COLECOES)},
+            'operationType': {'$in': ['insert', 'update', 'replace', 'delete']},
+        }}]
+        while True:
+            opcoes = {'full_document': 'updateLookup', 'resume_after': self.resume_token}
+            if self.pre_image:
+                opcoes['full_document_before_change'] = 'whenAvailable'
+            try:
+                async with async_mongodb.db.watch(pipeline, **opcoes) as stream:
+                    logger.info("📡 Change stream de Tarefa/Cliente iniciado")
+                    async for mudanca in stream:
+                        self.resume_token = stream.resume_token
+                        self._repassar(mudanca)
+            except asyncio.CancelledError:
+                raise
+            except OperationFailure as e:
+                if e.code in _SEM_REPLICA_SET:
+                    logger.warning("⚠️ Change streams indisponíveis (sem replica set): "
+                                   "apenas eventos publicados no processo serão entregues")
+                    self.disponivel = False
+                    self.recebe_escritas = True
+                    return
+                if self.pre_image and (e.code == _CAMPO_DESCONHECIDO or 'fullDocumentBeforeChange' in str(e)):
+                    logger.warning("⚠️ Servidor sem pre-images (MongoDB < 6.0): change stream segue sem "
+                                   "fullDocumentBeforeChange, exclusões de tarefa não são publicadas")
+                    self.pre_image = False
+                    continue
+                logger.error(f"Erro no change stream: {e}")
+            except PyMongoError as e:
+                logger.error(f"Erro no change stream: {e}")
+            # Retomar do último resume token após falhas transitórias
+            await asyncio.sleep(self.retry_delay)
+
+    def _repassar(self, mudanca):
+        colecao = mudanca['ns']['coll']
+        documento_id = mudanca['documentKey']['_id']
+        documento = mudanca.get('fullDocument') or mudanca.get('fullDocumentBeforeChange')
+
+        owner = None
+        if colecao == 'Tarefa':
+            owner = documento and (documento.get('idUsuario') or documento.get('usuario_id'))
+            if not owner:
+                # Exclusão sem pre-image: o dono é desconhecido (o cliente vê via /changes)
+                logger.debug(f"Evento de tarefa sem dono ignorado: {documento_id}")
+                return
+
+        documento = mudanca.get('fullDocument') if mudanca['operationType'] != 'delete' else None
+        self.publish(colecao, mudanca['operationType'], documento_id, owner, documento, mudanca['_id']['_data'])
+
+
+broker = EventBroker()
+_publisher = None
+
+
+def get_publisher():
+    """Publicador do processo: change stream (padrão) ou memória (REALTIME_BACKEND=memory)"""
+    global _publisher
+    if _publisher is None:
+        if os.getenv('REALTIME_BACKEND', 'changestream').lower() == 'memory':
+            _publisher = InMemoryPublisher(broker)
+        else:
+            _publisher = ChangeStreamPublisher(broker)
+    return _publisher
+
+
+@receiver(escrita)
+def publicar_escrita(sender, operacao, documento_id, owner=None, documento=None, **kwargs):
+    """Escritas dos serviços viram eventos quando o publicador não usa change stream"""
+    publisher = get_publisher()
+    if publisher.recebe_escritas:
+        publisher.publish(sender, operacao, documento_id, owner, documento)
@@ -0,0 +1,49 @@
+import json
+
+from bson import Decimal128, ObjectId
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depende do ambiente
+    orjson = None
+
+
+class MongoJSONEncoder(JSONEncoder):
+    """Encoder do DRF que também entende os tipos do BSON"""
+
+    def default(self, obj):
+        if isinstance(obj, ObjectId):
+            return str(obj)
+        if isinstance(obj, Decimal128):
+            # Como string, para não perder precisão (igual ao DecimalField do DRF)
+            return str(obj.to_decimal())
+        return super().default(obj)
+
+
+_encoder = MongoJSONEncoder()
+
+# "Z" para UTC, como o encoder do DRF, e chaves não-string (ex.: índices do
+# lote em tarefas_bulk) viram string como no json: a saída é a mesma com e sem orjson
+_ORJSON_OPTIONS = orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS if orjson else 0
+
+
+def dumps(data):
+    """JSON compacto em bytes (orjson quando instalado, senão json da stdlib)"""
+    if orjson is not None:
+        return orjson.dumps(data, default=_encoder.default, option=_ORJSON_OPTIONS)
+    return json.dumps(data, cls=MongoJSONEncoder, ensure_ascii=False, separators=(',', ':')).encode()
+
+
+class MongoJSONRenderer(JSONRenderer):
+    """Renderer padrão da API: ObjectId/datetime/Decimal128 sem conversão manual"""
+    encoder_class = MongoJSONEncoder
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        # Saída indentada (?indent / API navegável) fica com o renderer do DRF
+        if self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+        return dumps(data)
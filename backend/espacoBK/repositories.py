@@ -0,0 +1,67 @@
+from bson import ObjectId
+
+from .database import cliente_service, tarefa_service
+from .models import Cliente, Tarefa
+from .pagination import next_page_cursor
+
+
+def com_defaults(model, dados):
+    """Completa os dados validados com os defaults do modelo, como o ORM gravaria"""
+    for field in model._meta.concrete_fields:
+        if not field.primary_key and field.has_default() and field.attname not in dados:
+            dados[field.attname] = field.get_default()
+    return dados
+
+
+class TarefaRepository:
+    """Tarefas das views direto pelo TarefaService (PyMongo, sem o djongo).
+
+    Versão, CampanhaStats e tombstones ficam a cargo do serviço.
+    Todas as operações são restritas às tarefas do usuário.
+    """
+    service = tarefa_service
+
+    def page(self, user_id, limit, after=None, projection=None):
+        """Página por keyset em _id. Retorna (documentos, cursor da próxima página)"""
+        documentos = self.service.find_by_user(user_id, after=after, limit=limit + 1, projection=projection)
+        return documentos, next_page_cursor(documentos, limit)
+
+    def count(self, user_id):
+        return self.service.count(user_id)
+
+    def get(self, pk, user_id):
+        return self.service.find_by_id(pk, user_id) if ObjectId.is_valid(pk) else None
+
+    def create(self, user_id, dados):
+        """Cria a tarefa a partir do validated_data. Retorna o documento (ou None)"""
+        tarefa = com_defaults(Tarefa, {**dados, 'idUsuario': ObjectId(user_id)})
+        return tarefa if self.service.create(tarefa) else None
+
+    def update(self, pk, user_id, dados):
+        """Atualização parcial. Retorna o documento atualizado (None se não existir)"""
+        return self.service.update(pk, dict(dados), user_id) if ObjectId.is_valid(pk) else None
+
+    def delete(self, pk, user_id):
+        return ObjectId.is_valid(pk) and self.service.delete(pk, user_id)
+
+
+class ClienteRepository:
+    """Clientes das views direto pelo ClienteService (PyMongo, sem o djongo)"""
+    service = cliente_service
+
+    def page(self, limit, after=None, projection=None):
+        """Página por keyset em _id. Retorna (documentos, cursor da próxima página)"""
+        documentos = self.service.find_all(limit=limit + 1, after=after, projection=projection)
+        return documentos, next_page_cursor(documentos, limit)
+
+    def count(self):
+        return self.service.count()
+
+    def create(self, dados):
+        """Cria o cliente a partir do validated_data. Retorna o documento (ou None)"""
+        cliente = com_defaults(Cliente, dict(dados))
+        return cliente if self.service.create(cliente) else None
+
+
+tarefa_repository = TarefaRepository()
+cliente_repository = ClienteRepository()
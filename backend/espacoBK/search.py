@@ -0,0 +1,97 @@
+import re
+import unicodedata
+
+from pymongo import UpdateOne
+
+# Campos do cliente que alimentam a chave de busca
+CAMPOS_BUSCA = ('nome', 'razao_social', 'cidade')
+
+# Filtro que não encontra nada (busca sem nenhuma palavra pesquisável, ex.: q=!!!)
+NADA = {'_id': {'$in': []}}
+
+_TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+
+def normalizar(texto):
+    """Minúsculas e sem acentos: 'São João' -> 'sao joao'"""
+    decomposto = unicodedata.normalize('NFKD', str(texto))
+    return ''.join(c for c in decomposto if not unicodedata.combining(c)).lower()
+
+
+def tokenizar(texto):
+    """Quebra o texto normalizado em palavras"""
+    return _TOKEN_RE.findall(normalizar(texto))
+
+
+def campos_busca(documento):
+    """Campos derivados mantidos em cada cliente para a busca indexada"""
+    tokens = set()
+    for campo in CAMPOS_BUSCA:
+        if documento.get(campo):
+            tokens.update(tokenizar(documento[campo]))
+    return {
+        'busca_nome': ' '.join(tokenizar(documento.get('nome') or '')),
+        'busca_tokens': sorted(tokens),
+    }
+
+
+def filtro_busca(query):
+    """Filtro servido pelo índice multikey em busca_tokens.
+
+    Todas as palavras precisam existir no cliente; a última é tratada
+    como prefixo (o usuário ainda está digitando). Regex ancorada e
+    sensível a maiúsculas usa os limites do índice. Sem query o filtro
+    é vazio (todos os clientes); com query sem palavras, NADA.
+    """
+    tokens = tokenizar(query or '')
+    if not tokens:
+        return NADA if (query or '').strip() else {}
+    *completos, prefixo = tokens
+    condicoes = [{'busca_tokens': token} for token in completos]
+    condicoes.append({'busca_tokens': {'$regex': '^' + re.escape(prefixo)}})
+    return condicoes[0] if len(condicoes) == 1 else {'$and': condicoes}
+
+
+def pipeline_busca(query, limit=50, offset=0):
+    """Pipeline de busca com ranking por relevância.
+
+    O $sort vem antes de qualquer corte: com o $skip/$limit logo depois, o
+    servidor ordena só os offset + limit melhores (top-k) entre todos os
+    candidatos, então a página é a mesma que uma ordenação completa daria.
+    """
+    tokens = tokenizar(query or '')
+    frase = ' '.join(tokens)
+    return [
+        {'$match': filtro_busca(query)},
+        {'$addFields': {'_relevancia': {'$add': [
+            # Nome idêntico à busca
+            {'$cond': [{'$eq': ['$busca_nome', frase]}, 100, 0]},
+            # Nome começando pela busca
+            {'$cond': [{'$eq': [{'$indexOfCP': [{'$ifNull': ['$busca_nome', '']}, frase]}, 0]}, 50, 0]},
+            # Palavras encontradas por inteiro
+            {'$multiply': [10, {'$size': {'$setIntersection': [{'$ifNull': ['$busca_tokens', []]}, tokens]}}]},
+        ]}}},
+        {'$sort': {'_relevancia': -1, 'busca_nome': 1, '_id': 1}},
+        {'$skip': offset},
+        {'$limit': limit},
+        {'$project': {'_relevancia': 0, 'busca_nome': 0, 'busca_tokens': 0}},
+    ]
+
+
+def backfill(collection, batch_size=1000, log=None):
+    """Recalcula a chave de busca de todos os clientes em lotes"""
+    projecao = {campo: 1 for campo in CAMPOS_BUSCA}
+    operacoes = []
+    total = 0
+    for documento in collection.find({}, projecao).batch_size(batch_size):
+        operacoes.append(UpdateOne({'_id': documento['_id']}, {'$set': campos_busca(documento)}))
+        if len(operacoes) >= batch_size:
+            collection.bulk_write(operacoes, ordered=False)
+            total += len(operacoes)
+            operacoes = []
+            if log:
+                log(total)
+    if operacoes:
+        collection.bulk_write(operacoes, ordered=False)
+        total += len(operacoes)
+    return total
@@ -1,17 +1,51 @@
+from django.db import models
 from rest_framework import serializers
 from .models import Usuario, Tarefa, Cliente
-from bson import ObjectId
+from .database import usuario_service
+from .repositories import com_defaults
 from datetime import datetime
 
+def eh_campo_data(field):
+    """DateField (sem hora): o BSON só tem datetime, então o PyMongo devolve datetime"""
+    return isinstance(field, models.DateField) and not isinstance(field, models.DateTimeField)
+
+def instancia_de_documento(model, documento):
+    """Cria uma instância do modelo a partir de um documento do PyMongo (sem consulta)"""
+    campos = {field.attname: field for field in model._meta.concrete_fields}
+    valores = {}
+    for chave, valor in documento.items():
+        field = campos.get(chave)
+        if field is None:
+            continue
+        # Como o ORM ao carregar: datetime do BSON vira date nos DateField
+        if isinstance(valor, datetime) and eh_campo_data(field):
+            valor = field.to_python(valor)
+        valores[chave] = valor
+    return model(**valores)
+
+class CamposDinamicosMixin:
+    """Permite restringir os campos de saída com fields=[...]"""
+    
+    def __init__(self, *args, **kwargs):
+        fields = kwargs.pop('fields', None)
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for nome in set(self.fields) - set(fields):
+                self.fields.pop(nome)
+
+class ObjectIdField(serializers.ReadOnlyField):
+    """Repassa o ObjectId sem converter: o renderer (renderers.dumps) serializa"""
+    
+    def __init__(self, **kwargs):
+        kwargs.setdefault('source', '_id')
+        super().__init__(**kwargs)
+
 class UsuarioSerializer(serializers.ModelSerializer):
-    id = serializers.SerializerMethodField()
+    id = ObjectIdField()
     
     class Meta:
         model = Usuario
         fields = ['id', 'nome', 'email', 'tipo', 'status']
-    
-    def get_id(self, obj):
-        return str(obj._id)
 
 class UsuarioLoginSerializer(serializers.Serializer):
     email = serializers.EmailField()
@@ -21,15 +55,12 @@ class UsuarioLoginSerializer(serializers.Serializer):
         email = attrs.get('email')
         senha = attrs.get('senha')
         
-        try:
-            usuario = Usuario.objects.get(email=email)
-            if usuario.check_password(senha):
-                attrs['usuario'] = usuario
-                return attrs
-            else:
-                raise serializers.ValidationError('Email ou senha incorretos.')
-        except Usuario.DoesNotExist:
+        # Verificação do hash (e migração de senhas legadas) fica no serviço
+        documento = usuario_service.authenticate(email, senha)
+        if documento is None:
             raise serializers.ValidationError('Email ou senha incorretos.')
+        attrs['usuario'] = instancia_de_documento(Usuario, documento)
+        return attrs
 
 class UsuarioRegistrationSerializer(serializers.ModelSerializer):
     senha_confirm = serializers.CharField(write_only=True)
@@ -37,7 +68,13 @@ class UsuarioRegistrationSerializer(serializers.ModelSerializer):
     class Meta:
         model = Usuario
         fields = ['nome', 'email', 'senha', 'senha_confirm']
-        extra_kwargs = {'senha': {'write_only': True}}
+        # Unicidade do email conferida pelo serviço (sem o ORM)
+        extra_kwargs = {'senha': {'write_only': True}, 'email': {'validators': []}}
+    
+    def validate_email(self, email):
+        if usuario_service.find_by_email(email) is not None:
+            raise serializers.ValidationError("Já existe um usuário com este email.")
+        return email
     
     def validate(self, attrs):
         if attrs['senha'] != attrs['senha_confirm']:
@@ -45,14 +82,36 @@ class UsuarioRegistrationSerializer(serializers.ModelSerializer):
         return attrs
     
     def create(self, validated_data):
+        """Grava pelo UsuarioService: a senha passa por passwords.hash_password"""
         validated_data.pop('senha_confirm')
-        usuario = Usuario(**validated_data)
-        usuario.set_password(validated_data['senha'])
-        usuario.save()
-        return usuario
+        documento = com_defaults(Usuario, dict(validated_data))
+        if usuario_service.create(documento) is None:
+            raise serializers.ValidationError("Erro ao criar usuário.")
+        return instancia_de_documento(Usuario, documento)
 
-class TarefaSerializer(serializers.ModelSerializer):
-    id = serializers.SerializerMethodField()
+USUARIO_NAO_ENCONTRADO = "Usuário não encontrado"
+
+def carregar_nomes_usuarios(ids):
+    """Resolve os nomes de vários usuários com uma única consulta ($in)"""
+    return usuario_service.find_names(ids)
+
+class TarefaListSerializer(serializers.ListSerializer):
+    """Serializa uma página de tarefas resolvendo os nomes de usuário em lote"""
+    
+    def to_representation(self, data):
+        tarefas = list(data.all() if isinstance(data, models.manager.BaseManager) else data)
+        
+        # Um mapa por requisição evita uma busca de usuário por tarefa
+        nomes = self.context.get('usuario_nomes')
+        if nomes is None:
+            ids = {tarefa.idUsuario for tarefa in tarefas}
+            nomes = carregar_nomes_usuarios(ids)
+        self.child.usuario_nomes = nomes
+        
+        return [self.child.to_representation(tarefa) for tarefa in tarefas]
+
+class TarefaSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
+    id = ObjectIdField()
     idUsuario = serializers.SerializerMethodField()
     is_completed = serializers.ReadOnlyField()
     prioridade_texto = serializers.ReadOnlyField()
@@ -65,19 +124,31 @@ class TarefaSerializer(serializers.ModelSerializer):
             'prioridade', 'prioridade_texto', 'data_inicio', 'data_termino',
             'is_completed', 'usuario_nome', 'idCampanha'
         ]
+        list_serializer_class = TarefaListSerializer
     
-    def get_id(self, obj):
-        return str(obj._id)
+    # Campos do documento necessários para cada campo calculado (projeção)
+    campos_dependentes = {
+        'id': ('_id',),
+        'idUsuario': ('idUsuario',),
+        'usuario_nome': ('idUsuario',),
+        'prioridade_texto': ('prioridade',),
+        'is_completed': ('status',),
+    }
+    
+    usuario_nomes = None
     
     def get_idUsuario(self, obj):
+        # Mantido como método: tarefas sem dono saem como "None" (contrato atual)
         return str(obj.idUsuario)
     
     def get_usuario_nome(self, obj):
-        try:
-            usuario = Usuario.objects.get(_id=obj.idUsuario)
-            return usuario.nome
-        except Usuario.DoesNotExist:
-            return "Usuário não encontrado"
+        # Modo lista: nomes já resolvidos pelo TarefaListSerializer
+        nomes = self.usuario_nomes if self.usuario_nomes is not None else self.context.get('usuario_nomes')
+        if nomes is not None:
+            return nomes.get(str(obj.idUsuario), USUARIO_NAO_ENCONTRADO)
+        
+        usuario = usuario_service.find_by_id(obj.idUsuario) if obj.idUsuario else None
+        return usuario.get('nome') if usuario is not None else USUARIO_NAO_ENCONTRADO
     
     def create(self, validated_data):
         # Converter string de usuário para ObjectId se necessário
@@ -85,8 +156,8 @@ class TarefaSerializer(serializers.ModelSerializer):
             validated_data['idUsuario'] = self.context['usuario']._id
         return super().create(validated_data)
 
-class ClienteSerializer(serializers.ModelSerializer):
-    id = serializers.SerializerMethodField()
+class ClienteSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
+    id = ObjectIdField()
     
     class Meta:
         model = Cliente
@@ -96,5 +167,4 @@ class ClienteSerializer(serializers.ModelSerializer):
             'endereco', 'observacoes', 'vendedor'
         ]
     
-    def get_id(self, obj):
-        return str(obj._id)
\ No newline at end of file
+    campos_dependentes = {'id': ('_id',)}
\ No newline at end of file
@@ -0,0 +1,77 @@
+import base64
+import binascii
+import json
+from datetime import datetime, timedelta, timezone
+
+from bson import ObjectId
+from bson.errors import InvalidId
+
+# Documentos por resposta de sincronização
+CHANGES_LIMIT = 1000
+
+# Janela re-enviada ao final da sincronização: cobre escritas com
+# updated_at carimbado antes da consulta mas gravadas depois dela.
+# O cliente deve deduplicar pelo id.
+OVERLAP = timedelta(seconds=2)
+
+# Tempo que as exclusões ficam registradas (índice TTL em Exclusao)
+TOMBSTONE_TTL = timedelta(days=30)
+
+
+class TokenInvalido(ValueError):
+    """Token de sincronização malformado"""
+
+
+class TokenExpirado(Exception):
+    """O token é mais antigo que as exclusões guardadas: é preciso baixar tudo de novo"""
+
+
+def encode_token(desde, after_id=None):
+    """Token opaco com a posição da sincronização (updated_at, _id)"""
+    dados = {'t': desde.isoformat()}
+    if after_id is not None:
+        dados['id'] = str(after_id)
+    return base64.urlsafe_b64encode(json.dumps(dados).encode()).decode().rstrip('=')
+
+
+def decode_token(token):
+    """Retorna (desde, after_id) codificados no token"""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        dados = json.loads(base64.urlsafe_b64decode(padded))
+        desde = datetime.fromisoformat(dados['t'])
+        # updated_at é gravado sem fuso (UTC): token com fuso vira UTC ingênuo
+        if desde.tzinfo is not None:
+            desde = desde.astimezone(timezone.utc).replace(tzinfo=None)
+        after_id = ObjectId(dados['id']) if 'id' in dados else None
+        expirado = desde < datetime.now() - TOMBSTONE_TTL
+    except (binascii.Error, ValueError, KeyError, TypeError, InvalidId):
+        raise TokenInvalido('Token de sincronização inválido.')
+
+    if expirado:
+        raise TokenExpirado()
+    return desde, after_id
+
+
+def changed_filter(desde, after_id=None):
+    """Filtro keyset em (updated_at, _id) a partir da posição do token"""
+    if after_id is None:
+        return {'updated_at': {'$gt': desde}}
+    return {
+        '$or': [
+            {'updated_at': {'$gt': desde}},
+            {'updated_at': desde, '_id': {'$gt': after_id}}
+        ]
+    }
+
+
+def next_token(documentos, inicio, limit):
+    """Próximo token e se há mais alterações pendentes.
+
+    documentos deve ter até limit + 1 itens; o excedente é descartado.
+    """
+    if len(documentos) > limit:
+        del documentos[limit:]
+        ultimo = documentos[-1]
+        return encode_token(ultimo['updated_at'], ultimo['_id']), True
+    return encode_token(inicio - OVERLAP), False
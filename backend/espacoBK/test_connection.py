@@ -6,10 +6,10 @@ from dotenv import load_dotenv
 load_dotenv()
 
 # Adicionar diretório do projeto
-sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 try:
-    from database import usuario_service, tarefa_service, cliente_service, campanha_service, mongodb
+    from espacoBK.database import usuario_service, tarefa_service, cliente_service, campanha_service, mongodb
     print("✅ Imports realizados com sucesso!")
 except Exception as e:
     print(f"❌ Erro no import: {e}")
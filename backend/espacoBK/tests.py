@@ -1,3 +1,1334 @@
-from django.test import TestCase
+import asyncio
+import csv
+import json
+import os
+import threading
+from datetime import date, datetime, timedelta, timezone
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from bson import Decimal128, ObjectId
+
+from django.core import signing
+from pymongo import DeleteOne, UpdateOne
+from pymongo.errors import OperationFailure
+from django.core.cache import cache as django_cache
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase
+from rest_framework.exceptions import PermissionDenied
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+
+try:
+    import mongomock
+except ImportError:  # Dependência só dos testes: sem ela os testes com Mongo são pulados
+    mongomock = None
+
+from .async_database import (
+    AsyncClienteService, AsyncTarefaService, AsyncUsuarioService, async_cliente_service, async_mongodb,
+    async_tarefa_service, async_usuario_service, async_campanha_stats_service, async_exclusao_service,
+    async_versao_service
+)
+from .authentication import SessaoAuthentication, issue_tokens, usuario_async, verify_access, verify_refresh
+from .cache import LRUCache, _registry as caches_dos_servicos
+from .database import (
+    MongoDB, campanha_stats_service, cliente_service, exclusao_service, iter_find, mongodb, stats_delta,
+    tarefa_service, usuario_service, versao_service
+)
+from .indexes import INDEXES, find_collscans, plan_stages
+from . import metrics, profiler
+from .pagination import decode_cursor, next_page_cursor
+from .passwords import hash_password, is_hashed, verify_password
+from .search import NADA, campos_busca, filtro_busca, pipeline_busca
+from .realtime import RESYNC, ChangeStreamPublisher, EventBroker, InMemoryPublisher
+from . import realtime
+from .sync import TOMBSTONE_TTL, TokenExpirado, TokenInvalido, decode_token, encode_token
+from . import renderers
+try:
+    from .models import Usuario, Tarefa, Cliente
+except ImportError:  # Checkout sem os modelos do djongo: testes de serializers e views são pulados
+    Usuario = Tarefa = Cliente = None
+else:
+    from .projections import cliente_projecao, tarefa_projecao
+    from .serializers import ClienteSerializer, TarefaSerializer, instancia_de_documento
+
+com_modelos = skipUnless(Tarefa, 'modelos Usuario/Tarefa/Cliente indisponíveis')
+
+
+class PlanStagesTests(SimpleTestCase):
+    """Leitura dos planos do explain() usada pelo comando ensure_indexes"""
+
+    def test_plano_classico(self):
+        plano = {'stage': 'FETCH', 'inputStage': {'stage': 'IXSCAN', 'indexName': 'email_unique'}}
+        self.assertEqual(plan_stages(plano), ['FETCH', 'IXSCAN'])
+
+    def test_plano_sbe_com_or(self):
+        plano = {'queryPlan': {'stage': 'SUBPLAN', 'inputStage': {'stage': 'OR', 'inputStages': [
+            {'stage': 'IXSCAN'}, {'stage': 'COLLSCAN'},
+        ]}}}
+        self.assertIn('COLLSCAN', plan_stages(plano))
+
+    def test_pagina_com_sort_em_memoria(self):
+        cursor = mock.MagicMock()
+        cursor.sort.return_value = cursor.limit.return_value = cursor
+        cursor.explain.return_value = {'queryPlanner': {'winningPlan': {'stage': 'SORT', 'inputStage': {
+            'stage': 'FETCH', 'inputStage': {'stage': 'IXSCAN', 'indexName': 'idUsuario_status_data_termino'}
+        }}}}
+        db = mock.MagicMock()
+        db.__getitem__.return_value.find.return_value = cursor
+
+        descricoes = [descricao for _, descricao, _ in find_collscans(db)]
+        self.assertIn('TarefaService.find_by_user (página seguinte)', descricoes)
+        cursor.sort.assert_any_call([('_id', 1)])
+        cursor.limit.assert_any_call(101)
+        filtro = next(chamada.args[0] for chamada in db.__getitem__.return_value.find.call_args_list
+                      if '$and' in chamada.args[0])
+        self.assertIn('$or', filtro['$and'][0])
+
+    def test_indice_da_pagina(self):
+        chaves = [dict(indice.document['key']) for indice in INDEXES['Tarefa']]
+        self.assertIn({'idUsuario': 1, '_id': 1}, chaves)
+        self.assertIn({'usuario_id': 1, '_id': 1}, chaves)
+
+
+class LRUCacheTests(SimpleTestCase):
+    """Cache de find_by_id dos serviços"""
+
+    def test_evicao_do_menos_usado(self):
+        cache = LRUCache(maxsize=2, ttl=60)
+        cache.set('a', {'nome': 'A'})
+        cache.set('b', {'nome': 'B'})
+        cache.get('a')
+        cache.set('c', {'nome': 'C'})
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a'), {'nome': 'A'})
+        self.assertEqual(cache.stats()['evictions'], 1)
+
+    def test_expiracao_por_ttl(self):
+        cache = LRUCache(maxsize=10, ttl=0)
+        cache.set('a', {'nome': 'A'})
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(cache.stats()['expirations'], 1)
+
+    def test_documento_devolvido_nao_altera_o_cache(self):
+        cache = LRUCache()
+        documento = {'nome': 'A'}
+        cache.set('a', documento)
+        documento['nome'] = 'alterado'
+        cache.get('a')['nome'] = 'alterado'
+        self.assertEqual(cache.get('a'), {'nome': 'A'})
+        self.assertEqual(cache.stats()['hits'], 2)
+
+    def test_subdocumentos_copiados(self):
+        cache = LRUCache()
+        documento = {'nome': 'A', 'endereco': {'cidade': 'Recife'}, 'tags': ['vip']}
+        cache.set('a', documento)
+        documento['endereco']['cidade'] = 'alterado'
+        lido = cache.get('a')
+        lido['tags'].append('alterado')
+        self.assertEqual(cache.get('a'), {'nome': 'A', 'endereco': {'cidade': 'Recife'}, 'tags': ['vip']})
+
+
+class EventBrokerTests(SimpleTestCase):
+    """Fan-out dos eventos em tempo real sem replica set (publicador em memória)"""
+
+    def setUp(self):
+        self.broker = EventBroker(buffer_size=10, queue_size=5)
+        self.publisher = InMemoryPublisher(self.broker)
+
+    def test_tarefa_entregue_somente_ao_dono(self):
+        dono = self.broker.subscribe('u1')
+        outro = self.broker.subscribe('u2')
+        self.publisher.publish('Tarefa', 'insert', 't1', owner='u1')
+        self.publisher.publish('Cliente', 'update', 'c1')
+        self.assertEqual([dono.get_nowait()['id'], dono.get_nowait()['id']], ['t1', 'c1'])
+        self.assertEqual(outro.get_nowait()['id'], 'c1')
+        self.assertTrue(outro.empty())
+
+    def test_retomada_pelo_last_event_id(self):
+        primeiro = self.publisher.publish('Tarefa', 'insert', 't1', owner='u1')
+        self.publisher.publish('Tarefa', 'insert', 't2', owner='u2')
+        self.publisher.publish('Tarefa', 'update', 't1', owner='u1')
+        fila = self.broker.subscribe('u1', last_event_id=primeiro['evento_id'])
+        evento = fila.get_nowait()
+        self.assertEqual((evento['id'], evento['operacao']), ('t1', 'update'))
+        self.assertTrue(fila.empty())
+
+    def test_last_event_id_de_outro_processo(self):
+        self.publisher.publish('Tarefa', 'insert', 't1', owner='u1')
+        fila = self.broker.subscribe('u1', last_event_id='outro-processo-7')
+        self.assertEqual(fila.get_nowait(), RESYNC)
+        self.assertTrue(fila.empty())
+
+    @com_modelos
+    def test_payload_projetado(self):
+        cliente = {'_id': ObjectId(), 'nome': 'Rita', 'busca_nome': 'rita', 'data_nascimento': datetime(1975, 3, 9)}
+        evento = self.publisher.publish('Cliente', 'update', cliente['_id'], documento=cliente)
+        self.assertNotIn('busca_nome', evento['dados'])
+        self.assertEqual((evento['dados']['nome'], evento['dados']['data_nascimento']), ('Rita', '1975-03-09'))
+
+    def test_conexao_lenta_encerrada(self):
+        fila = self.broker.subscribe('u1')
+        for i in range(6):
+            self.publisher.publish('Cliente', 'insert', f'c{i}')
+        self.assertIsNone(fila.get_nowait())
+
+
+class VerifyPasswordTests(SimpleTestCase):
+    """Hash de senhas e migração das senhas legadas em texto puro"""
+
+    def test_hash_confere(self):
+        guardada = hash_password('segredo123')
+        self.assertTrue(is_hashed(guardada))
+        self.assertEqual(verify_password('segredo123', guardada), (True, False))
+        self.assertEqual(verify_password('outra', guardada), (False, False))
+
+    def test_texto_puro_pede_atualizacao(self):
+        self.assertFalse(is_hashed('segredo123'))
+        self.assertEqual(verify_password('segredo123', 'segredo123'), (True, True))
+        self.assertEqual(verify_password('outra', 'segredo123'), (False, False))
+
+    def test_hash_no_pool_tambem_nas_views_sincronas(self):
+        with mock.patch('espacoBK.passwords.make_password', side_effect=lambda _: threading.current_thread().name):
+            self.assertTrue(hash_password('segredo123').startswith('senha'))
+
+
+class SignedTokenTests(SimpleTestCase):
+    """Tokens de acesso assinados, verificados sem consulta ao banco"""
+
+    def test_access_token_valido(self):
+        tokens = issue_tokens('507f1f77bcf86cd799439011', 'Maria')
+        self.assertEqual(verify_access(tokens['access']), {'uid': '507f1f77bcf86cd799439011', 'nome': 'Maria'})
+        self.assertEqual(verify_refresh(tokens['refresh'])['uid'], '507f1f77bcf86cd799439011')
+
+    def test_refresh_nao_vale_como_access(self):
+        tokens = issue_tokens('507f1f77bcf86cd799439011')
+        with self.assertRaises(signing.BadSignature):
+            verify_access(tokens['refresh'])
+        with self.assertRaises(signing.BadSignature):
+            verify_access(tokens['access'] + 'x')
+
+    def test_sessao_exige_csrf(self):
+        factory = APIRequestFactory(enforce_csrf_checks=True)
+        leitura, escrita = factory.get('/api/tarefas/'), factory.post('/api/tarefas/')
+        for requisicao in (leitura, escrita):
+            requisicao.session = {'usuario_id': '507f1f77bcf86cd799439011', 'usuario_nome': 'Maria'}
+
+        usuario, _ = SessaoAuthentication().authenticate(Request(leitura))
+        self.assertEqual(usuario.usuario_id, '507f1f77bcf86cd799439011')
+        with self.assertRaises(PermissionDenied):
+            SessaoAuthentication().authenticate(Request(escrita))
+
+
+class StatsDeltaTests(SimpleTestCase):
+    """Variações de CampanhaStats calculadas a partir dos estados da tarefa"""
+
+    def test_conclusao_e_troca_de_campanha(self):
+        antes = {'idCampanha': 'c1', 'status': '2'}
+        depois = {'idCampanha': 'c2', 'status': '1'}
+        self.assertEqual(stats_delta(antes, depois), {
+            'c1': {'total': -1, 'concluidas': -1},
+            'c2': {'total': 1, 'concluidas': 0},
+        })
+
+    def test_tarefa_sem_campanha_ignorada(self):
+        self.assertEqual(stats_delta(depois={'status': '2'}), {})
+        deltas = stats_delta(depois={'idCampanha': 'c1', 'status': '1'})
+        stats_delta(antes={'idCampanha': 'c1', 'status': '1'}, deltas=deltas)
+        self.assertEqual(deltas, {'c1': {'total': 0, 'concluidas': 0}})
+
+
+class MongoJSONRendererTests(SimpleTestCase):
+    """Tipos do BSON serializados sem conversão manual, com ou sem orjson"""
+
+    dados = {
+        'id': ObjectId('507f1f77bcf86cd799439011'),
+        'valor': Decimal128('10.50'),
+        'criado': datetime(2024, 1, 2, 3, 4, 5, tzinfo=timezone.utc),
+        'data': date(2024, 1, 2),
+        'nome': 'Conceição',
+    }
+    esperado = ('{"id":"507f1f77bcf86cd799439011","valor":"10.50","criado":"2024-01-02T03:04:05Z",'
+                '"data":"2024-01-02","nome":"Conceição"}').encode()
+
+    def test_mesma_saida_nos_dois_backends(self):
+        self.assertEqual(renderers.dumps(self.dados), self.esperado)
+        with mock.patch.object(renderers, 'orjson', None):
+            self.assertEqual(renderers.dumps(self.dados), self.esperado)
+
+    def test_chaves_nao_string(self):
+        # Como os erros por índice do tarefas_bulk
+        erros = {'erros': {0: {'op': ['Operação inválida.']}, 2: {'id': ['ID inválido.']}}}
+        esperado = '{"erros":{"0":{"op":["Operação inválida."]},"2":{"id":["ID inválido."]}}}'.encode()
+        self.assertEqual(renderers.dumps(erros), esperado)
+        with mock.patch.object(renderers, 'orjson', None):
+            self.assertEqual(renderers.dumps(erros), esperado)
+
+
+@com_modelos
+class ProjecaoTests(SimpleTestCase):
+    """A projeção gera os mesmos bytes que os serializers"""
+
+    usuario = ObjectId()
+    tarefas = [
+        {'_id': ObjectId(), 'idUsuario': usuario, 'titulo': 'Orçamento', 'descricao': None, 'status': '2',
+         'prioridade': '3', 'data_inicio': date(2025, 1, 1), 'data_termino': date(2025, 1, 31),
+         'idCampanha': ObjectId(), 'created_at': datetime(2025, 1, 1)},
+        # Sem dono e com campos ausentes: valem os defaults do modelo
+        {'_id': ObjectId(), 'titulo': 'Sem dono'},
+        # Como o PyMongo devolve: o BSON não tem tipo data, DateField vem como datetime
+        {'_id': ObjectId(), 'idUsuario': usuario, 'titulo': 'Do banco', 'status': '1',
+         'data_inicio': datetime(2025, 2, 1), 'data_termino': datetime(2025, 2, 28)},
+    ]
+    clientes = [
+        {'_id': ObjectId(), 'nome': 'João', 'cidade': 'São Paulo', 'data_nascimento': date(1980, 5, 17)},
+        {'_id': ObjectId(), 'nome': 'Ana', 'email': 'ana@espacobk.com', 'observacoes': 'Ligar à tarde'},
+        {'_id': ObjectId(), 'nome': 'Rita', 'data_nascimento': datetime(1975, 3, 9)},
+    ]
+
+    def serializado(self, serializer_class, model, documentos, **kwargs):
+        instancias = [instancia_de_documento(model, documento) for documento in documentos]
+        return renderers.dumps(serializer_class(instancias, many=True, **kwargs).data)
+
+    def test_tarefas(self):
+        context = {'usuario_nomes': {str(self.usuario): 'Maria'}}
+        for campos in (None, ['id', 'titulo', 'is_completed', 'usuario_nome']):
+            with self.subTest(campos=campos):
+                self.assertEqual(
+                    renderers.dumps(tarefa_projecao.render(self.tarefas, campos, context)),
+                    self.serializado(TarefaSerializer, Tarefa, self.tarefas, fields=campos, context=context),
+                )
+
+    def test_clientes(self):
+        self.assertEqual(
+            renderers.dumps(cliente_projecao.render(self.clientes)),
+            self.serializado(ClienteSerializer, Cliente, self.clientes),
+        )
+
+    def test_datas_vindas_do_bson(self):
+        tarefa = tarefa_projecao.render_one(self.tarefas[2], ['data_inicio', 'data_termino'], {'usuario_nomes': {}})
+        self.assertEqual(tarefa, {'data_inicio': '2025-02-01', 'data_termino': '2025-02-28'})
+        self.assertEqual(cliente_projecao.render_one(self.clientes[2])['data_nascimento'], '1975-03-09')
+
+    def test_origem_nao_hashable(self):
+        # Documento gravado fora da API: status/prioridade como lista não derrubam a listagem
+        tarefas = [{'_id': ObjectId(), 'titulo': 'Legado', 'status': ['2'], 'prioridade': ['3']}]
+        campos = ['id', 'is_completed', 'prioridade_texto']
+        self.assertEqual(
+            renderers.dumps(tarefa_projecao.render(tarefas, campos, {'usuario_nomes': {}})),
+            self.serializado(TarefaSerializer, Tarefa, tarefas, fields=campos, context={'usuario_nomes': {}}),
+        )
+
+
+class NextPageCursorTests(SimpleTestCase):
+    """Página por keyset: o documento extra indica a próxima página"""
+
+    def test_com_proxima_pagina(self):
+        documentos = [{'_id': ObjectId()} for _ in range(3)]
+        ultimo = documentos[1]['_id']
+        cursor = next_page_cursor(documentos, 2)
+        self.assertEqual(len(documentos), 2)
+        self.assertEqual(decode_cursor(cursor), ultimo)
+
+    def test_ultima_pagina(self):
+        documentos = [{'_id': ObjectId()} for _ in range(2)]
+        self.assertIsNone(next_page_cursor(documentos, 2))
+        self.assertEqual(len(documentos), 2)
+
+
+class IterFindTests(SimpleTestCase):
+    """iter_find aplica as opções do cursor e o fecha mesmo sem consumir tudo"""
+
+    def test_opcoes_e_fechamento(self):
+        cursor = mock.MagicMock()
+        for metodo in ('batch_size', 'sort', 'limit', 'max_time_ms'):
+            getattr(cursor, metodo).return_value = cursor
+        cursor.__iter__.return_value = iter([{'_id': 1}, {'_id': 2}])
+        collection = mock.Mock()
+        collection.find.return_value = cursor
+
+        documentos = iter_find(collection, {'status': '1'}, sort=[('_id', 1)], batch_size=10, max_time_ms=500)
+        collection.find.assert_not_called()
+        self.assertEqual(next(documentos), {'_id': 1})
+        documentos.close()
+
+        collection.find.assert_called_once_with({'status': '1'}, None)
+        cursor.batch_size.assert_called_once_with(10)
+        cursor.max_time_ms.assert_called_once_with(500)
+        cursor.limit.assert_not_called()
+        cursor.__exit__.assert_called_once()
+
+
+def _bulk_write_por_operacao(colecao, operacoes, ordered=True, **kwargs):
+    """bulk_write aplicado operação a operação: o do mongomock 4.3 não aceita o UpdateOne do PyMongo 4"""
+    for operacao in operacoes:
+        if isinstance(operacao, UpdateOne):
+            colecao.update_one(operacao._filter, operacao._doc, upsert=operacao._upsert)
+        elif isinstance(operacao, DeleteOne):
+            colecao.delete_one(operacao._filter)
+        else:
+            colecao.insert_one(operacao._doc)
+
+
+@skipUnless(mongomock, 'mongomock não instalado')
+class MongoTestCase(SimpleTestCase):
+    """Serviços apontados para um banco em memória (mongomock), com caches limpos"""
+
+    def setUp(self):
+        self.db = mongomock.MongoClient()['espaco_bk_testes']
+        for atributo, valor in (('_db', self.db), ('_pid', os.getpid())):
+            patcher = mock.patch.object(mongodb, atributo, valor)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        patcher = mock.patch.object(mongomock.collection.Collection, 'bulk_write', _bulk_write_por_operacao)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        for cache in caches_dos_servicos.values():
+            cache.clear()
+        django_cache.clear()
+
+        self.usuario = ObjectId()
+        self.api = APIClient()
+        self.api.credentials(HTTP_AUTHORIZATION=f"Bearer {issue_tokens(self.usuario, 'Maria')['access']}")
+
+
+@com_modelos
+class TarefaSerializerListaTests(MongoTestCase):
+    """Garante que a listagem de tarefas não faz uma consulta por tarefa"""
+
+    def setUp(self):
+        super().setUp()
+        self.usuarios = [
+            self.db['Usuario'].insert_one({'nome': f'Usuário {i}', 'email': f'usuario{i}@espacobk.com'}).inserted_id
+            for i in range(3)
+        ]
+
+    def criar_tarefas(self, quantidade):
+        return [
+            instancia_de_documento(Tarefa, {
+                '_id': ObjectId(), 'idUsuario': self.usuarios[i % len(self.usuarios)], 'titulo': f'Tarefa {i}',
+                'status': '1', 'prioridade': '1',
+                'data_inicio': datetime(2025, 1, 1), 'data_termino': datetime(2025, 1, 31),
+            })
+            for i in range(quantidade)
+        ]
+
+    def contar_consultas(self, serializar):
+        """Comandos find enviados à collection Usuario (o find_one do mongomock passa pelo find)"""
+        consultas = []
+        find = mongomock.collection.Collection.find
+
+        def find_contado(colecao, *args, **kwargs):
+            if colecao.name == 'Usuario':
+                consultas.append(args[0] if args else kwargs.get('filter'))
+            return find(colecao, *args, **kwargs)
+
+        with mock.patch.object(mongomock.collection.Collection, 'find', find_contado):
+            data = serializar()
+        return len(consultas), data
+
+    def test_consultas_constantes_com_mais_tarefas(self):
+        for tamanho in (5, 50):
+            tarefas = self.criar_tarefas(tamanho)
+            consultas, data = self.contar_consultas(lambda: TarefaSerializer(tarefas, many=True).data)
+            # Uma consulta ($in) para os nomes, qualquer que seja o tamanho da página
+            self.assertEqual((consultas, len(data)), (1, tamanho))
+
+        # Sem o ListSerializer: uma consulta por usuário distinto (find_by_id usa o cache)
+        tarefas = self.criar_tarefas(5)
+        consultas, _ = self.contar_consultas(lambda: [TarefaSerializer(tarefa).data for tarefa in tarefas])
+        self.assertEqual(consultas, len(self.usuarios))
+
+    def test_listagem_uma_consulta_por_pagina(self):
+        documentos = [
+            {'_id': ObjectId(), 'idUsuario': self.usuarios[i % len(self.usuarios)], 'titulo': f'Tarefa {i}'}
+            for i in range(50)
+        ]
+        consultas, data = self.contar_consultas(lambda: tarefa_projecao.render(documentos))
+        self.assertEqual(consultas, 1)
+        self.assertEqual(data[1]['usuario_nome'], 'Usuário 1')
+
+    def test_nomes_resolvidos_por_tarefa(self):
+        data = TarefaSerializer(self.criar_tarefas(3), many=True).data
+        nomes = {item['titulo']: item['usuario_nome'] for item in data}
+        self.assertEqual(nomes['Tarefa 0'], 'Usuário 0')
+        self.assertEqual(nomes['Tarefa 2'], 'Usuário 2')
+
+    def test_usuario_inexistente(self):
+        tarefa, = self.criar_tarefas(1)
+        self.db['Usuario'].delete_one({'_id': self.usuarios[0]})
+        self.assertEqual(TarefaSerializer([tarefa], many=True).data[0]['usuario_nome'], 'Usuário não encontrado')
+        self.assertEqual(TarefaSerializer(tarefa).data['usuario_nome'], 'Usuário não encontrado')
+
+
+@com_modelos
+class RepositorioViewsTests(MongoTestCase):
+    """Views servidas pelos repositórios com documentos como o PyMongo devolve"""
+
+    def setUp(self):
+        super().setUp()
+        self.tarefa_id = self.db['Tarefa'].insert_one({
+            'idUsuario': self.usuario, 'titulo': 'Orçamento', 'status': '1', 'prioridade': 'alta',
+            'data_inicio': datetime(2025, 2, 1), 'data_termino': datetime(2025, 2, 28),
+        }).inserted_id
+        self.db['Cliente'].insert_one({'nome': 'Rita', 'data_nascimento': datetime(1975, 3, 9)})
+
+    def test_listagem_e_detalhe_de_tarefas(self):
+        resposta = self.api.get('/api/tarefas/')
+        self.assertEqual(resposta.status_code, 200)
+        tarefa = resposta.json()['tarefas'][0]
+        self.assertEqual((tarefa['data_inicio'], tarefa['data_termino']), ('2025-02-01', '2025-02-28'))
+        self.assertEqual(tarefa['usuario_nome'], 'Maria')
+
+        resposta = self.api.get(f'/api/tarefas/{self.tarefa_id}/')
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(resposta.json()['tarefa']['data_inicio'], '2025-02-01')
+
+    def test_listagem_de_clientes(self):
+        resposta = self.api.get('/api/clientes/')
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(resposta.json()['clientes'][0]['data_nascimento'], '1975-03-09')
+
+
+@com_modelos
+class ToggleStatusTests(MongoTestCase):
+    """Conclusão atômica: o documento final dá a variação de CampanhaStats"""
+
+    def setUp(self):
+        super().setUp()
+        self.tarefa_id = self.db['Tarefa'].insert_one({
+            'idUsuario': self.usuario, 'titulo': 'Orçamento', 'status': '1', 'idCampanha': 'c1',
+            'data_inicio': datetime(2025, 2, 1), 'data_termino': datetime(2025, 2, 28),
+        }).inserted_id
+        self.url = f'/api/tarefas/{self.tarefa_id}/concluir/'
+        for servico, metodo in ((versao_service, 'bump'), (campanha_stats_service, 'apply')):
+            patcher = mock.patch.object(servico, metodo)
+            setattr(self, metodo, patcher.start())
+            self.addCleanup(patcher.stop)
+
+    def test_alternar(self):
+        resposta = self.api.patch(self.url)
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(resposta.json()['tarefa']['status'], '2')
+        self.assertEqual(resposta.json()['tarefa']['data_inicio'], '2025-02-01')
+        self.apply.assert_called_once_with({'c1': {'total': 0, 'concluidas': 1}})
+
+        self.assertEqual(self.api.patch(self.url).json()['tarefa']['status'], '1')
+        self.apply.assert_called_with({'c1': {'total': 0, 'concluidas': -1}})
+        self.assertEqual(self.bump.call_count, 2)
+
+    def test_status_explicito_idempotente(self):
+        for _ in range(2):
+            resposta = self.api.patch(self.url, {'status': '2'}, format='json')
+            self.assertEqual(resposta.json()['tarefa']['status'], '2')
+        # O retry não casa o filtro: nada gravado, versão e stats intactas
+        self.apply.assert_called_once_with({'c1': {'total': 0, 'concluidas': 1}})
+        self.bump.assert_called_once()
+
+    def test_tarefa_de_outro_usuario(self):
+        outro = APIClient()
+        outro.credentials(HTTP_AUTHORIZATION=f"Bearer {issue_tokens(ObjectId())['access']}")
+        self.assertEqual(outro.patch(self.url).status_code, 404)
+        self.assertEqual(outro.patch(self.url, {'status': '2'}, format='json').status_code, 404)
+
+
+class AsyncMongoDBTests(SimpleTestCase):
+    """Um cliente Motor por event loop, sem fechar o dos outros loops"""
+
+    @mock.patch.dict(os.environ, {'DB_HOST': 'mongodb://localhost:27017'})
+    @mock.patch('espacoBK.async_database.AsyncIOMotorClient', side_effect=lambda *a, **k: mock.MagicMock())
+    def test_cliente_por_loop(self, cliente):
+        self.addCleanup(async_mongodb._clients.clear)
+
+        async def banco():
+            return async_mongodb.db, async_mongodb.db
+
+        loops = [asyncio.new_event_loop() for _ in range(2)]
+        for loop in loops:
+            self.addCleanup(loop.close)
+        primeiro, mesmo = loops[0].run_until_complete(banco())
+        segundo, _ = loops[1].run_until_complete(banco())
+
+        self.assertIs(primeiro, mesmo)
+        self.assertIsNot(primeiro, segundo)
+        self.assertEqual(cliente.call_count, 2)
+        for conexao, _ in async_mongodb._clients.values():
+            conexao.close.assert_not_called()
+
+
+class AsyncEscritasTests(SimpleTestCase):
+    """As escritas assíncronas seguem as regras dos serviços síncronos"""
+
+    def setUp(self):
+        for servico, metodo in ((async_versao_service, 'bump'), (async_campanha_stats_service, 'apply')):
+            patcher = mock.patch.object(servico, metodo, new_callable=mock.AsyncMock)
+            setattr(self, metodo, patcher.start())
+            self.addCleanup(patcher.stop)
+
+    def colecao(self, service_class, **metodos):
+        colecao = mock.MagicMock(**{nome: mock.AsyncMock(return_value=valor) for nome, valor in metodos.items()})
+        patcher = mock.patch.object(service_class, 'collection', new_callable=mock.PropertyMock, return_value=colecao)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return colecao
+
+    def test_tarefa_com_datas_convertidas(self):
+        colecao = self.colecao(AsyncTarefaService, insert_one=mock.Mock(inserted_id=ObjectId()))
+        usuario = ObjectId()
+        asyncio.run(async_tarefa_service.create(
+            {'idUsuario': usuario, 'titulo': 'Orçamento', 'data_inicio': date(2025, 2, 1)}
+        ))
+        self.assertEqual(colecao.insert_one.call_args.args[0]['data_inicio'], datetime(2025, 2, 1))
+        # ETag das listagens do dono muda junto
+        self.bump.assert_awaited_once_with(f'Tarefa:{usuario}')
+
+    def test_tarefa_removida_deixa_tombstone(self):
+        tarefa = {'_id': ObjectId(), 'idUsuario': ObjectId(), 'idCampanha': 'c1', 'status': '2'}
+        self.colecao(AsyncTarefaService, find_one_and_delete=tarefa)
+        with mock.patch.object(async_exclusao_service, 'record', new_callable=mock.AsyncMock) as record:
+            self.assertTrue(asyncio.run(async_tarefa_service.delete(tarefa['_id'], str(tarefa['idUsuario']))))
+        record.assert_awaited_once_with('Tarefa', [tarefa['_id']], tarefa['idUsuario'])
+        self.apply.assert_awaited_once_with({'c1': {'total': -1, 'concluidas': -1}})
+
+    def test_tarefa_alterada_atualiza_campanha(self):
+        antes = {'_id': ObjectId(), 'idUsuario': ObjectId(), 'idCampanha': 'c1', 'status': '1'}
+        self.colecao(AsyncTarefaService, find_one_and_update=antes)
+        tarefa = asyncio.run(async_tarefa_service.update(antes['_id'], {'status': '2'}))
+        self.assertEqual(tarefa['status'], '2')
+        self.apply.assert_awaited_once_with({'c1': {'total': 0, 'concluidas': 1}})
+
+    def test_cliente_alterado_sai_do_cache(self):
+        cliente_id = ObjectId()
+        self.colecao(AsyncClienteService, find_one_and_update={'_id': cliente_id, 'nome': 'Rita'})
+        cliente_service.cache.set(str(cliente_id), {'_id': cliente_id, 'nome': 'Rita'})
+        asyncio.run(async_cliente_service.update(cliente_id, {'telefone': '(11) 3333-4444'}))
+        self.assertIsNone(cliente_service.cache.get(str(cliente_id)))
+        self.bump.assert_awaited_once_with('Cliente')
+
+    def test_usuario_sem_senha_e_pelo_cache(self):
+        usuario_id = ObjectId()
+        colecao = self.colecao(AsyncUsuarioService, find_one={'_id': usuario_id, 'nome': 'Ana'})
+        self.addCleanup(usuario_service.cache.delete, str(usuario_id))
+
+        for _ in range(2):
+            self.assertEqual(asyncio.run(async_usuario_service.find_by_id(usuario_id))['nome'], 'Ana')
+        colecao.find_one.assert_awaited_once_with({'_id': usuario_id}, {'senha': 0})
+        # Mesmo cache e mesma invalidação do UsuarioService
+        self.assertEqual(usuario_service.cache.get(str(usuario_id))['nome'], 'Ana')
+        colecao.update_one = mock.AsyncMock(return_value=mock.Mock(modified_count=1))
+        asyncio.run(async_usuario_service.update(usuario_id, {'nome': 'Ana Lima'}))
+        self.assertIsNone(usuario_service.cache.get(str(usuario_id)))
+
+
+class SyncTokenTests(SimpleTestCase):
+    """Tokens de sincronização incremental (?since=)"""
+
+    def test_ida_e_volta(self):
+        desde, after_id = datetime(2030, 1, 1, 12, 30), ObjectId()
+        self.assertEqual(decode_token(encode_token(desde, after_id)), (desde, after_id))
+
+    def test_token_com_fuso_vira_utc(self):
+        agora = datetime.now(timezone.utc).replace(microsecond=0)
+        token = encode_token(agora.astimezone(timezone(timedelta(hours=-3))))
+        self.assertEqual(decode_token(token), (agora.replace(tzinfo=None), None))
+
+    def test_token_expirado(self):
+        with self.assertRaises(TokenExpirado):
+            decode_token(encode_token(datetime.now() - timedelta(days=31)))
+
+    def test_token_malformado(self):
+        for token in ('###', encode_token(datetime.now())[:-3], 'eyJ0IjogNX0'):  # o último é {"t": 5}
+            with self.subTest(token=token), self.assertRaises(TokenInvalido):
+                decode_token(token)
+
+
+class BulkApplyTests(MongoTestCase):
+    """Lote de escritas: cada tarefa conta uma vez em CampanhaStats e nos tombstones"""
+
+    def setUp(self):
+        super().setUp()
+        self.tarefa_id = self.db['Tarefa'].insert_one(
+            {'idUsuario': self.usuario, 'titulo': 'Orçamento', 'status': '2', 'idCampanha': 'c1'}
+        ).inserted_id
+        for servico, metodo in ((versao_service, 'bump'), (campanha_stats_service, 'apply'),
+                                (exclusao_service, 'record')):
+            patcher = mock.patch.object(servico, metodo)
+            setattr(self, metodo, patcher.start())
+            self.addCleanup(patcher.stop)
+
+    def test_tarefa_repetida_no_lote(self):
+        resultados = tarefa_service.bulk_apply(str(self.usuario), [
+            {'op': 'delete', 'id': self.tarefa_id},
+            {'op': 'delete', 'id': self.tarefa_id},
+        ])
+        self.assertEqual([r['success'] for r in resultados], [True, False])
+        self.assertEqual(resultados[1]['error'], 'Tarefa repetida no lote')
+        self.record.assert_called_once_with('Tarefa', [self.tarefa_id], str(self.usuario))
+        self.apply.assert_called_once_with({'c1': {'total': -1, 'concluidas': -1}})
+
+
+@com_modelos
+class CampanhaStatsRebuildTests(MongoTestCase):
+    """Contadores de CampanhaStats: lotes não desviam e rebuild() corrige o desvio"""
+
+    def setUp(self):
+        super().setUp()
+        self.tarefas = [
+            tarefa_service.create({'idUsuario': self.usuario, 'titulo': f'Tarefa {i}',
+                                   'status': '2' if i else '1', 'idCampanha': 'c1'})
+            for i in range(3)
+        ]
+
+    def stats(self):
+        return {s['_id']: (s['total'], s['concluidas']) for s in self.db['CampanhaStats'].find()}
+
+    def test_lote_conta_so_o_que_foi_gravado(self):
+        # Removida por outra requisição antes do lote: não conta de novo
+        self.assertTrue(tarefa_service.delete(self.tarefas[2]))
+        resultados = tarefa_service.bulk_apply(str(self.usuario), [
+            {'op': 'delete', 'id': ObjectId(self.tarefas[2])},
+            {'op': 'update', 'id': ObjectId(self.tarefas[0]), 'data': {'status': '2'}},
+            {'op': 'update', 'id': ObjectId(), 'data': {'status': '2'}},
+            {'op': 'create', 'data': {'titulo': 'Nova', 'status': '1', 'idCampanha': 'c2'}},
+        ])
+        self.assertEqual([r['success'] for r in resultados], [False, True, False, True])
+        self.assertEqual(self.stats(), {'c1': (2, 2), 'c2': (1, 0)})
+        self.assertEqual(campanha_stats_service.rebuild(dry_run=True), [])
+
+    def test_rebuild_corrige_contadores_desviados(self):
+        self.db['CampanhaStats'].update_one({'_id': 'c1'}, {'$set': {'total': 7, 'concluidas': 0}})
+        self.db['CampanhaStats'].insert_one({'_id': 'c9', 'total': 1, 'concluidas': 1})
+
+        divergencias = campanha_stats_service.rebuild()
+        self.assertEqual([campanha for campanha, _, _ in divergencias], ['c1', 'c9'])
+        self.assertEqual(self.stats(), {'c1': (3, 2)})
+        self.assertEqual(campanha_stats_service.rebuild(), [])
+
+
+@com_modelos
+class TarefasBulkViewTests(MongoTestCase):
+    """Endpoint de lote: validação do lote inteiro e resultado por operação"""
+
+    dados = {'titulo': 'Nova', 'status': '1', 'prioridade': 'alta',
+             'data_inicio': '2025-02-01', 'data_termino': '2025-02-28'}
+
+    def setUp(self):
+        super().setUp()
+        self.tarefa_id = str(self.db['Tarefa'].insert_one({'idUsuario': self.usuario, 'titulo': 'Antiga'}).inserted_id)
+        patcher = mock.patch.object(versao_service, 'bump')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def enviar(self, operacoes):
+        return self.api.post('/api/tarefas/bulk/', {'operacoes': operacoes}, format='json')
+
+    def test_falha_parcial(self):
+        resposta = self.enviar([
+            {'op': 'create', 'dados': self.dados},
+            {'op': 'update', 'id': str(ObjectId()), 'dados': {'titulo': 'Outra'}},
+            {'op': 'delete', 'id': self.tarefa_id},
+        ])
+        self.assertEqual(resposta.status_code, 200)
+        corpo = resposta.json()
+        self.assertFalse(corpo['success'])
+        self.assertEqual([r['success'] for r in corpo['resultados']], [True, False, True])
+        self.assertEqual(corpo['resultados'][1]['error'], 'Tarefa não encontrada')
+        self.assertEqual(self.db['Tarefa'].count_documents({'titulo': 'Nova', 'idUsuario': self.usuario}), 1)
+        self.assertEqual(self.db['Tarefa'].count_documents({'_id': ObjectId(self.tarefa_id)}), 0)
+
+    def test_lote_invalido_nao_grava_nada(self):
+        resposta = self.enviar([
+            {'op': 'update', 'id': self.tarefa_id, 'dados': {'titulo': 'Outra'}},
+            {'op': 'delete', 'id': self.tarefa_id},
+            {'op': 'apagar'},
+        ])
+        self.assertEqual(resposta.status_code, 400)
+        self.assertEqual(set(resposta.json()['errors']), {'1', '2'})
+        self.assertEqual(resposta.json()['errors']['1'], {'id': 'Tarefa repetida no lote'})
+        self.assertEqual(self.db['Tarefa'].find_one({'_id': ObjectId(self.tarefa_id)})['titulo'], 'Antiga')
+
+    def test_lista_no_corpo(self):
+        resposta = self.api.post('/api/tarefas/bulk/', [{'op': 'delete', 'id': self.tarefa_id}], format='json')
+        self.assertEqual(resposta.status_code, 200)
+        self.assertTrue(resposta.json()['success'])
+        self.assertEqual(self.db['Tarefa'].count_documents({'_id': ObjectId(self.tarefa_id)}), 0)
+
+    def test_corpo_sem_operacoes(self):
+        for corpo in ('texto', 42, [], {'operacoes': {'op': 'delete'}}):
+            resposta = self.api.post('/api/tarefas/bulk/', corpo, format='json')
+            self.assertEqual(resposta.status_code, 400, corpo)
+            self.assertFalse(resposta.json()['success'])
+
+
+@com_modelos
+class TarefasCondicionalTests(MongoTestCase):
+    """GET condicional da listagem de tarefas: 304 pela versão do escopo, sem consultar as tarefas"""
+
+    def setUp(self):
+        super().setUp()
+        self.tarefa_id = tarefa_service.create({'idUsuario': self.usuario, 'titulo': 'Orçamento', 'status': '1'})
+
+    def listar(self, etag=None):
+        cabecalhos = {'HTTP_IF_NONE_MATCH': etag} if etag else {}
+        with mock.patch.object(tarefa_service, 'find_by_user', wraps=tarefa_service.find_by_user) as consulta:
+            resposta = self.api.get('/api/tarefas/', **cabecalhos)
+        return resposta, consulta
+
+    def test_etag_igual_responde_304_sem_consultar(self):
+        resposta, consulta = self.listar()
+        self.assertEqual(resposta.status_code, 200)
+        self.assertTrue(resposta['ETag'])
+        consulta.assert_called_once()
+
+        resposta, consulta = self.listar(resposta['ETag'])
+        self.assertEqual(resposta.status_code, 304)
+        self.assertEqual(resposta.content, b'')
+        consulta.assert_not_called()
+
+    def test_escrita_muda_a_etag(self):
+        etag = self.listar()[0]['ETag']
+        self.assertEqual(self.api.put(f'/api/tarefas/{self.tarefa_id}/', {'titulo': 'Novo'}, format='json').status_code, 200)
+
+        resposta, consulta = self.listar(etag)
+        self.assertEqual(resposta.status_code, 200)
+        self.assertNotEqual(resposta['ETag'], etag)
+        self.assertEqual(resposta.json()['tarefas'][0]['titulo'], 'Novo')
+        consulta.assert_called_once()
+
+    def test_escrita_de_outro_usuario_nao_invalida(self):
+        etag = self.listar()[0]['ETag']
+        tarefa_service.create({'idUsuario': ObjectId(), 'titulo': 'De outro', 'status': '1'})
+
+        resposta, consulta = self.listar(etag)
+        self.assertEqual(resposta.status_code, 304)
+        consulta.assert_not_called()
+
+
+@com_modelos
+class SincronizacaoTests(MongoTestCase):
+    """tarefas_changes/clientes_changes: paginação, exclusões e tokens inválidos"""
+
+    def setUp(self):
+        super().setUp()
+        patcher = mock.patch.object(versao_service, 'bump')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.desde = encode_token(datetime.now() - timedelta(hours=1))
+
+    def alteracoes(self, url, token):
+        resposta = self.api.get(url, {'since': token})
+        self.assertEqual(resposta.status_code, 200)
+        return resposta.json()
+
+    def test_has_more_pagina_as_alteracoes(self):
+        agora = datetime.now() - timedelta(minutes=5)
+        ids = [
+            str(self.db['Tarefa'].insert_one({
+                'idUsuario': self.usuario, 'titulo': f'Tarefa {i}', 'updated_at': agora + timedelta(seconds=i)
+            }).inserted_id)
+            for i in range(3)
+        ]
+        with mock.patch('espacoBK.views.CHANGES_LIMIT', 2):
+            primeira = self.alteracoes('/api/tarefas/changes/', self.desde)
+            segunda = self.alteracoes('/api/tarefas/changes/', primeira['token'])
+        self.assertTrue(primeira['has_more'])
+        self.assertEqual([t['id'] for t in primeira['tarefas']], ids[:2])
+        self.assertFalse(segunda['has_more'])
+        self.assertEqual([t['id'] for t in segunda['tarefas']], ids[2:])
+
+    def test_exclusoes_em_removidos(self):
+        tarefa_id = tarefa_service.create({'idUsuario': self.usuario, 'titulo': 'Orçamento', 'status': '1'})
+        de_outro = tarefa_service.create({'idUsuario': ObjectId(), 'titulo': 'De outro', 'status': '1'})
+        cliente_id = cliente_service.create({'nome': 'Rita'})
+        self.assertEqual(self.api.delete(f'/api/tarefas/{tarefa_id}/').status_code, 200)
+        tarefa_service.delete(de_outro)
+        cliente_service.delete(cliente_id)
+
+        tarefas = self.alteracoes('/api/tarefas/changes/', self.desde)
+        self.assertEqual(tarefas['removidos'], [tarefa_id])
+        self.assertEqual(tarefas['tarefas'], [])
+        self.assertEqual(self.alteracoes('/api/clientes/changes/', self.desde)['removidos'], [cliente_id])
+
+    def test_token_mais_antigo_que_as_exclusoes(self):
+        antigo = encode_token(datetime.now() - TOMBSTONE_TTL - timedelta(days=1))
+        for url in ('/api/tarefas/changes/', '/api/clientes/changes/'):
+            resposta = self.api.get(url, {'since': antigo})
+            self.assertEqual(resposta.status_code, 410, url)
+            self.assertFalse(resposta.json()['success'])
+
+    def test_token_malformado(self):
+        for url in ('/api/tarefas/changes/', '/api/clientes/changes/'):
+            for token in ('%%%', encode_token(datetime.now())[:-3], 'eyJ0IjogMX0'):
+                resposta = self.api.get(url, {'since': token})
+                self.assertEqual(resposta.status_code, 400, (url, token))
+
+
+class PublicacaoDeEscritasTests(MongoTestCase):
+    """Sem change stream, as escritas dos serviços chegam às conexões SSE"""
+
+    def setUp(self):
+        super().setUp()
+        self.broker = EventBroker()
+        patcher = mock.patch.object(realtime, '_publisher', InMemoryPublisher(self.broker))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @com_modelos
+    def test_escrita_do_servico_publicada(self):
+        dono, outro = self.broker.subscribe(str(self.usuario)), self.broker.subscribe(str(ObjectId()))
+        tarefa_id = tarefa_service.create({'idUsuario': self.usuario, 'titulo': 'Orçamento', 'status': '1'})
+        cliente_id = cliente_service.create({'nome': 'Rita'})
+
+        evento = dono.get_nowait()
+        self.assertEqual((evento['colecao'], evento['operacao'], evento['id']), ('Tarefa', 'insert', tarefa_id))
+        self.assertEqual(evento['dados']['titulo'], 'Orçamento')
+        self.assertNotIn('usuario_nome', evento['dados'])
+        self.assertEqual(dono.get_nowait()['id'], cliente_id)
+        self.assertEqual(outro.get_nowait()['id'], cliente_id)
+        self.assertTrue(outro.empty())
+
+    def test_change_stream_sem_replica_set(self):
+        publisher = ChangeStreamPublisher(self.broker)
+        banco = mock.MagicMock()
+        banco.watch.side_effect = OperationFailure('The $changeStream stage is only supported on replica sets', 40573)
+
+        async def iniciar_duas_vezes():
+            publisher.start()
+            await publisher._task
+            publisher.start()
+            return publisher._task.done()
+
+        with mock.patch.object(type(async_mongodb), 'db', new_callable=mock.PropertyMock, return_value=banco):
+            self.assertTrue(asyncio.run(iniciar_duas_vezes()))
+        banco.watch.assert_called_once()
+        # Passa a publicar as escritas do processo
+        self.assertTrue(publisher.recebe_escritas)
+
+    @com_modelos
+    def test_change_stream_sem_pre_image(self):
+        dono = ObjectId()
+        fila = self.broker.subscribe(str(dono))
+        mudanca = {
+            '_id': {'_data': '8263'}, 'operationType': 'insert', 'ns': {'coll': 'Tarefa'},
+            'documentKey': {'_id': ObjectId()}, 'fullDocument': {'idUsuario': dono, 'titulo': 'Orçamento'},
+        }
+
+        class Stream:
+            resume_token = {'_data': '8263'}
+
+            async def __aenter__(self):
+                return self
+
+            async def __aexit__(self, *exc):
+                return False
+
+            async def __aiter__(self):
+                yield mudanca
+
+        banco = mock.MagicMock()
+        banco.watch.side_effect = [
+            # MongoDB < 6.0
+            OperationFailure("BSON field '$changeStream.fullDocumentBeforeChange' is an unknown field.", 40415),
+            Stream(),
+            OperationFailure('The $changeStream stage is only supported on replica sets', 40573),
+        ]
+        publisher = ChangeStreamPublisher(self.broker, retry_delay=0)
+
+        async def consumir():
+            publisher.start()
+            await publisher._task
+
+        with mock.patch.object(type(async_mongodb), 'db', new_callable=mock.PropertyMock, return_value=banco):
+            asyncio.run(consumir())
+        primeira, segunda, _ = banco.watch.call_args_list
+        self.assertEqual(primeira.kwargs['full_document_before_change'], 'whenAvailable')
+        self.assertNotIn('full_document_before_change', segunda.kwargs)
+        self.assertEqual(fila.get_nowait()['dados']['titulo'], 'Orçamento')
+
+
+@com_modelos
+class RefreshTokenTests(MongoTestCase):
+    """Refresh tokens deixam de valer depois do logout"""
+
+    def setUp(self):
+        super().setUp()
+        self.db['Usuario'].insert_one({'_id': self.usuario, 'nome': 'Maria', 'email': 'maria@espacobk.com'})
+
+    def renovar(self, refresh):
+        return self.api.post('/api/auth/refresh/', {'refresh': refresh}, format='json')
+
+    def test_logout_revoga_refresh(self):
+        refresh = issue_tokens(self.usuario, 'Maria')['refresh']
+        resposta = self.renovar(refresh)
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(verify_refresh(resposta.json()['refresh'])['tv'], 0)
+
+        self.assertEqual(self.api.post('/api/auth/logout/').status_code, 200)
+        self.assertEqual(self.renovar(refresh).status_code, 401)
+        self.assertEqual(self.renovar(resposta.json()['refresh']).status_code, 401)
+        # Tokens emitidos depois do logout (novo login) continuam valendo
+        self.assertEqual(self.renovar(issue_tokens(self.usuario, 'Maria', 1)['refresh']).status_code, 200)
+
+    def test_usuario_removido(self):
+        self.db['Usuario'].delete_one({'_id': self.usuario})
+        self.assertEqual(self.renovar(issue_tokens(self.usuario, 'Maria')['refresh']).status_code, 401)
+
+
+@com_modelos
+class RegistroTests(MongoTestCase):
+    """Registro grava pelo UsuarioService, com a senha em hash"""
+
+    def registrar(self, email='ana@espacobk.com', senha='segredo123'):
+        dados = {'nome': 'Ana', 'email': email, 'senha': senha, 'senha_confirm': senha}
+        return APIClient().post('/api/auth/register/', dados, format='json')
+
+    def test_senha_gravada_em_hash(self):
+        resposta = self.registrar()
+        self.assertEqual(resposta.status_code, 201)
+        documento = self.db['Usuario'].find_one({'email': 'ana@espacobk.com'})
+        self.assertEqual(resposta.json()['user']['id'], str(documento['_id']))
+        self.assertTrue(is_hashed(documento['senha']))
+        self.assertEqual(verify_password('segredo123', documento['senha']), (True, False))
+
+    def test_hash_enviado_pelo_cliente_e_hasheado(self):
+        # Um hash vindo da API é só a senha escolhida: gravado como está, viraria credencial
+        senha = hash_password('outra')
+        self.assertEqual(self.registrar(senha=senha).status_code, 201)
+        documento = self.db['Usuario'].find_one({'email': 'ana@espacobk.com'})
+        self.assertNotEqual(documento['senha'], senha)
+        self.assertEqual(verify_password(senha, documento['senha']), (True, False))
+
+        self.assertTrue(usuario_service.update(documento['_id'], {'senha': senha}))
+        guardada = self.db['Usuario'].find_one({'_id': documento['_id']})['senha']
+        self.assertNotEqual(guardada, senha)
+        self.assertEqual(verify_password(senha, guardada), (True, False))
+
+    def test_email_repetido(self):
+        self.registrar()
+        resposta = self.registrar()
+        self.assertEqual(resposta.status_code, 400)
+        self.assertIn('email', resposta.json()['errors'])
+        self.assertEqual(self.db['Usuario'].count_documents({}), 1)
+
+
+class UsuarioCacheTests(MongoTestCase):
+    """Senha fora do documento em cache de find_by_id"""
+
+    def test_senha_fora_do_cache(self):
+        self.db['Usuario'].insert_one({'_id': self.usuario, 'nome': 'Maria', 'senha': hash_password('segredo123')})
+        self.assertNotIn('senha', usuario_service.find_by_id(self.usuario))
+        self.assertNotIn('senha', usuario_service.cache.get(str(self.usuario)))
+
+
+class BuscaTests(SimpleTestCase):
+    """Filtro e pipeline da busca de clientes"""
+
+    def test_filtro_por_palavras_e_prefixo(self):
+        self.assertEqual(filtro_busca('  '), {})
+        self.assertEqual(filtro_busca('!!!'), NADA)
+        self.assertEqual(filtro_busca('São Jo'), {'$and': [{'busca_tokens': 'sao'}, {'busca_tokens': {'$regex': '^jo'}}]})
+
+    def test_ordena_antes_de_cortar(self):
+        estagios = [next(iter(estagio)) for estagio in pipeline_busca('silva', limit=20, offset=40)]
+        self.assertEqual(estagios, ['$match', '$addFields', '$sort', '$skip', '$limit', '$project'])
+
+
+@com_modelos
+class BuscaViewsTests(MongoTestCase):
+    """Busca e exportação de clientes filtradas pelas palavras da query"""
+
+    def setUp(self):
+        super().setUp()
+        for nome in ('Ana Silva', 'Silvana Souza', 'Pedro Lima'):
+            self.db['Cliente'].insert_one({'nome': nome, **campos_busca({'nome': nome})})
+
+    def exportar(self, **params):
+        resposta = self.api.get('/api/clientes/export/', params)
+        return [linha for linha in b''.join(resposta.streaming_content).decode().splitlines() if linha]
+
+    def test_filtro_encontra_por_prefixo(self):
+        nomes = {cliente['nome'] for cliente in self.db['Cliente'].find(filtro_busca('silv'))}
+        self.assertEqual(nomes, {'Ana Silva', 'Silvana Souza'})
+
+    def test_query_sem_palavras_nao_encontra_nada(self):
+        resposta = self.api.get('/api/clientes/busca/', {'q': '!!!'})
+        self.assertEqual((resposta.status_code, resposta.json()['clientes']), (200, []))
+        self.assertEqual(self.exportar(q='!!!'), [])
+        self.assertEqual(len(self.exportar()), 3)
+        self.assertEqual(len(self.exportar(q='silv')), 2)
+
+    def test_exportacao_csv_com_campos(self):
+        linhas = self.exportar(formato='csv', fields='nome,cidade', q='ana silva')
+        self.assertEqual(linhas, ['nome,cidade', 'Ana Silva,'])
+        self.assertEqual(self.api.get('/api/clientes/export/', {'formato': 'xml'}).status_code, 400)
+
+    def test_exportacao_como_a_api(self):
+        cliente_id = self.db['Cliente'].insert_one({
+            'nome': 'Rita Lima', 'data_nascimento': datetime(1975, 3, 9),
+            'endereco': {'rua': 'Rua das Flores, 123', 'cidade': 'São Paulo'},
+            **campos_busca({'nome': 'Rita Lima'}),
+        }).inserted_id
+
+        linha = json.loads(self.exportar(q='rita')[0])
+        self.assertEqual((linha['id'], linha['data_nascimento']), (str(cliente_id), '1975-03-09'))
+        self.assertEqual(linha['endereco'], {'rua': 'Rua das Flores, 123', 'cidade': 'São Paulo'})
+
+        cabecalho, valores = csv.reader(self.exportar(formato='csv', fields='id,data_nascimento,endereco', q='rita'))
+        self.assertEqual(valores[:2], [str(cliente_id), '1975-03-09'])
+        self.assertEqual(json.loads(valores[2]), linha['endereco'])
+
+
+@com_modelos
+class PaginacaoTarefasTests(MongoTestCase):
+    """Cursor da listagem de tarefas sobre o $or de user_filter (formatos legados de ID)"""
+
+    def test_percorre_todas_em_ordem_de_id(self):
+        formatos = ({'idUsuario': self.usuario}, {'idUsuario': str(self.usuario)}, {'usuario_id': self.usuario})
+        esperadas = [str(self.db['Tarefa'].insert_one({**formatos[i % 3], 'titulo': f'T{i}'}).inserted_id)
+                     for i in range(7)]
+        self.db['Tarefa'].insert_one({'idUsuario': ObjectId(), 'titulo': 'De outro usuário'})
+
+        vistas, cursor = [], None
+        while True:
+            parametros = {'limit': 3, 'total': 'false', **({'cursor': cursor} if cursor else {})}
+            resposta = self.api.get('/api/tarefas/', parametros).json()
+            vistas += [str(tarefa['id']) for tarefa in resposta['tarefas']]
+            cursor = resposta['next']
+            if cursor is None:
+                break
+        self.assertEqual(vistas, sorted(esperadas))
+
+
+class MongoDBSingletonTests(SimpleTestCase):
+    """Cliente do PyMongo criado no primeiro uso, um por processo"""
+
+    def setUp(self):
+        self.banco = MongoDB()
+        for atributo in ('_client', '_db', '_pid'):
+            patcher = mock.patch.object(self.banco, atributo, None)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        patcher = mock.patch('espacoBK.database.MongoClient')
+        self.cliente = patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch.dict(os.environ, {'DB_HOST': 'mongodb://localhost', 'MONGO_DATABASE': 'espaco_bk_testes'})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_conecta_no_primeiro_uso(self):
+        self.assertIs(MongoDB(), self.banco)
+        self.cliente.assert_not_called()
+        self.assertIs(self.banco.db, self.banco.db)
+        self.cliente.assert_called_once()
+
+    def test_novo_cliente_depois_do_fork(self):
+        self.banco.db
+        self.banco.reset_after_fork()
+        self.banco.db
+        self.assertEqual(self.cliente.call_count, 2)
+        # Outro pid (processo filho sem o hook de fork) também reconecta
+        with mock.patch('espacoBK.database.os.getpid', return_value=os.getpid() + 1):
+            self.banco.db
+        self.assertEqual(self.cliente.call_count, 3)
+
+
+class TarefasPorUsuarioTests(MongoTestCase):
+    """find_by_user em uma consulta ($or) e normalização dos IDs legados"""
+
+    def setUp(self):
+        super().setUp()
+        self.db['Tarefa'].insert_many([
+            {'idUsuario': self.usuario, 'titulo': 'Atual'},
+            {'idUsuario': str(self.usuario), 'titulo': 'ID em texto'},
+            {'usuario_id': self.usuario, 'titulo': 'Campo legado'},
+            {'usuario_id': 'abc', 'titulo': 'ID inválido'},
+            {'idUsuario': ObjectId(), 'titulo': 'De outro usuário'},
+        ])
+
+    def test_uma_consulta_para_todos_os_formatos(self):
+        with mock.patch('espacoBK.database.iter_find', wraps=iter_find) as consulta:
+            tarefas = tarefa_service.find_by_user(str(self.usuario))
+        consulta.assert_called_once()
+        self.assertEqual({tarefa['titulo'] for tarefa in tarefas}, {'Atual', 'ID em texto', 'Campo legado'})
+
+    def test_normalizacao_dry_run(self):
+        self.assertEqual(tarefa_service.normalize_user_ids(dry_run=True), {'normalizadas': 2, 'invalidas': 1})
+        self.assertEqual(self.db['Tarefa'].count_documents({'usuario_id': {'$exists': True}}), 2)
+
+
+class DashboardTests(MongoTestCase):
+    """Resumo das tarefas em uma agregação ($facet)"""
+
+    def setUp(self):
+        super().setUp()
+        self.campanha = ObjectId()
+        vencida, futura = datetime(2020, 1, 1), datetime.now() + timedelta(days=30)
+        self.db['Tarefa'].insert_many([
+            {'idUsuario': self.usuario, 'status': '2', 'prioridade': '1', 'idCampanha': self.campanha,
+             'data_termino': vencida},
+            {'idUsuario': str(self.usuario), 'status': '1', 'prioridade': '3', 'idCampanha': self.campanha,
+             'data_termino': vencida},
+            {'usuario_id': self.usuario, 'status': '1', 'prioridade': '3', 'idCampanha': None,
+             'data_termino': futura},
+            {'idUsuario': ObjectId(), 'status': '1', 'prioridade': '1', 'idCampanha': None, 'data_termino': vencida},
+        ])
+
+    def test_resumo_do_usuario(self):
+        resumo = tarefa_service.dashboard(str(self.usuario))
+        self.assertEqual((resumo['total'], resumo['concluidas'], resumo['atrasadas']), (3, 1, 1))
+        self.assertEqual(resumo['taxa_conclusao'], 0.3333)
+        self.assertEqual(resumo['por_prioridade'], {'1': 1, '3': 2})
+        self.assertEqual(resumo['por_campanha'][0], {
+            'idCampanha': str(self.campanha), 'total': 2, 'concluidas': 1, 'taxa_conclusao': 0.5
+        })
+
+    def test_filtro_por_campanha(self):
+        resumo = tarefa_service.dashboard(str(self.usuario), str(self.campanha))
+        self.assertEqual((resumo['total'], resumo['por_status']), (2, {'1': 1, '2': 1}))
+
+    @com_modelos
+    def test_endpoint(self):
+        resposta = self.api.get('/api/tarefas/dashboard/')
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(resposta.json()['dashboard']['total'], 3)
+
+
+class MetricsTests(SimpleTestCase):
+    """Histogramas por thread e acesso restrito ao /metrics"""
+
+    def test_shards_de_threads_encerradas(self):
+        histograma = metrics.Histogram()
+        threads = [threading.Thread(target=histograma.observe, args=(0.003,)) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        histograma.observe(0.2)
+
+        contagens, soma = histograma.snapshot()
+        self.assertEqual(contagens[-1], 6)
+        self.assertEqual(contagens[histograma.buckets.index(0.005)], 5)
+        self.assertAlmostEqual(soma, 0.215)
+        # Só o shard da thread atual continua registrado
+        self.assertEqual(len(histograma.shards), 1)
+
+    def test_formato_prometheus(self):
+        metrics.histogram('espacobk_service_latency_seconds', service='TesteService', method='find').observe(0.03)
+        texto = metrics.render()
+        self.assertIn('# TYPE espacobk_service_latency_seconds histogram', texto)
+        self.assertIn(
+            'espacobk_service_latency_seconds_bucket{method="find",service="TesteService",le="0.05"} 1', texto
+        )
+        self.assertIn('espacobk_service_latency_seconds_count{method="find",service="TesteService"} 1', texto)
+
+    def test_acesso_pela_rede(self):
+        factory = RequestFactory()
+        with mock.patch.object(metrics, 'METRICS_TOKEN', ''):
+            self.assertTrue(metrics.acesso_permitido(factory.get('/metrics', REMOTE_ADDR='127.0.0.1')))
+            self.assertFalse(metrics.acesso_permitido(factory.get('/metrics', REMOTE_ADDR='203.0.113.9')))
+
+    def test_acesso_por_token(self):
+        factory = RequestFactory()
+        with mock.patch.object(metrics, 'METRICS_TOKEN', 'segredo'):
+            self.assertFalse(metrics.acesso_permitido(factory.get('/metrics', REMOTE_ADDR='127.0.0.1')))
+            self.assertTrue(metrics.acesso_permitido(
+                factory.get('/metrics', REMOTE_ADDR='203.0.113.9', HTTP_AUTHORIZATION='Bearer segredo')
+            ))
+
+    @com_modelos
+    def test_endpoint_restrito(self):
+        self.assertEqual(self.client.get('/metrics', REMOTE_ADDR='203.0.113.9').status_code, 403)
+        resposta = self.client.get('/metrics')
+        self.assertEqual(resposta.status_code, 200)
+        self.assertIn(b'espacobk_pool_checked_out', resposta.content)
+
+
+class ProfilerTests(SimpleTestCase):
+    """Comandos Mongo contados por requisição pelo MongoProfilerMiddleware"""
+
+    def comando(self, request_id, nome='find', collection='Tarefa', micros=1500):
+        evento = mock.Mock(command={nome: collection}, command_name=nome, request_id=request_id,
+                           duration_micros=micros)
+        profiler.command_listener.started(evento)
+        profiler.command_listener.succeeded(evento)
+
+    def requisicao(self):
+        def view(request):
+            self.comando(1)
+            self.comando(2, 'update', micros=4000)
+            return HttpResponse('ok')
+        return profiler.MongoProfilerMiddleware(view)(RequestFactory().get('/api/tarefas/'))
+
+    def test_listener_registrado_uma_vez(self):
+        self.assertTrue(profiler._registrado)
+        with mock.patch.object(profiler, '_registrado', False), \
+                mock.patch('espacoBK.profiler.monitoring.register') as register:
+            profiler.register_command_listener()
+            profiler.register_command_listener()
+        register.assert_called_once_with(profiler.command_listener)
+
+    def test_server_timing_na_amostra(self):
+        with mock.patch.object(profiler, 'SAMPLE_RATE', 1.0), self.assertLogs('espacoBK.profiler', 'INFO'):
+            resposta = self.requisicao()
+        self.assertIn('mongo;dur=5.50;desc="2 comandos"', resposta['Server-Timing'])
+        self.assertIn('mongo-slowest;dur=4.00;desc="update Tarefa"', resposta['Server-Timing'])
+
+    def test_requisicao_lenta_loga_os_comandos(self):
+        with mock.patch.object(profiler, 'SAMPLE_RATE', 0.0), mock.patch.object(profiler, 'SLOW_MS', 0), \
+                self.assertLogs('espacoBK.profiler', 'WARNING') as logs:
+            resposta = self.requisicao()
+        self.assertNotIn('Server-Timing', resposta)
+        self.assertIn('"mongo_commands": 2', logs.output[0])
+        self.assertIn('"comando": "update"', logs.output[0])
+
+    def test_comandos_fora_de_requisicao_ignorados(self):
+        self.comando(3)
+        self.assertIsNone(profiler._perfil.get())
+
+
+@com_modelos
+class ListagensAssincronasTests(SimpleTestCase):
+    """Views assíncronas (Motor) exigem usuário autenticado como as da API"""
+
+    def test_anonimo_recebe_401(self):
+        for url, servico, metodo in (('/api/async/tarefas/', async_tarefa_service, 'find_by_user'),
+                                     ('/api/async/clientes/', async_cliente_service, 'find_all')):
+            with mock.patch.object(servico, metodo) as consulta:
+                resposta = self.client.get(url)
+            self.assertEqual(resposta.status_code, 401, url)
+            consulta.assert_not_called()
+
+    def test_token_invalido_ou_expirado_recebe_401(self):
+        token = issue_tokens(ObjectId(), 'Ana')['access']
+        casos = (('Bearer ' + token[:-2] + 'xx', 900), ('Bearer ' + token, -1))
+        for cabecalho, validade in casos:
+            with mock.patch('espacoBK.authentication.ACCESS_TTL', validade), \
+                    mock.patch.object(async_tarefa_service, 'find_by_user') as consulta:
+                resposta = self.client.get('/api/async/tarefas/', HTTP_AUTHORIZATION=cabecalho)
+            self.assertEqual(resposta.status_code, 401)
+            consulta.assert_not_called()
+
+
+class UsuarioAsyncTests(SimpleTestCase):
+    """Resolução do usuário das views assíncronas (token ou sessão)"""
+
+    def _request(self, sessao=None, **extra):
+        request = RequestFactory().get('/api/async/tarefas/', **extra)
+        request.session = sessao if sessao is not None else {}
+        return request
+
+    def test_token_tem_precedencia_sobre_a_sessao(self):
+        usuario_id = str(ObjectId())
+        token = issue_tokens(usuario_id, 'Ana')['access']
+        request = self._request({'usuario_id': 'outro'}, HTTP_AUTHORIZATION=f'Bearer {token}')
+        usuario = asyncio.run(usuario_async(request))
+        self.assertEqual((usuario.usuario_id, usuario.nome), (usuario_id, 'Ana'))
+
+    def test_sessao(self):
+        request = self._request({'usuario_id': 'abc', 'usuario_nome': 'Ana'})
+        usuario = asyncio.run(usuario_async(request))
+        self.assertEqual((usuario.usuario_id, usuario.nome), ('abc', 'Ana'))
+
+    def test_sem_credenciais_ou_token_invalido(self):
+        self.assertIsNone(asyncio.run(usuario_async(self._request())))
+        request = self._request({'usuario_id': 'abc'}, HTTP_AUTHORIZATION='Bearer lixo')
+        self.assertIsNone(asyncio.run(usuario_async(request)))
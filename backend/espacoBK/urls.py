@@ -7,12 +7,32 @@ urlpatterns = [
     path('auth/login/', views.login_user, name='login'),
     path('auth/logout/', views.logout_user, name='logout'),
     path('auth/check/', views.check_auth, name='check_auth'),
+    path('auth/refresh/', views.refresh_token, name='refresh_token'),
     
     # Tarefas
     path('tarefas/', views.tarefas_list, name='tarefas_list'),
+    path('tarefas/bulk/', views.tarefas_bulk, name='tarefas_bulk'),
+    path('tarefas/changes/', views.tarefas_changes, name='tarefas_changes'),
+    path('tarefas/dashboard/', views.tarefas_dashboard, name='tarefas_dashboard'),
     path('tarefas/<str:pk>/', views.tarefa_detail, name='tarefa_detail'),
     path('tarefas/<str:pk>/concluir/', views.marcar_tarefa_concluida, name='marcar_concluida'),
     
+    # Campanhas
+    path('campanhas/stats/', views.campanhas_stats, name='campanhas_stats'),
+    
     # Clientes
     path('clientes/', views.clientes_list, name='clientes_list'),
+    path('clientes/changes/', views.clientes_changes, name='clientes_changes'),
+    path('clientes/busca/', views.clientes_busca, name='clientes_busca'),
+    path('clientes/export/', views.clientes_export, name='clientes_export'),
+    
+    # Diagnóstico
+    path('cache/stats/', views.cache_stats_view, name='cache_stats'),
+    
+    # Listagens assíncronas (Motor, para o deploy ASGI)
+    path('async/tarefas/', views.tarefas_list_async, name='tarefas_list_async'),
+    path('async/clientes/', views.clientes_list_async, name='clientes_list_async'),
+    
+    # Eventos em tempo real (SSE, para o deploy ASGI)
+    path('eventos/', views.eventos_stream, name='eventos_stream'),
 ]
\ No newline at end of file
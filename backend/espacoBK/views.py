@@ -1,36 +1,60 @@
 from rest_framework import status
 from rest_framework.decorators import api_view, permission_classes
-from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
-from rest_framework.authtoken.models import Token
-from django.contrib.auth import login, logout
-from .models import Usuario, Tarefa, Cliente
+from rest_framework.exceptions import ValidationError
+from django.core import signing
+from django.core.cache import cache
+from django.http import HttpResponse, StreamingHttpResponse
+from .models import Usuario
 from .serializers import (
     UsuarioSerializer, UsuarioLoginSerializer, UsuarioRegistrationSerializer,
-    TarefaSerializer, ClienteSerializer
+    TarefaSerializer, ClienteSerializer, instancia_de_documento
+)
+from .projections import cliente_projecao, tarefa_projecao
+from .repositories import cliente_repository, tarefa_repository
+from .cache import cache_stats
+from .metrics import acesso_permitido as acesso_metricas, render as render_metrics
+from .renderers import dumps
+from .conditional import check_version, set_validators
+from .database import (
+    cliente_service, tarefa_service, usuario_service, versao_service, exclusao_service,
+    campanha_stats_service, tarefas_scope, CLIENTES_SCOPE, STATUS_PENDENTE, STATUS_CONCLUIDA, BATCH_SIZE
+)
+from .sync import CHANGES_LIMIT, TokenExpirado, TokenInvalido, decode_token, encode_token, next_token
+from .async_database import async_cliente_service, async_tarefa_service, async_usuario_service
+from .realtime import broker, format_sse, get_publisher
+from .principal import forget_principal, get_principal
+from .authentication import issue_tokens, usuario_async, verify_refresh
+from .pagination import (
+    parse_fields, page_params, next_page_cursor, cached_total, acached_total, invalidate_total,
+    query_params
 )
 from bson import ObjectId
 from datetime import datetime
+import asyncio
+import csv
+from itertools import islice
 
-# Função para autenticação customizada
-def get_usuario_from_token(request):
-    """Busca usuário baseado no token customizado"""
-    auth_header = request.META.get('HTTP_AUTHORIZATION')
-    if auth_header and auth_header.startswith('Bearer '):
-        token = auth_header.split(' ')[1]
-        # Implementar lógica de token customizada ou usar sessão
-        # Por enquanto, vamos usar uma abordagem simples
-        try:
-            # Você pode implementar sua própria lógica de token aqui
-            usuario_id = request.session.get('usuario_id')
-            if usuario_id:
-                return Usuario.objects.get(_id=ObjectId(usuario_id))
-        except:
-            pass
-    return None
+def incluir_total(request):
+    """O total é opcional: ?total=false dispensa a contagem"""
+    return query_params(request).get('total', 'true').lower() not in ('0', 'false', 'no')
+
+def usuario_da_requisicao(request):
+    """ID e nome do usuário autenticado (token assinado ou sessão)"""
+    return getattr(request.user, 'usuario_id', None), getattr(request.user, 'nome', None)
 
 # ==================== AUTENTICAÇÃO ====================
 
+def _resposta_tokens(usuario, versao=0):
+    """Campos de token das respostas de login/registro"""
+    tokens = issue_tokens(usuario._id, usuario.nome, versao)
+    return {
+        'token': tokens['access'],
+        'refresh': tokens['refresh'],
+        'expires_in': tokens['expires_in']
+    }
+
 @api_view(['POST'])
 @permission_classes([AllowAny])
 def register_user(request):
@@ -42,7 +66,7 @@ def register_user(request):
             'success': True,
             'message': 'Usuário criado com sucesso!',
             'user': UsuarioSerializer(usuario).data,
-            'token': str(usuario._id)  # Token simples usando ID
+            **_resposta_tokens(usuario)
         }, status=status.HTTP_201_CREATED)
     
     return Response({
@@ -61,12 +85,13 @@ def login_user(request):
         
         # Salvar na sessão
         request.session['usuario_id'] = str(usuario._id)
+        request.session['usuario_nome'] = usuario.nome
         
         return Response({
             'success': True,
             'message': 'Login realizado com sucesso!',
             'user': UsuarioSerializer(usuario).data,
-            'token': str(usuario._id)
+            **_resposta_tokens(usuario, usuario_service.token_version(usuario._id) or 0)
         }, status=status.HTTP_200_OK)
     
     return Response({
@@ -75,10 +100,41 @@ def login_user(request):
         'errors': serializer.errors
     }, status=status.HTTP_400_BAD_REQUEST)
 
+@api_view(['POST'])
+@permission_classes([AllowAny])
+def refresh_token(request):
+    """Troca um refresh token válido por um novo par de tokens"""
+    try:
+        dados = verify_refresh(str(request.data.get('refresh', '')))
+    except signing.SignatureExpired:
+        return Response({'success': False, 'message': 'Refresh token expirado'}, 
+                       status=status.HTTP_401_UNAUTHORIZED)
+    except signing.BadSignature:
+        return Response({'success': False, 'message': 'Refresh token inválido'}, 
+                       status=status.HTTP_401_UNAUTHORIZED)
+    
+    # Logout (ou usuário removido) depois da emissão invalida o refresh token
+    versao = usuario_service.token_version(dados['uid'])
+    if versao is None or versao != dados.get('tv', 0):
+        return Response({'success': False, 'message': 'Refresh token revogado'}, 
+                       status=status.HTTP_401_UNAUTHORIZED)
+    
+    tokens = issue_tokens(dados['uid'], dados.get('nome'), versao)
+    return Response({
+        'success': True,
+        'token': tokens['access'],
+        'refresh': tokens['refresh'],
+        'expires_in': tokens['expires_in']
+    }, status=status.HTTP_200_OK)
+
 @api_view(['POST'])
 def logout_user(request):
     """Realiza logout do usuário"""
     try:
+        usuario_id, _ = usuario_da_requisicao(request)
+        if usuario_id:
+            usuario_service.revoke_tokens(usuario_id)
+        forget_principal(request)
         request.session.flush()
         return Response({
             'success': True,
@@ -92,19 +148,16 @@ def logout_user(request):
         }, status=status.HTTP_400_BAD_REQUEST)
 
 @api_view(['GET'])
+@permission_classes([AllowAny])
 def check_auth(request):
     """Verifica se o usuário está autenticado"""
-    usuario_id = request.session.get('usuario_id')
-    if usuario_id:
-        try:
-            usuario = Usuario.objects.get(_id=ObjectId(usuario_id))
-            return Response({
-                'success': True,
-                'authenticated': True,
-                'user': UsuarioSerializer(usuario).data
-            }, status=status.HTTP_200_OK)
-        except Usuario.DoesNotExist:
-            pass
+    principal = get_principal(request)
+    if principal is not None:
+        return Response({
+            'success': True,
+            'authenticated': True,
+            'user': UsuarioSerializer(instancia_de_documento(Usuario, principal)).data
+        }, status=status.HTTP_200_OK)
     
     return Response({
         'success': False,
@@ -116,29 +169,44 @@ def check_auth(request):
 @api_view(['GET', 'POST'])
 def tarefas_list(request):
     """Lista tarefas ou cria nova tarefa"""
-    usuario_id = request.session.get('usuario_id')
+    usuario_id, usuario_nome = usuario_da_requisicao(request)
     if not usuario_id:
         return Response({'success': False, 'message': 'Não autenticado'}, 
                        status=status.HTTP_401_UNAUTHORIZED)
     
+    total_key = f'tarefas_total:{usuario_id}'
+    # Todas as tarefas são do usuário autenticado: o nome já veio no token/sessão
+    context = {'usuario_nomes': {usuario_id: usuario_nome}} if usuario_nome else {}
+    
     if request.method == 'GET':
-        tarefas = Tarefa.objects.filter(idUsuario=ObjectId(usuario_id))
-        serializer = TarefaSerializer(tarefas, many=True)
-        return Response({
+        # Nada mudou desde a última consulta: 304 sem consultar as tarefas
+        nao_modificado, validadores = check_version(request, tarefas_scope(usuario_id))
+        if nao_modificado:
+            return nao_modificado
+        
+        campos, projection, limit, after = page_params(request, TarefaSerializer)
+        documentos, next_cursor = tarefa_repository.page(usuario_id, limit, after, projection)
+        return set_validators(Response({
             'success': True,
-            'tarefas': serializer.data,
-            'total': tarefas.count()
-        }, status=status.HTTP_200_OK)
+            'tarefas': tarefa_projecao.render(documentos, campos, context),
+            'total': cached_total(total_key, lambda: tarefa_repository.count(usuario_id), incluir_total(request)),
+            'next': next_cursor
+        }, status=status.HTTP_200_OK), validadores)
     
     elif request.method == 'POST':
         serializer = TarefaSerializer(data=request.data)
         if serializer.is_valid():
-            # Adicionar ID do usuário
-            tarefa = serializer.save(idUsuario=ObjectId(usuario_id))
+            tarefa = tarefa_repository.create(usuario_id, serializer.validated_data)
+            if tarefa is None:
+                return Response({
+                    'success': False,
+                    'message': 'Erro ao criar tarefa'
+                }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+            invalidate_total(total_key)
             return Response({
                 'success': True,
                 'message': 'Tarefa criada com sucesso!',
-                'tarefa': TarefaSerializer(tarefa).data
+                'tarefa': tarefa_projecao.render_one(tarefa, context=context)
             }, status=status.HTTP_201_CREATED)
         
         return Response({
@@ -150,34 +218,39 @@ def tarefas_list(request):
 @api_view(['GET', 'PUT', 'DELETE'])
 def tarefa_detail(request, pk):
     """Operações em tarefa específica"""
-    usuario_id = request.session.get('usuario_id')
+    usuario_id, usuario_nome = usuario_da_requisicao(request)
     if not usuario_id:
         return Response({'success': False, 'message': 'Não autenticado'}, 
                        status=status.HTTP_401_UNAUTHORIZED)
     
-    try:
-        tarefa = Tarefa.objects.get(_id=ObjectId(pk), idUsuario=ObjectId(usuario_id))
-    except Tarefa.DoesNotExist:
-        return Response({
-            'success': False,
-            'message': 'Tarefa não encontrada'
-        }, status=status.HTTP_404_NOT_FOUND)
+    nao_encontrada = Response({
+        'success': False,
+        'message': 'Tarefa não encontrada'
+    }, status=status.HTTP_404_NOT_FOUND)
+    context = {'usuario_nomes': {usuario_id: usuario_nome}} if usuario_nome else {}
     
     if request.method == 'GET':
-        serializer = TarefaSerializer(tarefa)
-        return Response({
+        nao_modificado, validadores = check_version(request, tarefas_scope(usuario_id))
+        if nao_modificado:
+            return nao_modificado
+        tarefa = tarefa_repository.get(pk, usuario_id)
+        if tarefa is None:
+            return nao_encontrada
+        return set_validators(Response({
             'success': True,
-            'tarefa': serializer.data
-        }, status=status.HTTP_200_OK)
+            'tarefa': tarefa_projecao.render_one(tarefa, context=context)
+        }, status=status.HTTP_200_OK), validadores)
     
     elif request.method == 'PUT':
-        serializer = TarefaSerializer(tarefa, data=request.data, partial=True)
+        serializer = TarefaSerializer(data=request.data, partial=True)
         if serializer.is_valid():
-            tarefa_atualizada = serializer.save()
+            tarefa = tarefa_repository.update(pk, usuario_id, serializer.validated_data)
+            if tarefa is None:
+                return nao_encontrada
             return Response({
                 'success': True,
                 'message': 'Tarefa atualizada com sucesso!',
-                'tarefa': TarefaSerializer(tarefa_atualizada).data
+                'tarefa': tarefa_projecao.render_one(tarefa, context=context)
             }, status=status.HTTP_200_OK)
         
         return Response({
@@ -187,40 +260,227 @@ def tarefa_detail(request, pk):
         }, status=status.HTTP_400_BAD_REQUEST)
     
     elif request.method == 'DELETE':
-        tarefa.delete()
+        if not tarefa_repository.delete(pk, usuario_id):
+            return nao_encontrada
+        invalidate_total(f'tarefas_total:{usuario_id}')
         return Response({
             'success': True,
             'message': 'Tarefa excluída com sucesso!'
         }, status=status.HTTP_200_OK)
 
+def _ler_token_sincronizacao(request):
+    """Lê ?since=. Retorna (posição, resposta de erro)"""
+    token = query_params(request).get('since')
+    if not token:
+        return None, None
+    try:
+        return decode_token(token), None
+    except TokenInvalido as e:
+        return None, Response({
+            'success': False,
+            'message': str(e)
+        }, status=status.HTTP_400_BAD_REQUEST)
+    except TokenExpirado:
+        return None, Response({
+            'success': False,
+            'message': 'Token expirado. Baixe a lista completa novamente.'
+        }, status=status.HTTP_410_GONE)
+
+@api_view(['GET'])
+def tarefas_changes(request):
+    """Tarefas criadas, alteradas ou excluídas desde o token (sincronização incremental).
+    
+    Sem ?since= devolve apenas o token inicial: obtenha-o antes de baixar a lista completa.
+    """
+    usuario_id, usuario_nome = usuario_da_requisicao(request)
+    if not usuario_id:
+        return Response({'success': False, 'message': 'Não autenticado'}, 
+                       status=status.HTTP_401_UNAUTHORIZED)
+    
+    inicio = datetime.now()
+    posicao, erro = _ler_token_sincronizacao(request)
+    if erro:
+        return erro
+    if posicao is None:
+        return Response({'success': True, 'token': encode_token(inicio)}, status=status.HTTP_200_OK)
+    
+    desde, after_id = posicao
+    documentos = tarefa_service.find_changed(usuario_id, desde, after_id, limit=CHANGES_LIMIT + 1)
+    token, has_more = next_token(documentos, inicio, CHANGES_LIMIT)
+    removidos = exclusao_service.find_since('Tarefa', desde, usuario_id)
+    
+    # Todas as tarefas são do usuário autenticado: o nome já veio no token/sessão
+    context = {'usuario_nomes': {usuario_id: usuario_nome}} if usuario_nome else {}
+    
+    return Response({
+        'success': True,
+        'tarefas': tarefa_projecao.render(documentos, context=context),
+        'removidos': removidos,
+        'token': token,
+        'has_more': has_more
+    }, status=status.HTTP_200_OK)
+
+BULK_OPERACOES = ('create', 'update', 'delete')
+BULK_MAX_OPERACOES = 500
+
+def _validar_operacao(operacao):
+    """Valida uma operação do lote. Retorna (operação normalizada, erros)"""
+    if not isinstance(operacao, dict) or operacao.get('op') not in BULK_OPERACOES:
+        return None, {'op': f'Use um de: {", ".join(BULK_OPERACOES)}'}
+    
+    op = operacao['op']
+    normalizada = {'op': op}
+    
+    if op != 'create':
+        tarefa_id = str(operacao.get('id', ''))
+        if not ObjectId.is_valid(tarefa_id):
+            return None, {'id': 'ID de tarefa inválido'}
+        normalizada['id'] = ObjectId(tarefa_id)
+    
+    if op != 'delete':
+        serializer = TarefaSerializer(data=operacao.get('dados') or {}, partial=(op == 'update'))
+        if not serializer.is_valid():
+            return None, serializer.errors
+        normalizada['data'] = dict(serializer.validated_data)
+    
+    return normalizada, None
+
+@api_view(['POST'])
+def tarefas_bulk(request):
+    """Aplica um lote de criações/atualizações/remoções de tarefas"""
+    usuario_id, usuario_nome = usuario_da_requisicao(request)
+    if not usuario_id:
+        return Response({'success': False, 'message': 'Não autenticado'}, 
+                       status=status.HTTP_401_UNAUTHORIZED)
+    
+    # Aceita {"operacoes": [...]} ou a lista de operações direto no corpo
+    dados = request.data
+    operacoes = dados if isinstance(dados, list) else dados.get('operacoes') if isinstance(dados, dict) else None
+    if not isinstance(operacoes, list) or not operacoes:
+        return Response({
+            'success': False,
+            'message': 'Envie uma lista não vazia em "operacoes"'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    if len(operacoes) > BULK_MAX_OPERACOES:
+        return Response({
+            'success': False,
+            'message': f'Máximo de {BULK_MAX_OPERACOES} operações por lote'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    # Validar o lote inteiro antes de gravar qualquer coisa
+    validas, erros, ids = [], {}, set()
+    for indice, operacao in enumerate(operacoes):
+        normalizada, erro = _validar_operacao(operacao)
+        # Uma operação por tarefa: o resultado de duas no mesmo lote seria ambíguo
+        if not erro and normalizada.get('id') in ids:
+            erro = {'id': 'Tarefa repetida no lote'}
+        if erro:
+            erros[indice] = erro
+        else:
+            validas.append(normalizada)
+            if 'id' in normalizada:
+                ids.add(normalizada['id'])
+    
+    if erros:
+        return Response({
+            'success': False,
+            'message': 'Erro ao validar operações',
+            'errors': erros
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    resultados = tarefa_service.bulk_apply(usuario_id, validas)
+    invalidate_total(f'tarefas_total:{usuario_id}')
+    
+    return Response({
+        'success': all(resultado['success'] for resultado in resultados),
+        'resultados': resultados
+    }, status=status.HTTP_200_OK)
+
+# Tempo (segundos) que o resumo do dashboard fica em cache (as tarefas atrasadas mudam com o relógio)
+DASHBOARD_CACHE_TIMEOUT = 30
+
+@api_view(['GET'])
+def tarefas_dashboard(request):
+    """Resumo das tarefas do usuário (status, prioridade, atrasadas, conclusão)"""
+    usuario_id, _ = usuario_da_requisicao(request)
+    if not usuario_id:
+        return Response({'success': False, 'message': 'Não autenticado'}, 
+                       status=status.HTTP_401_UNAUTHORIZED)
+    
+    campanha_id = query_params(request).get('campanha')
+    
+    # A versão na chave descarta o resumo assim que alguma tarefa do usuário muda
+    versao, _ = versao_service.get(tarefas_scope(usuario_id))
+    chave = f'tarefas_dashboard:{usuario_id}:{versao}:{campanha_id or ""}'
+    resumo = cache.get(chave) if versao is not None else None
+    if resumo is None:
+        resumo = tarefa_service.dashboard(usuario_id, campanha_id)
+        if resumo is None:
+            return Response({
+                'success': False,
+                'message': 'Erro ao calcular o resumo das tarefas'
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        if versao is not None:
+            cache.set(chave, resumo, DASHBOARD_CACHE_TIMEOUT)
+    
+    return Response({'success': True, 'dashboard': resumo}, status=status.HTTP_200_OK)
+
 @api_view(['PATCH'])
 def marcar_tarefa_concluida(request, pk):
     """Marca/desmarca tarefa como concluída"""
-    usuario_id = request.session.get('usuario_id')
+    usuario_id, usuario_nome = usuario_da_requisicao(request)
     if not usuario_id:
         return Response({'success': False, 'message': 'Não autenticado'}, 
                        status=status.HTTP_401_UNAUTHORIZED)
     
-    try:
-        tarefa = Tarefa.objects.get(_id=ObjectId(pk), idUsuario=ObjectId(usuario_id))
-        
-        # Alternar status: 1=pendente, 2=concluída
-        tarefa.status = "2" if tarefa.status == "1" else "1"
-        tarefa.save()
-        
-        status_texto = 'concluída' if tarefa.status == "2" else 'pendente'
-        
-        return Response({
-            'success': True,
-            'message': f'Tarefa marcada como {status_texto}!',
-            'tarefa': TarefaSerializer(tarefa).data
-        }, status=status.HTTP_200_OK)
-        
-    except Tarefa.DoesNotExist:
+    # Status explícito torna a requisição idempotente (retries seguros)
+    alvo = request.data.get('status')
+    if alvo is not None:
+        alvo = str(alvo)
+        if alvo not in (STATUS_PENDENTE, STATUS_CONCLUIDA):
+            return Response({
+                'success': False,
+                'message': 'Status inválido. Use "1" (pendente) ou "2" (concluída).'
+            }, status=status.HTTP_400_BAD_REQUEST)
+    
+    # Alternar status: 1=pendente, 2=concluída (atômico, no servidor)
+    documento = tarefa_service.toggle_status(pk, usuario_id, alvo) if ObjectId.is_valid(pk) else None
+    if documento is None:
         return Response({
             'success': False,
             'message': 'Tarefa não encontrada'
         }, status=status.HTTP_404_NOT_FOUND)
+    
+    status_texto = 'concluída' if documento.get('status') == STATUS_CONCLUIDA else 'pendente'
+    
+    # O dono da tarefa é o usuário autenticado: o nome já veio no token/sessão
+    context = {'usuario_nomes': {usuario_id: usuario_nome}} if usuario_nome else {}
+    
+    return Response({
+        'success': True,
+        'message': f'Tarefa marcada como {status_texto}!',
+        'tarefa': tarefa_projecao.render_one(documento, context=context)
+    }, status=status.HTTP_200_OK)
+
+# ==================== CAMPANHAS ====================
+
+@api_view(['GET'])
+def campanhas_stats(request):
+    """Totais e conclusão das tarefas por campanha (CampanhaStats materializado)"""
+    stats = campanha_stats_service.find_all()
+    return Response({
+        'success': True,
+        'campanhas': [
+            {
+                'idCampanha': item['_id'],
+                'total': item.get('total', 0),
+                'concluidas': item.get('concluidas', 0),
+                'taxa_conclusao': round(item['concluidas'] / item['total'], 4) if item.get('total') else 0.0,
+                'ultima_atividade': item.get('ultima_atividade')
+            }
+            for item in stats
+        ]
+    }, status=status.HTTP_200_OK)
 
 # ==================== CLIENTES ====================
 
@@ -228,26 +488,270 @@ def marcar_tarefa_concluida(request, pk):
 def clientes_list(request):
     """Lista clientes ou cria novo cliente"""
     if request.method == 'GET':
-        clientes = Cliente.objects.all()
-        serializer = ClienteSerializer(clientes, many=True)
-        return Response({
+        nao_modificado, validadores = check_version(request, CLIENTES_SCOPE)
+        if nao_modificado:
+            return nao_modificado
+        
+        campos, projection, limit, after = page_params(request, ClienteSerializer)
+        documentos, next_cursor = cliente_repository.page(limit, after, projection)
+        return set_validators(Response({
             'success': True,
-            'clientes': serializer.data,
-            'total': clientes.count()
-        }, status=status.HTTP_200_OK)
+            'clientes': cliente_projecao.render(documentos, campos),
+            'total': cached_total('clientes_total', cliente_repository.count, incluir_total(request)),
+            'next': next_cursor
+        }, status=status.HTTP_200_OK), validadores)
     
     elif request.method == 'POST':
         serializer = ClienteSerializer(data=request.data)
         if serializer.is_valid():
-            cliente = serializer.save()
+            cliente = cliente_repository.create(serializer.validated_data)
+            if cliente is None:
+                return Response({
+                    'success': False,
+                    'message': 'Erro ao criar cliente'
+                }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+            invalidate_total('clientes_total')
             return Response({
                 'success': True,
                 'message': 'Cliente criado com sucesso!',
-                'cliente': ClienteSerializer(cliente).data
+                'cliente': cliente_projecao.render_one(cliente)
             }, status=status.HTTP_201_CREATED)
         
         return Response({
             'success': False,
             'message': 'Erro ao criar cliente',
             'errors': serializer.errors
-        }, status=status.HTTP_400_BAD_REQUEST)
\ No newline at end of file
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+@api_view(['GET'])
+def clientes_changes(request):
+    """Clientes criados, alterados ou excluídos desde o token (sincronização incremental).
+    
+    Sem ?since= devolve apenas o token inicial: obtenha-o antes de baixar a lista completa.
+    """
+    inicio = datetime.now()
+    posicao, erro = _ler_token_sincronizacao(request)
+    if erro:
+        return erro
+    if posicao is None:
+        return Response({'success': True, 'token': encode_token(inicio)}, status=status.HTTP_200_OK)
+    
+    desde, after_id = posicao
+    documentos = cliente_service.find_changed(desde, after_id, limit=CHANGES_LIMIT + 1)
+    token, has_more = next_token(documentos, inicio, CHANGES_LIMIT)
+    removidos = exclusao_service.find_since('Cliente', desde)
+    
+    return Response({
+        'success': True,
+        'clientes': cliente_projecao.render(documentos),
+        'removidos': removidos,
+        'token': token,
+        'has_more': has_more
+    }, status=status.HTTP_200_OK)
+
+@api_view(['GET'])
+def clientes_busca(request):
+    """Busca clientes por nome, razão social ou cidade"""
+    query = request.query_params.get('q', '').strip()
+    try:
+        limit = max(1, min(int(request.query_params.get('limit', 20)), 100))
+        offset = max(int(request.query_params.get('offset', 0)), 0)
+    except ValueError:
+        return Response({
+            'success': False,
+            'message': 'limit e offset devem ser números inteiros'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    if not query:
+        return Response({'success': True, 'clientes': []}, status=status.HTTP_200_OK)
+    
+    documentos = cliente_service.search(query, limit=limit, offset=offset)
+    return Response({
+        'success': True,
+        'clientes': cliente_projecao.render(documentos)
+    }, status=status.HTTP_200_OK)
+
+# ==================== CACHE ====================
+
+@api_view(['GET'])
+def cache_stats_view(request):
+    """Contadores de hit/miss/eviction dos caches dos serviços"""
+    return Response({
+        'success': True,
+        'caches': cache_stats()
+    }, status=status.HTTP_200_OK)
+
+def metrics_view(request):
+    """Métricas no formato do Prometheus (latência por view/serviço, pool e caches)"""
+    if not acesso_metricas(request):
+        return HttpResponse('Acesso negado', status=status.HTTP_403_FORBIDDEN, content_type='text/plain; charset=utf-8')
+    return HttpResponse(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+# ==================== EXPORTAÇÃO ====================
+
+class _Echo:
+    """Buffer que apenas devolve o que recebe (csv.writer em streaming)"""
+    def write(self, value):
+        return value
+
+def _valor_csv(valor):
+    """Objetos aninhados (endereço, listas) vão para a célula como JSON"""
+    if isinstance(valor, (dict, list)):
+        return dumps(valor).decode()
+    return valor
+
+def _linhas_clientes(query, campos, projection):
+    """Linhas de saída na mesma representação da API, projetadas em blocos do cursor"""
+    documentos = cliente_service.iter_all(cliente_service.search_filter(query), projection)
+    while True:
+        bloco = list(islice(documentos, BATCH_SIZE))
+        if not bloco:
+            return
+        for documento, linha in zip(bloco, cliente_projecao.render(bloco, campos)):
+            # Objetos aninhados saem como estão no documento, não como texto
+            for campo, valor in linha.items():
+                if isinstance(documento.get(campo), (dict, list)):
+                    linha[campo] = documento[campo]
+            yield linha
+
+@api_view(['GET'])
+def clientes_export(request):
+    """Exporta os clientes em NDJSON ou CSV sem carregar tudo em memória"""
+    formato = request.query_params.get('formato', 'ndjson').lower()
+    if formato not in ('ndjson', 'csv'):
+        return Response({
+            'success': False,
+            'message': 'Formato inválido. Use ndjson ou csv.'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    campos, projection = parse_fields(request, ClienteSerializer)
+    linhas = _linhas_clientes(request.query_params.get('q'), campos, projection)
+    
+    if formato == 'csv':
+        writer = csv.DictWriter(_Echo(), fieldnames=campos or ClienteSerializer.Meta.fields)
+        
+        def conteudo():
+            yield writer.writeheader()
+            for linha in linhas:
+                yield writer.writerow({campo: _valor_csv(valor) for campo, valor in linha.items()})
+        
+        response = StreamingHttpResponse(conteudo(), content_type='text/csv; charset=utf-8')
+    else:
+        conteudo = (dumps(linha) + b'\n' for linha in linhas)
+        response = StreamingHttpResponse(conteudo, content_type='application/x-ndjson; charset=utf-8')
+    
+    response['Content-Disposition'] = f'attachment; filename="clientes.{formato}"'
+    return response
+
+
+# ==================== ASSÍNCRONO (ASGI) ====================
+
+def _resposta_json(dados, status_code=status.HTTP_200_OK):
+    """Resposta JSON das views assíncronas pelo mesmo encoder do renderer da API"""
+    return HttpResponse(dumps(dados), content_type='application/json', status=status_code)
+
+def _metodo_nao_permitido():
+    return _resposta_json({'success': False, 'message': 'Método não permitido'}, status.HTTP_405_METHOD_NOT_ALLOWED)
+
+async def tarefas_list_async(request):
+    """Lista tarefas do usuário pelo Motor, sem bloquear o worker"""
+    if request.method != 'GET':
+        return _metodo_nao_permitido()
+    
+    usuario = await usuario_async(request)
+    if usuario is None:
+        return _resposta_json({'success': False, 'message': 'Não autenticado'}, status.HTTP_401_UNAUTHORIZED)
+    usuario_id = usuario.usuario_id
+    
+    try:
+        campos, projection, limit, after = page_params(request, TarefaSerializer)
+    except ValidationError as e:
+        return _resposta_json({'success': False, 'errors': e.detail}, status.HTTP_400_BAD_REQUEST)
+    
+    documentos = await async_tarefa_service.find_by_user(
+        usuario_id, after=after, limit=limit + 1, projection=projection
+    )
+    next_cursor = next_page_cursor(documentos, limit)
+    
+    # Nomes resolvidos em lote e repassados à projeção (nenhuma consulta síncrona)
+    nomes = await async_usuario_service.find_names({d.get('idUsuario') for d in documentos})
+    tarefas = tarefa_projecao.render(documentos, campos, context={'usuario_nomes': nomes})
+    
+    total = await acached_total(
+        f'tarefas_total:{usuario_id}',
+        lambda: async_tarefa_service.count(usuario_id),
+        incluir_total(request)
+    )
+    return _resposta_json({
+        'success': True,
+        'tarefas': tarefas,
+        'total': total,
+        'next': next_cursor
+    })
+
+async def clientes_list_async(request):
+    """Lista clientes pelo Motor, sem bloquear o worker"""
+    if request.method != 'GET':
+        return _metodo_nao_permitido()
+    
+    usuario = await usuario_async(request)
+    if usuario is None:
+        return _resposta_json({'success': False, 'message': 'Não autenticado'}, status.HTTP_401_UNAUTHORIZED)
+    
+    try:
+        campos, projection, limit, after = page_params(request, ClienteSerializer)
+    except ValidationError as e:
+        return _resposta_json({'success': False, 'errors': e.detail}, status.HTTP_400_BAD_REQUEST)
+    
+    documentos = await async_cliente_service.find_all(limit=limit + 1, after=after, projection=projection)
+    next_cursor = next_page_cursor(documentos, limit)
+    
+    clientes = cliente_projecao.render(documentos, campos)
+    
+    total = await acached_total('clientes_total', async_cliente_service.count, incluir_total(request))
+    return _resposta_json({
+        'success': True,
+        'clientes': clientes,
+        'total': total,
+        'next': next_cursor
+    })
+
+# Intervalo (segundos) entre comentários de keepalive no stream de eventos
+EVENTOS_KEEPALIVE = 15
+
+async def eventos_stream(request):
+    """Stream (SSE) das alterações de tarefas e clientes do usuário"""
+    if request.method != 'GET':
+        return _metodo_nao_permitido()
+    
+    usuario = await usuario_async(request)
+    if usuario is None:
+        return _resposta_json({'success': False, 'message': 'Não autenticado'}, status.HTTP_401_UNAUTHORIZED)
+    usuario_id = usuario.usuario_id
+    
+    # Reconexão: o navegador reenvia o último id recebido
+    last_event_id = request.headers.get('Last-Event-ID') or query_params(request).get('last_event_id')
+    
+    get_publisher().start()
+    fila = broker.subscribe(usuario_id, last_event_id)
+    
+    async def eventos():
+        try:
+            yield 'retry: 3000\n\n'
+            while True:
+                try:
+                    evento = await asyncio.wait_for(fila.get(), timeout=EVENTOS_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    yield ': keepalive\n\n'
+                    continue
+                if evento is None:
+                    # Conexão atrasada demais: o cliente reconecta e recupera pelo Last-Event-ID
+                    break
+                yield format_sse(evento)
+        finally:
+            broker.unsubscribe(usuario_id, fila)
+    
+    response = StreamingHttpResponse(eventos(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response